@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the neural network and data-pipeline hot paths.
+
+    python -m IA.Python.bench                                # all benchmarks, results in bench_results.json
+    python -m IA.Python.bench --quick fire train_mlp         # smallest sizes of the matching benchmarks only
+    python -m IA.Python.bench --out bench_baseline.json      # record a baseline before a change...
+    python -m IA.Python.bench --baseline bench_baseline.json # ...and compare with it afterwards
+
+Run it as a module from the project root (neurones is part of the IA.Python
+package), or through `make bench`.
+
+Each benchmark is run at several sizes (network width, number of demo rows).
+Every call is timed on its own: the report gives calls per second and the
+p50 / p90 / p99 latency of a call, then one more call is made under
+tracemalloc to measure its peak memory. Anything a call consumes (a fresh
+copy of the rows for normalize_inplace(), a new network for train on XOR) is
+prepared outside the timed section.
+
+The demo rows are synthetic, written to a temporary folder in the
+demos_*.csv format, so results only depend on the code and the machine.
+
+With --baseline, a benchmark whose median latency grew by more than
+--threshold (default 10%) over the baseline is reported as a regression and
+the command exits with status 1. Baseline files are per machine and are not
+committed.
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import neurones
+from . import train_from_demos
+
+HERE = os.path.dirname(__file__)
+RESULTS = os.path.join(HERE, "bench_results.json")
+THRESHOLD = 0.10
+
+# Sizes of each benchmark; --quick keeps the first one
+WIDTHS = [8, 32, 128]
+ROWS = [10_000, 100_000]
+MLP_LAYERS = [[16, 8], [64, 32]]
+# The pure-Python training backend is only timed on a small dataset
+PYTHON_BACKEND_ROWS = 2_000
+
+# A benchmark at one size: prepare() builds the arguments of a call (not timed), run(args) is timed
+Case = Tuple[Callable[[], Any], Callable[[Any], Any]]
+
+
+def write_demos(folder: str, rows: int, seed: int=0) -> str:
+    """Write a synthetic demos_bench.csv of `rows` frames (about 10% jumps).
+
+    Returns: Path of the file
+    """
+    rnd = random.Random(seed)
+    path = os.path.join(folder, f"demos_bench_{rows}.csv")
+    with open(path, "w") as f:
+        f.write("time;flappyHeight;flappyX;verticalSpeed;distToRoof;nearest_dx;nearest_y;passes;action\n")
+        for i in range(rows):
+            h = rnd.uniform(1, 99)
+            f.write(f"{i / 60:.6f};{h:.6f};20.000000;{rnd.uniform(-60, 50):.6f};{100 - h:.6f};"
+                    f"{rnd.uniform(0, 80):.6f};{rnd.uniform(25, 75):.6f};{i // 30};{int(rnd.random() < 0.1)}\n")
+    return path
+
+
+def network(width: int, entries: int=train_from_demos.N_FEATURES) -> neurones.Reseau:
+    """Werbos network with one hidden layer of `width` neurons, fixed weights."""
+    return neurones.werbos_hidden(entries, ["0", "1"], [width], rng=random.Random(0))
+
+
+def random_inputs(n: int, seed: int=0) -> List[Tuple[float, ...]]:
+    rnd = random.Random(seed)
+    return [tuple(rnd.uniform(-1, 1) for _ in range(train_from_demos.N_FEATURES)) for _ in range(n)]
+
+
+def bench_fire(width: int) -> Case:
+    reseau, inputs = network(width), random_inputs(256)
+    k = iter(range(sys.maxsize))
+
+    def run(x):
+        reseau.feed_entries(x)
+        reseau.fire()
+    return (lambda: inputs[next(k) % len(inputs)]), run
+
+
+def bench_fire_compiled(width: int) -> Case:
+    reseau, inputs = network(width), random_inputs(256)
+    reseau.compile()
+    k = iter(range(sys.maxsize))
+    return (lambda: inputs[next(k) % len(inputs)]), (lambda x: reseau.fire_compiled(x))
+
+
+def bench_fix_chain_rule_softmax(width: int) -> Case:
+    reseau, inputs = network(width), random_inputs(256)
+    k = iter(range(sys.maxsize))
+
+    def prepare():
+        i = next(k)
+        return inputs[i % len(inputs)], str(i % 2)
+    return prepare, lambda a: reseau.fix_chain_rule_softmax(a[0], a[1], 0.1, debug=False)
+
+
+def bench_train_xor(_: int) -> Case:
+    outputs = ["0", "1"]
+    known = {(0., 0.): 0, (0., 1.): 1, (1., 0.): 1, (1., 1.): 0}
+
+    def prepare():
+        # same draw as TestDeep.test_xor, which converges
+        return neurones.werbos_hidden(2, outputs, [2], rng=random.Random(0))
+    return prepare, lambda r: r.train(known, outputs, use_softmax=True, max_iterations=20000)
+
+
+def bench_load_all(path: str, cache: bool) -> Case:
+    if cache:
+        train_from_demos.load_all([path], use_cache=True)  # fills the cache
+    return (lambda: [path]), lambda paths: train_from_demos.load_all(paths, use_cache=cache)
+
+
+def bench_normalize(path: str) -> Case:
+    X, _ = train_from_demos.load_all([path], use_cache=True)
+    # every call gets its own copy to normalize
+    return (lambda: [row[:] for row in X]), train_from_demos.normalize_inplace
+
+
+def bench_balance_data(path: str) -> Case:
+    X, y = train_from_demos.load_all([path], use_cache=True)
+    return (lambda: (X, y)), lambda a: train_from_demos.balance_data(*a, seed=42)
+
+
+def bench_train_mlp(path: str, layers: List[int], backend: str) -> Case:
+    Xn, y, _, _, _ = train_from_demos.prepare_dataset(paths=[path], as_arrays=backend == "numpy", use_cache=True)
+    return (lambda: None), lambda _: train_from_demos.train_mlp(Xn, y, layers, epochs=1, backend=backend)
+
+
+def benchmarks(folder: str, quick: bool=False) -> List[Tuple[str, Callable[[], Case]]]:
+    """All benchmarks as (name, factory), the factory building the Case when it runs.
+
+    Demo files are written to `folder` on first use.
+    """
+    widths = WIDTHS[:1] if quick else WIDTHS
+    rows = ROWS[:1] if quick else ROWS
+    layers = MLP_LAYERS[:1] if quick else MLP_LAYERS
+    files: Dict[int, str] = {}
+
+    def demos(n: int) -> str:
+        if n not in files:
+            files[n] = write_demos(folder, n)
+        return files[n]
+
+    cases = []
+    for w in widths:
+        cases.append((f"fire[width={w}]", lambda w=w: bench_fire(w)))
+        cases.append((f"fire_compiled[width={w}]", lambda w=w: bench_fire_compiled(w)))
+        cases.append((f"fix_chain_rule_softmax[width={w}]", lambda w=w: bench_fix_chain_rule_softmax(w)))
+    cases.append(("train_xor", lambda: bench_train_xor(0)))
+    for n in rows:
+        cases.append((f"load_all[rows={n},csv]", lambda n=n: bench_load_all(demos(n), cache=False)))
+        cases.append((f"load_all[rows={n},cache]", lambda n=n: bench_load_all(demos(n), cache=True)))
+        cases.append((f"normalize[rows={n}]", lambda n=n: bench_normalize(demos(n))))
+        cases.append((f"balance_data[rows={n}]", lambda n=n: bench_balance_data(demos(n))))
+        for l in layers:
+            name = f"train_mlp_epoch[rows={n},layers={'x'.join(map(str, l))},numpy]"
+            cases.append((name, lambda n=n, l=l: bench_train_mlp(demos(n), l, "numpy")))
+    n = PYTHON_BACKEND_ROWS
+    cases.append((f"train_mlp_epoch[rows={n},layers=16x8,python]",
+                  lambda: bench_train_mlp(demos(n), [16, 8], "python")))
+    return cases
+
+
+def measure(prepare: Callable[[], Any], run: Callable[[Any], Any], min_time: float=1.0,
+            min_calls: int=5, max_calls: int=100_000, memory: bool=True) -> Dict[str, Any]:
+    """Time run(prepare()) call by call, then measure the peak memory of one call.
+
+    Called by: main()
+    Args:
+        min_time: Keep calling until the timed calls add up to this many seconds...
+        min_calls: ...and at least this many calls were made
+        max_calls: Upper bound on the number of calls
+        memory: Measure peak_bytes (tracemalloc makes allocation heavy calls much slower)
+    Returns: dict with calls, ops_per_sec, mean / min / max / p50 / p90 / p99 latency
+             in seconds and peak_bytes (memory allocated by one call at its peak, None
+             when not measured)
+    """
+    run(prepare())  # warm up caches and lazy compilation
+    latencies = []
+    total = 0.0
+    while (total < min_time or len(latencies) < min_calls) and len(latencies) < max_calls:
+        args = prepare()
+        start = time.perf_counter()
+        run(args)
+        latencies.append(time.perf_counter() - start)
+        total += latencies[-1]
+
+    peak_bytes = None
+    if memory:
+        tracemalloc.start()
+        try:
+            args = prepare()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            run(args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_bytes = max(0, peak - before)
+
+    lat = np.array(latencies)
+    p50, p90, p99 = np.percentile(lat, [50, 90, 99]).tolist()
+    return {
+        "calls": len(lat),
+        "ops_per_sec": len(lat) / total if total else float("inf"),
+        "mean": float(lat.mean()),
+        "min": float(lat.min()),
+        "max": float(lat.max()),
+        "p50": p50,
+        "p90": p90,
+        "p99": p99,
+        "peak_bytes": peak_bytes,
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float=THRESHOLD) -> Dict[str, Dict[str, Any]]:
+    """Median latency of each benchmark relative to the baseline.
+
+    Benchmarks missing from either side are skipped.
+    Returns: {name: {"ratio": current p50 / baseline p50, "regression": ratio > 1 + threshold}}
+    """
+    out = {}
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50"):
+            continue
+        ratio = r["p50"] / base["p50"]
+        out[name] = {"ratio": ratio, "regression": ratio > 1 + threshold}
+    return out
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def format_bytes(n: Optional[int]) -> str:
+    if n is None:
+        return "-"
+    for unit, scale in (("MB", 1 << 20), ("KB", 1 << 10)):
+        if n >= scale:
+            return f"{n / scale:.1f}{unit}"
+    return f"{n}B"
+
+
+def print_report(results: Dict[str, Dict[str, Any]], comparison: Dict[str, Dict[str, Any]]) -> None:
+    """One line per benchmark, with the change against the baseline when there is one."""
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}}  {'ops/s':>10}  {'p50':>9}  {'p90':>9}  {'p99':>9}  {'peak':>8}  {'vs base':>8}")
+    for name, r in results.items():
+        line = (f"{name:<{width}}  {r['ops_per_sec']:>10.1f}  {format_time(r['p50']):>9}  "
+                f"{format_time(r['p90']):>9}  {format_time(r['p99']):>9}  {format_bytes(r['peak_bytes']):>8}")
+        if name in comparison:
+            c = comparison[name]
+            line += f"  {c['ratio'] - 1:>+7.1%}{' REGRESSION' if c['regression'] else ''}"
+        print(line)
+
+
+def parse_args():
+    """Parse command-line arguments for the benchmarks.
+
+    Called by: main()
+    Returns: argparse.Namespace
+    """
+    p = argparse.ArgumentParser()
+    p.add_argument("filters", nargs="*", metavar="PATTERN",
+                   help="Only run the benchmarks whose name matches one of these regular expressions")
+    p.add_argument("--quick", action="store_true", help="Only the smallest size of each benchmark")
+    p.add_argument("--min-time", type=float, default=1.0, help="Seconds of timed calls per benchmark")
+    p.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak memory measurement")
+    p.add_argument("--out", default=RESULTS, help="JSON file for the results")
+    p.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    p.add_argument("--threshold", type=float, default=THRESHOLD,
+                   help="Regression when the median latency grows by more than this fraction")
+    p.add_argument("--list", action="store_true", help="List the benchmark names and exit")
+    return p.parse_args()
+
+
+def main():
+    """Run the benchmarks.
+
+    1. Select the benchmarks matching the filters
+    2. Time each one, write the JSON results
+    3. Compare with --baseline, exit 1 on a regression
+    """
+    args = parse_args()
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)["results"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"ERROR: cannot read baseline {args.baseline}: {e}")
+            sys.exit(2)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as folder:
+        cases = [(name, factory) for name, factory in benchmarks(folder, args.quick)
+                 if not args.filters or any(re.search(f, name) for f in args.filters)]
+        if args.list or not cases:
+            print("\n".join(name for name, _ in cases) or f"ERROR: no benchmark matches {args.filters}")
+            sys.exit(0 if cases else 2)
+        for name, factory in cases:
+            print(f"  {name}...", end="", flush=True)
+            start = time.perf_counter()
+            # the code under test logs its progress, keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                prepare, run = factory()
+                results[name] = measure(prepare, run, args.min_time, memory=not args.no_memory)
+            print(f" {time.perf_counter() - start:.1f}s")
+
+    comparison = compare(results, baseline, args.threshold) if baseline else {}
+    print_report(results, comparison)
+    meta = {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+    with open(args.out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"Wrote results to {args.out}")
+
+    regressions = [name for name, c in comparison.items() if c["regression"]]
+    if regressions:
+        print(f"FAILED: {len(regressions)} benchmarks are more than {args.threshold:.0%} slower than "
+              f"{args.baseline}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
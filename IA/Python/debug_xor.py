@@ -15,6 +15,11 @@ for c in net.connexions:
 success = net.train(inputs, outputs, use_softmax=True, debug=True, max_iterations=10000)
 print('success', success)
 print('iterations', net.learning_iterations)
+print('stop reason', net.stop_reason, 'forward passes', net.forward_passes)
+# train(debug=True) draws the last snapshots in the background, wait for dot
+for f in net.rendus:
+    f.result()
+print('drew', len(net.rendus), 'snapshots of', net.graphviz_draws)
 for n in net.neurones:
     print(n.name, 'bias', n.biais)
 for c in net.connexions:
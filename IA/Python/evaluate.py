@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Replay the recorded demos through a trained model and compare its decisions
+with the human actions.
+
+    python evaluate.py                                  # ../SoftmaxC/model_weights.txt on demos_*.csv
+    python evaluate.py --model other_weights.txt --min-agreement 0.8
+
+Every frame of every demos_*.csv file is scored with inference.Model (the
+same forward pass as the native predict()). The report gives, per file and
+overall, the agreement (share of frames where the model does what the player
+did) and the precision / recall / F1 of the model's jumps. Files are scored in
+parallel, one task per file in a ProcessPoolExecutor, and go through the
+binary demo cache of train_from_demos.
+
+With --min-agreement the command exits with status 1 when the overall
+agreement is below the threshold. With --promote (which requires
+--min-agreement), a model that passes is then copied over the deployed one: `make update-model` trains into a candidate
+file and only deploys it this way, so a rejected model never replaces the one
+model.c loads.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from . import train_from_demos
+    from .inference import Model, THRESHOLD
+except ImportError:  # run as a script, like train_from_demos.py
+    import train_from_demos
+    from inference import Model, THRESHOLD
+
+# Model shared with the worker processes, set once by _init_worker()
+_MODEL: Dict[str, Any] = {}
+
+
+def parse_args():
+    """Parse command-line arguments for the evaluation.
+
+    Called by: main()
+    Returns: argparse.Namespace
+    """
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", help="Model file to evaluate (default: ../SoftmaxC/model_weights.txt)")
+    p.add_argument("--data", help="Directory containing demos (default: this script folder)")
+    p.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    p.add_argument("--threshold", type=float, default=THRESHOLD, help="Jump when p >= threshold")
+    p.add_argument("--min-agreement", type=float,
+                   help="Exit with status 1 when the overall agreement is below this value (0 to 1)")
+    p.add_argument("--promote", metavar="DEST",
+                   help="When the model passes --min-agreement (required), copy it (and its .bin) over DEST")
+    p.add_argument("--json", help="Also write the report to this JSON file")
+    p.add_argument("--no-cache", action="store_true",
+                   help=f"Always parse the CSV files instead of using {train_from_demos.CACHE_DIR}/")
+    args = p.parse_args()
+    if args.promote and args.min_agreement is None:
+        p.error("--promote needs --min-agreement, a model is only deployed when it passes it")
+    return args
+
+
+def confusion(y, pred) -> Dict[str, int]:
+    """Count the four outcomes of the jump decision.
+
+    Args:
+        y: Recorded actions (0/1)
+        pred: Model decisions (0/1)
+    Returns: dict with frames, tp (both jump), fp (model only), fn (player only), tn (neither)
+    """
+    y = np.asarray(y, dtype=bool)
+    pred = np.asarray(pred, dtype=bool)
+    tp = int(np.count_nonzero(y & pred))
+    fp = int(np.count_nonzero(~y & pred))
+    fn = int(np.count_nonzero(y & ~pred))
+    return {"frames": len(y), "tp": tp, "fp": fp, "fn": fn, "tn": len(y) - tp - fp - fn}
+
+
+def metrics(counts: Dict[str, int]) -> Dict[str, float]:
+    """Agreement, precision, recall and F1 on jumps from confusion() counts.
+
+    A ratio with an empty denominator is reported as 0.
+    """
+    def ratio(num, den):
+        return num / den if den else 0.0
+    precision = ratio(counts["tp"], counts["tp"] + counts["fp"])
+    recall = ratio(counts["tp"], counts["tp"] + counts["fn"])
+    return {
+        "agreement": ratio(counts["tp"] + counts["tn"], counts["frames"]),
+        "precision": precision,
+        "recall": recall,
+        "f1": ratio(2 * precision * recall, precision + recall),
+    }
+
+
+def _init_worker(W, b, means, stds, threshold: float, use_cache: bool) -> None:
+    """Rebuild the model in the worker process (ProcessPoolExecutor initializer)."""
+    _MODEL["model"] = Model(W, b, means, stds)
+    _MODEL["threshold"] = threshold
+    train_from_demos.USE_CACHE = use_cache
+
+
+def evaluate_file(path: str, model: Optional[Model]=None, threshold: Optional[float]=None) -> Dict[str, Any]:
+    """Replay one demo file through the model.
+
+    Called by: main() through the process pool, with the worker's model
+    Returns: dict with the file name, confusion() counts, metrics() and the duration
+    """
+    model = model or _MODEL["model"]
+    threshold = _MODEL.get("threshold", THRESHOLD) if threshold is None else threshold
+    start = time.perf_counter()
+    counts = {"frames": 0, "tp": 0, "fp": 0, "fn": 0, "tn": 0}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for X, y in train_from_demos.read_demo_chunks(path):
+            if not len(y):
+                continue
+            frames = np.frombuffer(X, dtype=np.float64).reshape(-1, train_from_demos.N_FEATURES)
+            chunk = confusion(np.frombuffer(y, dtype=np.int8), model.predict(frames, threshold))
+            for k in counts:
+                counts[k] += chunk[k]
+    result = {"file": os.path.basename(path), **counts, **metrics(counts)}
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Overall counts and metrics over all files (frames are pooled, not averaged per file)."""
+    counts = {k: sum(r[k] for r in results) for k in ("frames", "tp", "fp", "fn", "tn")}
+    return {"file": "TOTAL", **counts, **metrics(counts)}
+
+
+def print_report(results: List[Dict[str, Any]], total: Dict[str, Any]) -> None:
+    """Print the per-file table followed by the overall line."""
+    width = max(len(r["file"]) for r in results + [total])
+    print(f"{'file':<{width}}  {'frames':>7}  {'agree':>6}  {'prec':>6}  {'recall':>6}  {'f1':>6}  "
+          f"{'jumps':>6}  {'model':>6}")
+    for r in results + [total]:
+        print(f"{r['file']:<{width}}  {r['frames']:>7}  {r['agreement']:>6.3f}  {r['precision']:>6.3f}  "
+              f"{r['recall']:>6.3f}  {r['f1']:>6.3f}  {r['tp'] + r['fn']:>6}  {r['tp'] + r['fp']:>6}")
+
+
+def main():
+    """Run the evaluation.
+
+    1. Load the model once
+    2. Score every demo file in a process pool
+    3. Print (and optionally save) the report, exit 1 below --min-agreement
+    4. Otherwise replace the --promote model with the evaluated one
+    """
+    args = parse_args()
+    if args.data:
+        train_from_demos.PATTERN = os.path.join(os.path.abspath(args.data), "demos_*.csv")
+    model_path = os.path.abspath(args.model) if args.model else train_from_demos.OUT
+    if not os.path.exists(model_path) and os.path.exists(train_from_demos.binary_model_path(model_path)):
+        model_path = train_from_demos.binary_model_path(model_path)  # trained with --format binary
+    try:
+        W, b, means, stds = train_from_demos.read_model(model_path)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: cannot load model {model_path}: {e}")
+        sys.exit(2)
+    paths = train_from_demos.demo_files()
+    if not paths:
+        print(f"ERROR: no demo files match {train_from_demos.PATTERN}")
+        sys.exit(2)
+
+    workers = max(1, min(args.workers or 1, len(paths)))
+    print(f"Evaluating {model_path} on {len(paths)} demo files with {workers} workers...")
+    start = time.perf_counter()
+    initargs = (W, b, means, stds, args.threshold, not args.no_cache)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        results = list(pool.map(evaluate_file, paths))
+    total = summarize(results)
+    total["seconds"] = time.perf_counter() - start
+
+    print_report(results, total)
+    print(f"Scored {total['frames']} frames in {total['seconds']:.2f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": model_path, "threshold": args.threshold, "files": results, "total": total}, f, indent=2)
+        print(f"Wrote report to {args.json}")
+
+    if args.min_agreement is not None and total["agreement"] < args.min_agreement:
+        print(f"FAILED: agreement {total['agreement']:.3f} is below --min-agreement {args.min_agreement}")
+        if args.promote:
+            print(f"Kept the deployed model {args.promote}")
+        sys.exit(1)
+    if args.promote:
+        candidate = os.path.abspath(args.model) if args.model else train_from_demos.OUT
+        train_from_demos.promote_model(candidate, os.path.abspath(args.promote))
+        print(f"Promoted {candidate} to {args.promote}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Python inference for the MLP written by train_from_demos.write_model().
+
+    model = Model.load()            # ../SoftmaxC/model_weights.txt (text or binary format)
+    model.predict_proba(frame)      # one frame of the 7 FEATURES -> probability of a jump
+    model.predict(X)                # (n, 7) array of frames -> 0/1 for each frame
+
+This is the same computation as predict() in IA/SoftmaxC/model.c: raw inputs
+are normalized with the stored means/stds, then go through tanh hidden layers
+and a sigmoid output, and a frame is a jump when p >= 0.5. Whole arrays of
+frames are scored in one vectorized pass, which lets offline checks score
+recorded demos without running the game.
+
+Requires numpy.
+"""
+import sys
+import argparse
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    from . import train_from_demos
+except ImportError:  # run as a script, like train_from_demos.py
+    import train_from_demos
+
+THRESHOLD = 0.5
+
+
+class Model:
+    """A trained MLP: weight matrices, biases and the input normalization.
+
+    Args:
+        W: Weight matrices, W[k] is (layer k+1 size) x (layer k size)
+        b: Bias vectors, one per layer
+        means, stds: Normalization of the raw inputs, one value per feature
+    """
+
+    def __init__(self, W, b, means, stds):
+        self.W = [np.asarray(w, dtype=np.float64) for w in W]
+        self.b = [np.asarray(v, dtype=np.float64) for v in b]
+        self.means = np.asarray(means, dtype=np.float64)
+        self.stds = np.asarray(stds, dtype=np.float64)
+        if not self.W or self.W[0].shape[1] != len(self.means) or len(self.means) != len(self.stds):
+            raise ValueError(f"Inconsistent model: {len(self.means)} means, {len(self.stds)} stds, "
+                             f"first layer expects {self.W[0].shape[1] if self.W else 0} inputs")
+
+    @classmethod
+    def load(cls, path: Optional[str]=None) -> "Model":
+        """Load a model file written by write_model() or write_model_binary().
+
+        Raises: ValueError when the file is not a complete MLP model (see read_model())
+        """
+        return cls(*train_from_demos.read_model(path or train_from_demos.OUT))
+
+    @property
+    def n_features(self) -> int:
+        return len(self.means)
+
+    @property
+    def layer_sizes(self) -> List[int]:
+        """Output size of every layer, the last one being the single output neuron."""
+        return [len(v) for v in self.b]
+
+    def predict_proba(self, X):
+        """Probability of a jump.
+
+        Args:
+            X: One frame (n_features raw values) or an (n, n_features) array of frames,
+               in the FEATURES order and original units
+        Returns: A float for a single frame, else an array of n probabilities
+        """
+        X = np.asarray(X, dtype=np.float64)
+        single = X.ndim == 1
+        a = (X.reshape(1, -1) if single else X) - self.means
+        a /= self.stds
+        last = len(self.W) - 1
+        for k, (w, b) in enumerate(zip(self.W, self.b)):
+            z = a @ w.T
+            z += b
+            if k == last:
+                # Sigmoid, split on the sign like train_from_demos.sigmoid()
+                e = np.exp(-np.abs(z))
+                a = np.where(z >= 0, 1.0 / (1.0 + e), e / (1.0 + e))
+            else:
+                a = np.tanh(z, out=z)
+        p = a[:, 0]
+        return float(p[0]) if single else p
+
+    def predict(self, X, threshold: float=THRESHOLD):
+        """Jump decision (1) or not (0), like the native predict().
+
+        Returns: An int for a single frame, else an int8 array
+        """
+        p = self.predict_proba(X)
+        if isinstance(p, float):
+            return int(p >= threshold)
+        return (p >= threshold).astype(np.int8)
+
+
+def main():
+    """Print the jump probability of frames given on the command line.
+
+    python inference.py --model model_weights.txt 12.5 30 80 2 40 20 1.5
+    """
+    p = argparse.ArgumentParser()
+    p.add_argument("values", nargs="+", type=float, help=f"Raw values of {', '.join(train_from_demos.FEATURES)}")
+    p.add_argument("--model", help="Model file (default: ../SoftmaxC/model_weights.txt)")
+    args = p.parse_args()
+
+    model = Model.load(args.model)
+    if len(args.values) % model.n_features:
+        print(f"ERROR: expected a multiple of {model.n_features} values ({', '.join(train_from_demos.FEATURES)})")
+        sys.exit(2)
+    X = np.array(args.values).reshape(-1, model.n_features)
+    for row, proba in zip(X, model.predict_proba(X)):
+        print(f"{' '.join(f'{v:g}' for v in row)} -> p={proba:.4f} {'JUMP' if proba >= THRESHOLD else 'no jump'}")
+
+
+if __name__ == '__main__':
+    main()
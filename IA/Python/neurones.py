@@ -1,11 +1,26 @@
 #from typing import Generator, Iterator, Any, Iterable
+"""
+Reseaux de neurones objet (Neurone, Connexion, Reseau) et leur version
+compilée en matrices (ReseauCompile).
+
+numpy est une dependance obligatoire du module, y compris pour Reseau sans
+compile() : les fix_*_batch, train_evolution et ReseauCompile en ont besoin,
+et les annotations s'y referent. Installer requirements.txt.
+"""
+import os
 import sys
 import math
+import time
+import functools
+import multiprocessing
 
 from typing import Generic, TypeVar, Iterator, Callable, Iterable, Literal
 from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import random
 
+import numpy as np
+
 
 T = TypeVar('T')
 
@@ -44,6 +59,14 @@ class SetDeque(Generic[T]):
 def act_identity(v: float, _: float) -> float:
     return v
 
+def d_act_identity(_: float) -> float:
+    """derivée de act_identity, pour les sorties lineaires"""
+    return 1.0
+
+def d_par_defaut(a: float) -> float:
+    """d_value_f par defaut d'un neurone : renvoie l'activation telle quelle"""
+    return a
+
 def heave(value:float, seuil:float) -> float:
     if value > seuil:
         return 1
@@ -84,14 +107,24 @@ def softmax(values: list[float]) -> list[float]:
     s = sum(exps)
     return [e / s for e in exps]
 
+def softmax_lignes(values: np.ndarray) -> np.ndarray:
+    """softmax() appliqué a chaque ligne d'un tableau 2D."""
+    exps = np.exp(values - values.max(axis=1, keepdims=True))
+    return exps / exps.sum(axis=1, keepdims=True)
+
 class Neurone:
+    __slots__ = ("name", "biais", "entrees", "sorties", "value", "ecart", "proba", "roles", "reseau",
+                 "value_f", "d_value_f")
+
     name: str
-    biais: float = 0.0
+    biais: float
     entrees: list['Connexion']
     sorties: list['Connexion']
-    value: float = 0.0
+    value: float
     ecart: float # apres feed forward, l'ecart entre le poids souhaité et réel
     proba: float # uniquement pour les neurones de sortie, pour sortir la classification
+    roles: tuple[bool, bool] | None # (est une entree, est une sortie) en cache, None quand une connexion a changé
+    reseau: 'Reseau | None' # le reseau qui l'a indexé en dernier (voir Reseau.topologie()), prevenu quand une connexion change
 
     value_f : Callable[[float, float], float]
     d_value_f : Callable[[float], float] # si on utilise backprop
@@ -99,32 +132,43 @@ class Neurone:
     def __init__(
             self, value_f : Callable[[float, float], float], 
             name : str, seuil: float = 0,
-            d_value_f: Callable[[float], float] = lambda x : x) -> None:
+            d_value_f: Callable[[float], float] = d_par_defaut) -> None:
         self.name = name
         self.entrees = []
         self.sorties = []
         self.biais = seuil
         self.value = 0.0
         self.ecart = 0.0
+        self.proba = 0.0
         self.value_f = value_f
         self.d_value_f = d_value_f
+        self.roles = None
+        self.reseau = None
     
     def __str__(self) -> str:
         return "n["+self.name+"]"
     def __repr__(self) -> str:
         return f"n[{self.name}] {self.proba:.3f}"
 
+    def calcule_roles(self) -> tuple[bool, bool]:
+        """Parcourt les connexions une fois, le resultat reste en cache jusqu'a la prochaine Connexion."""
+        self.roles = (
+            any(e.amont is None for e in self.entrees),
+            any(e.aval is None for e in self.sorties),
+        )
+        return self.roles
+
+    def structure_changee(self) -> None:
+        """Une connexion du neurone a changé : ses roles et la topologie de son reseau sont perimés."""
+        self.roles = None
+        if self.reseau is not None:
+            self.reseau.version_structure += 1
+
     def is_entry(self) -> bool:
-        for e in self.entrees:
-            if e.amont is None:
-                return True
-        return False
+        return (self.roles or self.calcule_roles())[0]
     
     def is_sortie(self) -> bool:
-        for e in self.sorties:
-            if e.aval is None:
-                return True
-        return False
+        return (self.roles or self.calcule_roles())[1]
 
 
 class Connexion:
@@ -134,6 +178,8 @@ class Connexion:
     sinon on va chercher la valeur dans le neurone parent, qui
     transmet la meme valeur a tous ses enfants, en modulant en fonction de son poids
     """
+    __slots__ = ("raw_value", "amont", "aval", "poids")
+
     raw_value: float | None  # cette valeur est calculée par le neurone amont, ou bien mise en dur quand il s'agit d'un neurone d'entree
     amont: Neurone | None  # les neurone de premiere couche n'ont pas d'entree, ils ont juste une valeur intrinseque
     aval: Neurone | None  # le neurone cible
@@ -150,9 +196,11 @@ class Connexion:
         self.poids = poids
 
         if self.amont:
-            self.amont.sorties += [self]
+            self.amont.sorties.append(self)
+            self.amont.structure_changee()
         if self.aval:
-            self.aval.entrees += [self]
+            self.aval.entrees.append(self)
+            self.aval.structure_changee()
 
         "On est soit un neurone d'entree donc on a pas de parent "
         "et sa valeur est intinseque, soit on a un parent, "
@@ -176,6 +224,222 @@ class Connexion:
     def feed(self, value: float) -> None:
         self.raw_value = value
 
+    @staticmethod
+    def dense(sources: list[Neurone], cibles: list[Neurone], poids: Iterable[float]) -> list['Connexion']:
+        """
+        Relie chaque source a chaque cible, les poids etant donnés cible par
+        cible (une ligne de len(sources) poids par cible). Meme resultat que
+        Connexion(None, source, cible, p) pour chaque paire, mais sans passer
+        par __init__ pour chaque arete, ce qui compte pour les grandes couches.
+        """
+        nouvelles: list[Connexion] = []
+        w = iter(poids)
+        for cible in cibles:
+            ligne = []
+            for source, p in zip(sources, w):
+                cx = object.__new__(Connexion)
+                cx.raw_value = None
+                cx.amont = source
+                cx.aval = cible
+                cx.poids = p
+                source.sorties.append(cx)
+                ligne.append(cx)
+            cible.entrees.extend(ligne)
+            cible.structure_changee()
+            nouvelles.extend(ligne)
+        for source in sources:
+            source.structure_changee()
+        return nouvelles
+
+
+def tri_topologique(neurones: list[Neurone]) -> tuple[list[Neurone], dict[Neurone, int]]:
+    """
+    Ordonne les neurones pour que chacun vienne apres tous ceux qui
+    l'alimentent (algorithme de Kahn), et donne la couche de chacun :
+    0 pour les neurones sans neurone amont, sinon 1 + la couche la plus
+    profonde parmi ses neurones amont.
+    Leve ValueError si le graphe a un cycle.
+    """
+    restants = {n: sum(1 for e in n.entrees if e.amont is not None) for n in neurones}
+    couche = {n: 0 for n in neurones}
+    prets = deque(n for n in neurones if restants[n] == 0)
+    ordre: list[Neurone] = []
+    while prets:
+        n = prets.popleft()
+        ordre.append(n)
+        for s in n.sorties:
+            if s.aval is None or s.aval not in restants:
+                continue
+            couche[s.aval] = max(couche[s.aval], couche[n] + 1)
+            restants[s.aval] -= 1
+            if restants[s.aval] == 0:
+                prets.append(s.aval)
+    if len(ordre) != len(neurones):
+        raise ValueError("le reseau contient un cycle, impossible de le compiler")
+    return ordre, couche
+
+
+class Topologie:
+    """
+    Index de la structure d'un reseau, calculé une fois par changement de
+    structure : roles des neurones, ordre topologique, couches et numeros
+    des neurones et connexions. Il est perimé des qu'une Connexion touche
+    un neurone du reseau ou qu'un neurone ou une connexion est ajouté (voir cle).
+    """
+    cle: tuple[int, int, int]
+    "(Reseau.version_structure, nombre de neurones, nombre de connexions) au moment du calcul"
+    neurones: list[Neurone]
+    connexions: list[Connexion]
+    entrees: list[Neurone]
+    sorties: list[Neurone]
+    non_entrees: list[Neurone]
+    "les neurones dont on apprend le biais"
+    caches_inverse: list[Neurone]
+    "les neurones ni entree ni sortie, du dernier au premier, ordre de la retropropagation"
+    connexions_internes: list[Connexion]
+    "les connexions entre deux neurones, celles dont on apprend le poids"
+    ordre: list[Neurone] | None
+    "ordre topologique, None si le reseau a un cycle"
+    couche: dict[Neurone, int]
+
+    def __init__(self, neurones: list[Neurone], connexions: list[Connexion], version: int = 0) -> None:
+        self.cle = (version, len(neurones), len(connexions))
+        self.neurones = neurones
+        self.connexions = connexions
+        self.entrees = [n for n in neurones if n.is_entry()]
+        self.sorties = [n for n in neurones if n.is_sortie()]
+        self.non_entrees = [n for n in neurones if not n.is_entry()]
+        self.caches_inverse = [n for n in reversed(neurones) if not n.is_sortie() and not n.is_entry()]
+        self.connexions_internes = [cx for cx in connexions if cx.amont is not None and cx.aval is not None]
+        try:
+            self.ordre, self.couche = tri_topologique(neurones)
+        except ValueError:
+            self.ordre, self.couche = None, {}
+
+    # les numeros ne sont construits qu'a la demande, un dict par connexion coute autant que la connexion
+    @functools.cached_property
+    def indice(self) -> dict[Neurone, int]:
+        return {n: i for i, n in enumerate(self.neurones)}
+
+    @functools.cached_property
+    def indice_connexion(self) -> dict[Connexion, int]:
+        return {cx: i for i, cx in enumerate(self.connexions)}
+
+    @functools.cached_property
+    def aretes(self) -> list[tuple[str, str]]:
+        """(amont, aval) de chaque connexion pour le dessin, partagé par tous les instantanés."""
+        return [(c.amont and c.amont.name or "optique", c.aval and c.aval.name or "sortie") for c in self.connexions]
+
+
+class Instantane:
+    """
+    Ce que Reseau.draw() dessinerait, copié au moment de la demande :
+    valeurs, biais et ecarts des neurones, poids et valeurs brutes des
+    connexions. Le dessin (graphviz + dot) se fait plus tard, voir rendre().
+    """
+    __slots__ = ("nom", "iteration", "noms", "aretes", "valeurs", "biais", "ecarts", "poids", "brutes")
+
+    def __init__(self, reseau: 'Reseau', nom: str) -> None:
+        topo = reseau.topologie()
+        self.nom = nom
+        self.iteration = reseau.learning_iterations
+        self.noms = [n.name for n in reseau.neurones]
+        self.aretes = topo.aretes
+        self.valeurs = [n.value for n in reseau.neurones]
+        self.biais = [n.biais for n in reseau.neurones]
+        self.ecarts = [n.ecart for n in reseau.neurones]
+        self.poids = [c.poids for c in reseau.connexions]
+        self.brutes = [c.raw_value for c in reseau.connexions]
+
+    def rendre(self, do_display: bool = False) -> None:
+        """Dessine l'instantané avec graphviz, comme le faisait draw()."""
+        graph.dessine(
+            self.nom,
+            nodes=
+              [(nom, f"{v:.3f} ~ {b:.3f}" + (f" d: {e:.3f}" if e else ""), {'':''})
+               for nom, v, b, e in zip(self.noms, self.valeurs, self.biais, self.ecarts)]
+              + [("optique", "optique", {'color': 'green'})]
+              + [("sortie", "sortie", {'color': 'red'})],
+            edges=[(
+                amont,
+                aval,
+                f"{p:.3f}" + (f" ({r:.3f})" if r is not None else ""))
+                   for (amont, aval), p, r in zip(self.aretes, self.poids, self.brutes)],
+            do_display=do_display
+        )
+
+
+POLITIQUES = ("toujours", "iterations", "changement", "demande")
+
+
+class Instantanes:
+    """
+    Tampon circulaire des instantanés demandés par Reseau.draw(), pour que
+    le debug n'attende plus dot a chaque appel. Quand il est plein les plus
+    anciens sont oubliés.
+
+    politique choisit quelles demandes sont gardées :
+      "toujours" : toutes
+      "iterations" : seulement pendant les learning_iterations multiples de tous_les
+      "changement" : seulement si les poids ou biais ont changé depuis le dernier gardé
+      "demande" : aucune venant du debug, seulement les captures forcées (draw(do_display=True) ou capture(force=True))
+    """
+    tampon: deque[Instantane]
+    politique: str
+    tous_les: int
+    demandes: int
+    "nombre de demandes reçues, gardées ou non"
+
+    def __init__(self, capacite: int = 256, politique: str = "toujours", tous_les: int = 1) -> None:
+        if politique not in POLITIQUES:
+            raise ValueError(f"politique inconnue {politique!r}, choisir parmi {POLITIQUES}")
+        self.tampon = deque(maxlen=capacite)
+        self.politique = politique
+        self.tous_les = tous_les
+        self.demandes = 0
+
+    def __len__(self) -> int:
+        return len(self.tampon)
+
+    def __iter__(self) -> Iterator[Instantane]:
+        return iter(self.tampon)
+
+    def __getitem__(self, i: int) -> Instantane:
+        return self.tampon[i]
+
+    def capture(self, reseau: 'Reseau', nom: str, force: bool = False) -> Instantane | None:
+        """Garde un instantané du reseau si la politique le veut (ou si force)."""
+        self.demandes += 1
+        if not force:
+            if self.politique == "demande":
+                return None
+            if self.politique == "iterations" and reseau.learning_iterations % self.tous_les:
+                return None
+        inst = Instantane(reseau, nom)
+        if not force and self.politique == "changement" and self.tampon:
+            dernier = self.tampon[-1]
+            if dernier.poids == inst.poids and dernier.biais == inst.biais:
+                return None
+        self.tampon.append(inst)
+        return inst
+
+    def rendre(self, workers: int = 4, en_fond: bool = False) -> list[Future]:
+        """
+        Dessine tous les instantanés gardés dans un pool de threads (le
+        travail est fait par les processus dot) puis vide le tampon.
+        Avec en_fond on n'attend pas : les Future renvoyés disent quand
+        c'est fini.
+        """
+        a_rendre = list(self.tampon)
+        self.tampon.clear()
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = [pool.submit(inst.rendre) for inst in a_rendre]
+        pool.shutdown(wait=not en_fond)
+        if not en_fond:
+            for f in futures:
+                f.result()
+        return futures
+
 
 class Reseau:
     """
@@ -193,6 +457,23 @@ class Reseau:
     "Le nombre d'iterations faites lors de l'apprentissage"
     graphviz_draws : int
     "le nombre de fois qu'on a dessiné le reseau, pour generer des noms de fichiers qui se suivent."
+    version_poids : int
+    "incrementé a chaque modification des poids par les fix_*, pour savoir si la version compilée est a jour"
+    forward_passes : int
+    "le nombre de passes avant (fire / fire_compiled) faites sur ce reseau"
+    history : list[dict[str, float]]
+    "perte et precision de chaque epoque du dernier train()"
+    stop_reason : str
+    "pourquoi le dernier train() s'est arreté"
+    compile_courant : 'ReseauCompile | None'
+    "la derniere version compilée du reseau (voir compile())"
+    topologie_courante : Topologie | None
+    version_structure : int
+    "incrementé quand une Connexion touche un de nos neurones, pour savoir si topologie_courante est a jour"
+    instantanes : Instantanes
+    "les dessins demandés par draw(do_display=False), rendus plus tard"
+    rendus : list[Future]
+    "les dessins lancés en fond par le dernier train(debug=True)"
 
     def __init__(self) -> None:
         self.neurones = []
@@ -203,6 +484,15 @@ class Reseau:
 
         self.learning_iterations = 0
         self.graphviz_draws = 0
+        self.version_poids = 0
+        self.forward_passes = 0
+        self.history = []
+        self.stop_reason = ""
+        self.compile_courant = None
+        self.topologie_courante = None
+        self.version_structure = 0
+        self.instantanes = Instantanes()
+        self.rendus = []
 
         self.compute_entries()
         self.compute_sorties()
@@ -211,19 +501,22 @@ class Reseau:
         return "Neurones: " + str(len(self.neurones))+" Sorties: " \
         + ", ".join(str(s) for s in self.sorties)
 
+    def topologie(self) -> Topologie:
+        """L'index de structure du reseau, recalculé seulement si la structure a changé."""
+        t = self.topologie_courante
+        if t is None or t.cle != (self.version_structure, len(self.neurones), len(self.connexions)):
+            for n in self.neurones:
+                n.reseau = self  # pour etre prevenu des connexions ajoutées a ses neurones
+            t = self.topologie_courante = Topologie(self.neurones, self.connexions, self.version_structure)
+        return t
+
     def compute_entries(self) -> None:
         """Stocke parmi les neurones ceux qui sont en entree"""
-        for n in self.neurones:
-            if not n.is_entry():  # on suppose qu'on met les entrees d'abord
-                continue
-            self.optiques += [n]
+        self.optiques = list(self.topologie().entrees)  # on suppose qu'on met les entrees d'abord
     
     def compute_sorties(self) -> None:
         """Identifie les neurones de sortie (classification / regression)"""
-        for n in self.neurones:
-            if not n.is_sortie():
-                continue
-            self.sorties += [n]
+        self.sorties = list(self.topologie().sorties)
 
     def feed_entries(self, vals: tuple[float, ...]) -> None:
         for i, v in enumerate(vals):
@@ -259,6 +552,7 @@ class Reseau:
         Fait travailler les neurones de la premiere couche, puis ceux
         des couches suivante, etc.
         """
+        self.forward_passes += 1
         next_neurons = SetDeque(self.optiques)
 
         while next_neurons:
@@ -273,8 +567,82 @@ class Reseau:
                 if s.aval is not None:
                     next_neurons.append(s.aval) # on met la couche suivante
 
+    def compile(self) -> 'ReseauCompile':
+        """
+        Trie les neurones une fois pour toutes, les range en couches et
+        copie les poids dans des matrices contigues (voir ReseauCompile).
+        Le graphe d'objets reste la reference : si la structure change
+        il faut recompiler.
+        """
+        self.compile_courant = ReseauCompile(self)
+        return self.compile_courant
+
+    def compile_a_jour(self) -> 'ReseauCompile':
+        """
+        Renvoie la version compilée, en la (re)construisant si le reseau
+        a changé de structure, ou en relisant les poids si un fix_* les a
+        modifiés depuis. Les poids modifiés a la main sur les Connexion
+        ne sont pas detectés : appeler compile() dans ce cas.
+        """
+        c = self.compile_courant
+        if c is not None and c.a_ecrire:
+            # ne pas perdre un apprentissage fait avec ecrire=False
+            if c.version_poids != self.version_poids:
+                raise RuntimeError("les poids du graphe et ceux de la version compilée ont été "
+                                   "modifiés tous les deux, appeler ecrit_compile() avant de toucher au graphe")
+            if c.topologie is not self.topologie():
+                c.vers_graphe()
+        if c is None or c.topologie is not self.topologie():
+            return self.compile()
+        if c.version_poids != self.version_poids:
+            c.depuis_graphe()
+        return c
+
+    def ecrit_compile(self) -> None:
+        """
+        Recopie dans le graphe les poids que la version compilée a appris
+        sans les ecrire (fix_*_batch avec ecrire=False). Les fix_* d'un seul
+        exemple l'appellent avant de corriger le graphe, pour partir des
+        poids a jour.
+        """
+        c = self.compile_courant
+        if c is not None and c.a_ecrire:
+            c.vers_graphe()
+
+    def fire_compiled(self, inputs: tuple[float, ...], maj_valeurs: bool = True) -> list[float]:
+        """
+        Equivalent de feed_entries(inputs) puis fire(), mais calculé couche
+        par couche avec des produits matrice-vecteur.
+        Renvoie les valeurs des neurones de sortie ; avec maj_valeurs on
+        ecrit aussi la valeur de chaque neurone comme le ferait fire(),
+        pour pouvoir appeler classification() ensuite.
+        """
+        c = self.compile_a_jour()
+        self.forward_passes += 1
+        a = c.forward(np.asarray(inputs, dtype=float).reshape(1, -1))[0]
+        if maj_valeurs:
+            for i, v in enumerate(inputs):
+                self.optiques[i].entrees[0].feed(v)
+            for n, v in zip(c.neurones, a[c.nb_entrees:].tolist()):
+                n.value = v
+        return a[c.colonnes_sorties].tolist()
+
+    def predict_batch(self, inputs: 'np.ndarray | list[tuple[float, ...]]') -> tuple[np.ndarray, np.ndarray]:
+        """
+        Evalue tout un lot d'entrees (une ligne par exemple) en une seule
+        passe vectorisée, sans toucher aux valeurs des neurones.
+        Renvoie les valeurs des neurones de sortie (lot x sorties) et les
+        probabilités softmax correspondantes, celles de classification_softmax().
+        """
+        x = np.asarray(inputs, dtype=float)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        c = self.compile_a_jour()
+        valeurs = c.forward(x)[:, c.colonnes_sorties]
+        return valeurs, softmax_lignes(valeurs)
+
     def fix_rosen(self, known: tuple[float, ...], 
-            output: str, learning_rate: float, debug: bool=True):
+            output: str, learning_rate: float, debug: bool=True, forward: bool=True):
         """Fixe les poids, en partant de la sortie.
         On essaye chaque couple entree/sortie, et on modifie
         les poids selon l'algorithme de rosenblatt.
@@ -287,14 +655,20 @@ class Reseau:
         d'un neurone et de connaitre sa force via la derivation.        
         todo: minima locaux (annealed reheat?)
         todo: penrose
+
+        forward=False reprend les valeurs de la derniere passe avant, quand
+        l'appelant vient deja de faire feed_entries(known) et fire().
         """
+        self.ecrit_compile()
+        self.version_poids += 1
 
-        self.draw(do_display=False, name=f"{self.name} iteration {self.learning_iterations} feature {known}, avant feed", skip=not debug)
+        if forward:
+            self.draw(do_display=False, name=f"{self.name} iteration {self.learning_iterations} feature {known}, avant feed", skip=not debug)
 
-        self.feed_entries(known)
-        self.draw(do_display=False, name=f"{self.name} iteration {self.learning_iterations} feature {known}, apres feed", skip=not debug)
+            self.feed_entries(known)
+            self.draw(do_display=False, name=f"{self.name} iteration {self.learning_iterations} feature {known}, apres feed", skip=not debug)
 
-        self.fire()  # feed forward
+            self.fire()  # feed forward
         self.draw(do_display=False, name=f"{self.name} iteration {self.learning_iterations} feature {known}, apres propagation", skip=not debug)
         
         for out_n in self.sorties:
@@ -314,13 +688,17 @@ class Reseau:
 
     def fix_chain_rule(self, known: tuple[float, ...], 
             expected_output: dict[str, Literal[-1, 1]], 
-            learning_rate: float, debug: bool=True):
+            learning_rate: float, debug: bool=True, forward: bool=True):
         """
         Implément algorithme de werbos avec fonction continue, usage de dérivée
         et chain rule.
+        forward=False reprend la derniere passe avant (voir fix_rosen).
         """
-        self.feed_entries(known)
-        self.fire()
+        self.ecrit_compile()
+        self.version_poids += 1
+        if forward:
+            self.feed_entries(known)
+            self.fire()
 
         # erreur de la couche de sortie (ecart entre 1 et -1)
         for out in self.sorties:
@@ -332,10 +710,9 @@ class Reseau:
             if debug:
                 print(f"delta sortie {out.name} = {out.ecart}")
 
+        topo = self.topologie()
         # erreurs des couches cachées, héritées des erreurs des couches suivantes
-        for n in reversed(self.neurones):
-            if n.is_sortie() or n.is_entry():
-                continue
+        for n in topo.caches_inverse:
             ecart = 0
             for cx in n.sorties:
                 if cx.aval is not None:
@@ -346,10 +723,7 @@ class Reseau:
                 print(f"delta caché {n.name} = {n.ecart}")
 
         # mis a jour des poids en fonction de l'ecart
-        for cx in self.connexions:
-            if cx.amont is None or cx.aval is None:
-                continue
-
+        for cx in topo.connexions_internes:
             grad = cx.amont.value * cx.aval.ecart
             cx.poids -= learning_rate * grad
 
@@ -364,13 +738,17 @@ class Reseau:
         known: tuple[float, ...],
         target_output: str,
         learning_rate: float,
-        debug: bool = True
+        debug: bool = True,
+        forward: bool = True
     ):
+        self.ecrit_compile()
+        self.version_poids += 1
         # -----------------
-        # Forward
+        # Forward (sauf si l'appelant vient de la faire)
         # -----------------
-        self.feed_entries(known)
-        self.fire()
+        if forward:
+            self.feed_entries(known)
+            self.fire()
 
         # -----------------
         # Softmax sur sorties
@@ -392,10 +770,8 @@ class Reseau:
         # -----------------
         # Delta couches cachées
         # -----------------
-        for n in reversed(self.neurones):
-            if n.is_sortie() or n.is_entry():
-                continue
-
+        topo = self.topologie()
+        for n in topo.caches_inverse:
             err = 0.0
             for cx in n.sorties:
                 if cx.aval is not None:
@@ -409,84 +785,443 @@ class Reseau:
         # -----------------
         # Mise à jour poids
         # -----------------
-        for cx in self.connexions:
-            if cx.amont is None or cx.aval is None:
-                continue
-
+        for cx in topo.connexions_internes:
             grad = cx.amont.value * cx.aval.ecart
             cx.poids -= learning_rate * grad
 
         # -----------------
         # Mise à jour biais
         # -----------------
-        for n in self.neurones:
-            if not n.is_entry():
-                # forward uses z = sum - bias, so update bias with opposite sign
-                n.biais += learning_rate * n.ecart
+        for n in topo.non_entrees:
+            # forward uses z = sum - bias, so update bias with opposite sign
+            n.biais += learning_rate * n.ecart
+
+    def fix_chain_rule_batch(
+        self,
+        inputs: 'np.ndarray | list[tuple[float, ...]]',
+        expected_outputs: list[dict[str, Literal[-1, 1]]],
+        learning_rate: float,
+        ecrire: bool = True
+    ) -> float:
+        """
+        fix_chain_rule pour tout un lot : une passe avant et une
+        retropropagation matricielles sur la version compilée, puis une
+        seule correction avec la moyenne des gradients.
+        Avec ecrire=False les poids ne sont pas recopiés dans les Connexion
+        et Neurone (appeler ecrit_compile() a la fin ; les fix_* d'un seul
+        exemple le font d'eux-memes).
+        Renvoie l'erreur quadratique moyenne avant correction.
+        """
+        c = self.compile_a_jour()
+        a = c.forward(np.asarray(inputs, dtype=float))
+        d = c.derivees(a)
+        y = np.array([[e.get(s.name, -1.0) for s in self.sorties] for e in expected_outputs])
+        sorties = a[:, c.colonnes_sorties]
+        c.retropropagation(a, (sorties - y) * d[:, c.colonnes_sorties], learning_rate, d)
+        if ecrire:
+            c.vers_graphe()
+        return float(((sorties - y) ** 2).mean())
+
+    def fix_chain_rule_softmax_batch(
+        self,
+        inputs: 'np.ndarray | list[tuple[float, ...]]',
+        target_outputs: list[str],
+        learning_rate: float,
+        ecrire: bool = True
+    ) -> float:
+        """
+        fix_chain_rule_softmax pour tout un lot (voir fix_chain_rule_batch).
+        Renvoie l'entropie croisée moyenne avant correction.
+        """
+        c = self.compile_a_jour()
+        a = c.forward(np.asarray(inputs, dtype=float))
+        probs = softmax_lignes(a[:, c.colonnes_sorties])
+        noms = [s.name for s in self.sorties]
+        cibles = [noms.index(t) for t in target_outputs]
+        y = np.zeros_like(probs)
+        y[np.arange(len(cibles)), cibles] = 1.0
+        c.retropropagation(a, probs - y, learning_rate)
+        if ecrire:
+            c.vers_graphe()
+        return float(-np.log(probs[np.arange(len(cibles)), cibles] + 1e-12).mean())
 
     def train(self, known: dict[tuple[float, ...], int], outputs: list[str], 
               max_iterations: int = 15, learning_rate: float=0.25, debug: bool=False,
-              use_softmax:bool = False) -> bool:
+              use_softmax:bool = False, loss_threshold: float | None = None,
+              plateau: int = 0, min_delta: float = 0.0, max_seconds: float | None = None,
+              should_stop: Callable[[], bool] | None = None) -> bool:
         """
         Donne une serie d'entrees et compare la sortie avec la sortie
         attendue. Tant que la sortie ne correspond pas a ce qui est attendu,
         ajuste les poids pour obtenir ce qu'on cherche.
         Pour permette une convergence on ne retro propage que les doublets 
-        qui ne fonctionnent pas.
+        qui ne fonctionnent pas. La passe avant faite pour classifier un
+        exemple sert aussi a sa correction (fix_* avec forward=False).
 
         Essaye :max_iterations: fois avant d'abandonner (ce qui arrive dans les
         configurations de donnees non lineairement separables)
 
         On prend un learnig rate multiple de 2 qui evite d'avoir des mantisses illisibles
+
+        Chaque epoque (un passage sur known) ajoute sa perte et sa precision a
+        self.history : entropie croisée moyenne avec use_softmax, sinon taux
+        d'erreur. On s'arrete, avec la raison dans self.stop_reason, quand :
+          "converge" : tous les exemples sont bien classés (renvoie True)
+          "loss_threshold" : la perte de l'epoque est <= loss_threshold
+          "plateau" : la perte n'a pas baissé de min_delta depuis plateau epoques
+          "max_seconds" : max_seconds secondes se sont ecoulées
+          "interrupted" : should_stop() a renvoyé vrai (train_restarts l'utilise
+                          pour arreter les copies quand une autre a convergé)
+          "max_iterations" : learning_iterations a depassé max_iterations
+
+        Avec debug les instantanés pris par les fix_* sont dessinés en fond a
+        la fin ; attendre self.rendus (des Future) avant de regarder les fichiers.
         """
-        while True:
-            self.learning_iterations += 1
-            need_fixing = False
-            for feat, o_idx in known.items():
-                ot = outputs[o_idx]
-                self.feed_entries(feat)
-                self.fire()
-                if use_softmax:
-                    c = self.classification_werbos()
-                else:
-                    c = self.classification()
-                if not c or c.name != ot: ## aucune sortie ne s'allume ou la mauvaise sortie s'allume
-                    if debug:
-                        print(f"resultat insatisfaisant feature {feat}, classification {c} fix", file=sys.stderr)
+        debut = time.perf_counter()
+        self.history = []
+        meilleure_perte = math.inf
+        sans_progres = 0
+        try:
+            while True:
+                self.learning_iterations += 1
+                need_fixing = False
+                perte = 0.0
+                justes = 0
+                for feat, o_idx in known.items():
+                    ot = outputs[o_idx]
+                    self.feed_entries(feat)
+                    self.fire()
                     if use_softmax:
-                        self.fix_chain_rule_softmax(feat, ot, learning_rate, debug)
+                        c = self.classification_werbos()
+                        probs = softmax([n.value for n in self.sorties])
+                        p = sum(pr for n, pr in zip(self.sorties, probs) if n.name == ot)
+                        perte -= math.log(max(p, 1e-12))
+                    else:
+                        c = self.classification()
+                    if not c or c.name != ot: ## aucune sortie ne s'allume ou la mauvaise sortie s'allume
+                        if debug:
+                            print(f"resultat insatisfaisant feature {feat}, classification {c} fix", file=sys.stderr)
+                        if use_softmax:
+                            self.fix_chain_rule_softmax(feat, ot, learning_rate, debug, forward=False)
+                        else:
+                            self.fix_rosen(feat, ot, learning_rate, debug, forward=False) # on ne fix que l'exemple qui ne fonctionne pas, on force o_idx a zero
+                        # self.draw(do_display=True, name=self.name + " iteration " + str(max_iterations))
+                        need_fixing = True
                     else:
-                        self.fix_rosen(feat, ot, learning_rate, debug) # on ne fix que l'exemple qui ne fonctionne pas, on force o_idx a zero
-                    # self.draw(do_display=True, name=self.name + " iteration " + str(max_iterations))
-                    need_fixing = True
+                        justes += 1
+                        if debug:
+                            print(f"resultat correct feature {feat}, classification {c}", file=sys.stderr)
+
+                precision = justes / len(known)
+                perte = perte / len(known) if use_softmax else 1 - precision
+                self.history.append({"epoch": self.learning_iterations, "loss": perte, "accuracy": precision})
+
+                ## plus besoin de fix
+                if need_fixing == False:
+                    self.stop_reason = "converge"
+                    return True
+                if loss_threshold is not None and perte <= loss_threshold:
+                    self.stop_reason = "loss_threshold"
+                    return False
+                if perte < meilleure_perte - min_delta:
+                    meilleure_perte = perte
+                    sans_progres = 0
                 else:
-                    if debug:
-                        print(f"resultat correct feature {feat}, classification {c}", file=sys.stderr)
-            ## plus besoin de fix
-            if need_fixing == False:
-                return True
-            if self.learning_iterations > max_iterations:
-                # self.draw()
-                return False
+                    sans_progres += 1
+                if plateau and sans_progres >= plateau:
+                    self.stop_reason = "plateau"
+                    return False
+                if max_seconds is not None and time.perf_counter() - debut >= max_seconds:
+                    self.stop_reason = "max_seconds"
+                    return False
+                if should_stop is not None and should_stop():
+                    self.stop_reason = "interrupted"
+                    return False
+                if self.learning_iterations > max_iterations:
+                    # self.draw()
+                    self.stop_reason = "max_iterations"
+                    return False
+        finally:
+            if debug and self.instantanes:
+                self.rendus = self.instantanes.rendre(en_fond=True)
 
     def draw(self, do_display: bool = True, name: str = "", skip: bool=False):
+        """
+        Avec do_display le reseau est dessiné et affiché tout de suite.
+        Sinon (les appels de debug des fix_*) on ne fait que copier son etat
+        dans self.instantanes, selon sa politique, et le dessin se fait plus
+        tard avec self.instantanes.rendre().
+        """
         if skip: ## evite d'avoir des if debug: partout
             return
-        graph.dessine(
-            f"{self.graphviz_draws} {name or self.name}", 
-            nodes=
-              [(n.name, f"{n.value:.3f} ~ {n.biais:.3f}" + (f" d: {n.ecart:.3f}" if n.ecart else ""), {'':''}) for n in self.neurones]
-              + [("optique", "optique", {'color': 'green'})]
-              + [("sortie", "sortie", {'color': 'red'})], 
-            edges=[(
-                c.amont and c.amont.name or "optique", 
-                c.aval and c.aval.name or "sortie", 
-                f"{c.poids:.3f}" +  (f" ({c.raw_value:.3f})" if c.raw_value is not None else "")) 
-                   for c in self.connexions], 
-            do_display=do_display
-        )
-
+        nom = f"{self.graphviz_draws} {name or self.name}"
         self.graphviz_draws += 1
+        if do_display:
+            Instantane(self, nom).rendre(do_display=True)
+        else:
+            self.instantanes.capture(self, nom)
+
+# equivalents numpy des fonctions d'activation, appliqués a toute une couche
+_ACTIVATIONS_NUMPY: dict[Callable, Callable] = {
+    act_identity: lambda z, s: z,
+    heave: lambda z, s: np.where(z > s, 1.0, np.where(z < s, 0.0, 0.5)),
+    sign: lambda z, s: np.sign(z - s),
+    logi: lambda z, s: 1 / (1 + np.exp(-z + s)),
+    tanh: lambda z, s: np.tanh(z - s),
+}
+
+
+# et des derivées exprimées en fonction de l'activation, pour la backprop
+_DERIVEES_NUMPY: dict[Callable, Callable] = {
+    d_logi_from_logi: lambda a: a * (1 - a),
+    d_tanh_from_tanh: lambda a: 1 - a * a,
+    d_act_identity: lambda a: np.ones_like(a),
+    d_par_defaut: lambda a: a,
+}
+
+
+def activation_numpy(f: Callable[[float, float], float]) -> Callable:
+    """Version vectorisée d'une fonction d'activation (z, seuil) -> valeur."""
+    if f in _ACTIVATIONS_NUMPY:
+        return _ACTIVATIONS_NUMPY[f]
+    return np.vectorize(f, otypes=[float])
+
+
+def derivee_numpy(df: Callable[[float], float]) -> Callable:
+    """Version vectorisée d'une derivée d_value_f (activation) -> pente."""
+    if df in _DERIVEES_NUMPY:
+        return _DERIVEES_NUMPY[df]
+    return np.vectorize(df, otypes=[float])
+
+
+class CoucheCompilee:
+    """
+    Une couche du reseau compilé : les neurones de meme profondeur,
+    la matrice de leurs poids entrants et leurs biais.
+    """
+    neurones: list[Neurone]
+    colonnes: np.ndarray  # colonnes de ces neurones dans le tableau des activations
+    sources: np.ndarray  # colonnes lues par la couche (entrees brutes ou neurones amont)
+    poids: np.ndarray  # len(neurones) x len(sources)
+    biais: np.ndarray
+    constantes: np.ndarray  # somme des connexions a valeur fixe (ni alimentées ni issues d'un neurone)
+    connexions: list[tuple[int, int, Connexion]]  # (ligne, colonne dans poids, connexion d'origine)
+    apprenables: np.ndarray  # meme forme que poids, vrai la ou une connexion entre neurones existe
+    diagonale: bool  # une seule source par neurone, propre a chacun (couche d'entree) : pas besoin de produit matriciel
+    groupes: list[tuple[np.ndarray, Callable, Callable]]  # (lignes, activation, derivée) par fonction
+    lignes_sorties: np.ndarray  # vrai pour les neurones de sortie (leur ecart est donné)
+    lignes_cachees: np.ndarray  # vrai pour les neurones ni d'entree ni de sortie (ecart retropropagé)
+
+    def __init__(self, neurones: list[Neurone], colonnes: list[int],
+                 sorties: set[Neurone], entrees: set[Neurone]) -> None:
+        self.neurones = neurones
+        self.colonnes = np.array(colonnes, dtype=int)
+        self.connexions = []
+        self.constantes = np.zeros(len(neurones))
+        self.lignes_sorties = np.array([n in sorties for n in neurones], dtype=bool)
+        self.lignes_cachees = np.array([n not in sorties and n not in entrees for n in neurones], dtype=bool)
+        par_fonction: dict[tuple[Callable, Callable], list[int]] = {}
+        for r, n in enumerate(neurones):
+            par_fonction.setdefault((n.value_f, n.d_value_f), []).append(r)
+        self.groupes = [
+            (np.array(lignes, dtype=int), activation_numpy(f), derivee_numpy(df))
+            for (f, df), lignes in par_fonction.items()
+        ]
+
+
+class ReseauCompile:
+    """
+    Version "compilée" d'un Reseau pour le calcul : les neurones sont triés
+    une fois, groupés par couche, et les poids de chaque couche sont rangés
+    dans une matrice. Une passe avant devient un produit matrice-vecteur par
+    couche au lieu d'un parcours du graphe connexion par connexion.
+
+    Les activations sont rangées dans un tableau dont les nb_entrees premieres
+    colonnes sont les valeurs données aux neurones d'entree (celles de
+    feed_entries) et les suivantes les neurones, dans l'ordre topologique.
+
+    Le graphe d'objets reste la reference : depuis_graphe() relit les poids
+    et biais des Connexion/Neurone, vers_graphe() les y réécrit.
+    """
+    reseau: Reseau
+    neurones: list[Neurone]
+    nb_entrees: int
+    colonne: dict[Neurone, int]
+    couches: list[CoucheCompilee]
+    colonnes_sorties: np.ndarray
+    topologie: Topologie
+    "l'index de structure utilisé pour compiler"
+    a_ecrire: bool
+    "vrai quand les poids compilés ont été appris sans etre recopiés dans le graphe"
+    version_poids: int
+    "version des poids du reseau lors de la derniere synchronisation"
+
+    def __init__(self, reseau: Reseau) -> None:
+        self.reseau = reseau
+        self.topologie = reseau.topologie()
+        if self.topologie.ordre is None:
+            raise ValueError("le reseau contient un cycle, impossible de le compiler")
+        ordre, profondeur = self.topologie.ordre, self.topologie.couche
+        self.a_ecrire = False
+        self.neurones = ordre
+        self.nb_entrees = len(reseau.optiques)
+        self.colonne = {n: self.nb_entrees + i for i, n in enumerate(ordre)}
+        self.colonnes_sorties = np.array([self.colonne[n] for n in reseau.sorties], dtype=int)
+        # la connexion alimentée par feed_entries pour chaque entree
+        entrees_brutes = {o.entrees[0]: i for i, o in enumerate(reseau.optiques)}
+
+        par_couche: dict[int, list[Neurone]] = {}
+        for n in ordre:
+            par_couche.setdefault(profondeur[n], []).append(n)
+
+        sorties, optiques = set(reseau.sorties), set(reseau.optiques)
+        self.couches = []
+        for num in sorted(par_couche):
+            neurones = par_couche[num]
+            couche = CoucheCompilee(neurones, [self.colonne[n] for n in neurones], sorties, optiques)
+            sources: list[int] = []
+            position: dict[int, int] = {}
+            for r, n in enumerate(neurones):
+                for cx in n.entrees:
+                    if cx.amont is not None:
+                        col = self.colonne[cx.amont]
+                    elif cx in entrees_brutes:
+                        col = entrees_brutes[cx]
+                    else:
+                        couche.connexions.append((r, -1, cx))
+                        continue
+                    if col not in position:
+                        position[col] = len(sources)
+                        sources.append(col)
+                    couche.connexions.append((r, position[col], cx))
+            paires = [(r, c) for r, c, _ in couche.connexions if c >= 0]
+            if len(set(paires)) != len(paires):
+                raise ValueError("connexions en double entre deux neurones, impossible de les ranger dans une matrice")
+            couche.sources = np.array(sources, dtype=int)
+            couche.poids = np.zeros((len(neurones), len(sources)))
+            # les poids des entrees brutes ne sont pas appris, comme dans fix_chain_rule
+            couche.apprenables = np.zeros(couche.poids.shape, dtype=bool)
+            for r, c, cx in couche.connexions:
+                if c >= 0 and cx.amont is not None:
+                    couche.apprenables[r, c] = True
+            couche.diagonale = sorted(paires) == [(r, r) for r in range(len(neurones))]
+            couche.biais = np.zeros(len(neurones))
+            self.couches.append(couche)
+
+        self.depuis_graphe()
+
+    def depuis_graphe(self) -> None:
+        """Relit les poids des connexions et les biais des neurones."""
+        for couche in self.couches:
+            couche.constantes[:] = 0
+            for r, c, cx in couche.connexions:
+                if c >= 0:
+                    couche.poids[r, c] = cx.poids
+                else:
+                    couche.constantes[r] += (cx.raw_value or 0) * cx.poids
+            couche.biais[:] = [n.biais for n in couche.neurones]
+        self.version_poids = self.reseau.version_poids
+
+    def vers_graphe(self) -> None:
+        """Réécrit les poids et biais compilés dans les Connexion et Neurone."""
+        for couche in self.couches:
+            for r, c, cx in couche.connexions:
+                if c >= 0:
+                    cx.poids = float(couche.poids[r, c])
+            for n, b in zip(couche.neurones, couche.biais.tolist()):
+                n.biais = b
+        self.a_ecrire = False
+        self.reseau.version_poids += 1
+        self.version_poids = self.reseau.version_poids
+
+    def vecteur(self) -> np.ndarray:
+        """
+        Les parametres appris, a plat : pour chaque couche les poids entre
+        neurones puis les biais des neurones non d'entree (ceux que
+        retropropagation() modifie). Deux reseaux construits de la meme
+        façon ont des vecteurs de meme taille et de meme ordre.
+        """
+        morceaux = []
+        for couche in self.couches:
+            morceaux.append(couche.poids[couche.apprenables])
+            morceaux.append(couche.biais[couche.lignes_sorties | couche.lignes_cachees])
+        return np.concatenate(morceaux)
+
+    def charge_vecteur(self, v: np.ndarray) -> None:
+        """Remet dans les couches un vecteur de la forme de vecteur()."""
+        debut = 0
+        for couche in self.couches:
+            fin = debut + int(np.count_nonzero(couche.apprenables))
+            couche.poids[couche.apprenables] = v[debut:fin]
+            lignes = couche.lignes_sorties | couche.lignes_cachees
+            debut, fin = fin, fin + int(np.count_nonzero(lignes))
+            couche.biais[lignes] = v[debut:fin]
+            debut = fin
+        if debut != len(v):
+            raise ValueError(f"vecteur de {len(v)} parametres, le reseau en attend {debut}")
+        self.a_ecrire = True
+
+    def forward(self, entrees: np.ndarray) -> np.ndarray:
+        """
+        Passe avant pour un lot d'entrees (une ligne par exemple).
+        Renvoie le tableau des activations : lot x (nb_entrees + nb neurones).
+        """
+        a = np.zeros((len(entrees), self.nb_entrees + len(self.neurones)))
+        a[:, :self.nb_entrees] = entrees
+        for couche in self.couches:
+            if couche.diagonale:
+                z = a[:, couche.sources] * np.diagonal(couche.poids) + couche.constantes
+            else:
+                z = a[:, couche.sources] @ couche.poids.T + couche.constantes
+            for lignes, f, _ in couche.groupes:
+                a[:, couche.colonnes[lignes]] = f(z[:, lignes], couche.biais[lignes])
+        return a
+
+    def derivees(self, a: np.ndarray) -> np.ndarray:
+        """Les d_value_f de chaque neurone appliquées aux activations de forward()."""
+        d = np.zeros_like(a)
+        for couche in self.couches:
+            for lignes, _, df in couche.groupes:
+                cols = couche.colonnes[lignes]
+                d[:, cols] = df(a[:, cols])
+        return d
+
+    def retropropagation(self, a: np.ndarray, ecarts_sorties: np.ndarray,
+                         learning_rate: float, d: np.ndarray | None = None) -> None:
+        """
+        Meme regle que fix_chain_rule / fix_chain_rule_softmax, mais pour
+        tout un lot : les ecarts des couches cachées sont calculés couche par
+        couche en partant de la sortie (produits matriciels), puis les poids
+        et biais sont corrigés une seule fois avec la moyenne des gradients
+        du lot. Les poids des entrees brutes et les biais des neurones
+        d'entree ne bougent pas.
+
+        a : activations renvoyées par forward()
+        ecarts_sorties : ecart de chaque neurone de sortie (lot x sorties)
+        d : derivees(a) si on les a deja calculées
+        """
+        if d is None:
+            d = self.derivees(a)
+        lot = len(a)
+        erreurs = np.zeros_like(a)  # somme des ecarts aval ponderés, par colonne
+        erreurs[:, self.colonnes_sorties] = ecarts_sorties
+        ecarts = []
+        for couche in reversed(self.couches):
+            cols = couche.colonnes
+            ecart = np.where(couche.lignes_sorties, erreurs[:, cols], 0.0)
+            ecart += np.where(couche.lignes_cachees, erreurs[:, cols] * d[:, cols], 0.0)
+            if couche.apprenables.any():  # inutile de remonter vers les entrees brutes
+                erreurs[:, couche.sources] += ecart @ couche.poids
+            ecarts.append(ecart)
+
+        for couche, ecart in zip(reversed(self.couches), ecarts):
+            if couche.apprenables.any():
+                grad = ecart.T @ a[:, couche.sources] / lot
+                couche.poids -= learning_rate * grad * couche.apprenables
+            # forward utilise z - biais, d'ou le signe
+            couche.biais += learning_rate * ecart.mean(axis=0)
+        self.a_ecrire = True
+
 
 def mcculloch_pitts_neuron(entries: int, seuil:float = 0) -> Reseau:
     """1943 :
@@ -552,7 +1287,43 @@ def rosenblatt_perceptron(num_entries: int, sorties: list[str], hidden: list[int
 
     return reseau
 
-def werbos_hidden(num_entries: int, sorties: list[str], hidden: list[int]= []) -> Reseau:
+INITIALISATIONS = ("uniforme", "xavier", "he")
+
+
+def poids_initiaux(init: str, fan_in: int, fan_out: int, rng: random.Random | None = None) -> list[float]:
+    """
+    Tire les fan_in * fan_out poids d'une couche dense.
+    uniforme : entre -1 et 1, comme a l'origine
+    xavier : uniforme entre +-sqrt(6 / (fan_in + fan_out)), adapté a tanh / sigmoide
+    he : gaussienne d'ecart type sqrt(2 / fan_in), adapté aux couches profondes
+    """
+    r = rng or random
+    n = fan_in * fan_out
+    if init == "uniforme":
+        return [r.uniform(-1, 1) for _ in range(n)]
+    if init == "xavier":
+        limite = math.sqrt(6 / (fan_in + fan_out))
+        return [r.uniform(-limite, limite) for _ in range(n)]
+    if init == "he":
+        ecart_type = math.sqrt(2 / fan_in)
+        return [r.gauss(0, ecart_type) for _ in range(n)]
+    raise ValueError(f"initialisation inconnue {init!r}, choisir parmi {INITIALISATIONS}")
+
+
+def couche_dense(reseau: Reseau, sources: list[Neurone], neurones: list[Neurone],
+                 init: str = "uniforme", rng: random.Random | None = None) -> list[Neurone]:
+    """
+    Ajoute au reseau une couche de neurones reliée entierement a la couche
+    sources, avec un bloc de poids tirés par poids_initiaux.
+    """
+    reseau.neurones.extend(neurones)
+    poids = poids_initiaux(init, len(sources), len(neurones), rng)
+    reseau.connexions.extend(Connexion.dense(sources, neurones, poids))
+    return neurones
+
+
+def werbos_hidden(num_entries: int, sorties: list[str], hidden: list[int]= [],
+                  init: str = "uniforme", rng: random.Random | None = None) -> Reseau:
     """1974 :
     Plutot que d'utiliser une fonction seuil qui occulte
     la contribution de chaque neurone a la sortie finale,
@@ -560,6 +1331,9 @@ def werbos_hidden(num_entries: int, sorties: list[str], hidden: list[int]= []) -
     ou tanh comme fonction d'activation, et emploie cette 
     derivee avec la regle de chainage pour modifier 
     les poids de maniere lineaire.
+
+    Chaque couche cachée de hidden est reliée entierement a la precedente,
+    init choisit le tirage des poids (voir poids_initiaux).
     """
 
     reseau = Reseau()
@@ -573,28 +1347,284 @@ def werbos_hidden(num_entries: int, sorties: list[str], hidden: list[int]= []) -
         reseau.neurones += [neuron]
         reseau.connexions += [Connexion(value=0, amont=None, aval=neuron)]
 
-    # couches intermediaires
-    nen: list[Neurone] = []
+    # couches intermediaires, chacune reliée a la precedente
     for num_inter, inter in enumerate(hidden):
-        for i in range(inter):
-            neuron = Neurone(tanh, f"h{num_inter}-{i}", d_value_f=d_tanh_from_tanh)
-            nen.append(neuron)
-            reseau.neurones += [neuron]
-            for ne in en:
-                reseau.connexions += [Connexion(None, ne, neuron, poids=random.uniform(-1, 1))]
-        en = nen
+        nen = [Neurone(tanh, f"h{num_inter}-{i}", d_value_f=d_tanh_from_tanh) for i in range(inter)]
+        en = couche_dense(reseau, en, nen, init, rng)
 
-    # neurone de sortie
-    for sv in sorties:
-        
-        sortie = Neurone(act_identity, sv, d_value_f=lambda x: 1.0)
-        reseau.neurones += [sortie]
+    # neurones de sortie
+    nsorties = [Neurone(act_identity, sv, d_value_f=d_act_identity) for sv in sorties]
+    couche_dense(reseau, en, nsorties, init, rng)
+    for sortie in nsorties:
         reseau.connexions += [Connexion(None, amont=sortie, aval=None)]
 
-        for ne in en:
-            reseau.connexions += [Connexion(None, ne, sortie, poids=random.uniform(-1, 1))]
-
     reseau.compute_entries()
     reseau.compute_sorties()
 
     return reseau
+
+
+def graines_independantes(graine: int, n: int) -> list[int]:
+    """
+    Derive n graines d'une seule, pour des tirages paralleles qui ne se
+    recoupent pas (numpy SeedSequence), chacune reproductible seule.
+    """
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(graine).spawn(n)]
+
+
+# Evenement partagé par les processus de train_restarts, rempli par _init_restarts()
+_RESTARTS: dict = {}
+
+
+def _init_restarts(arret) -> None:
+    """Garde l'evenement d'arret dans le processus (initializer du ProcessPoolExecutor de train_restarts)."""
+    _RESTARTS["arret"] = arret
+
+
+def _entraine_graine(builder: Callable[..., Reseau], graine: int,
+                     known: dict[tuple[float, ...], int], outputs: list[str],
+                     train_kwargs: dict) -> dict:
+    """
+    Construit et entraine un reseau tiré avec la graine donnée (dans un
+    processus de train_restarts). On ne renvoie que les poids, reconstruire
+    le graphe cote parent coute moins que de le transferer.
+    L'entrainement s'arrete a la fin d'une epoque des que l'evenement
+    d'arret du processus est levé.
+    """
+    reseau = builder(rng=random.Random(graine))
+    arret = _RESTARTS.get("arret")
+    should_stop = arret.is_set if arret is not None else None
+    succes = reseau.train(known, outputs, should_stop=should_stop, **train_kwargs)
+    return {
+        "graine": graine,
+        "succes": succes,
+        "loss": reseau.history[-1]["loss"] if reseau.history else math.inf,
+        "learning_iterations": reseau.learning_iterations,
+        "forward_passes": reseau.forward_passes,
+        "stop_reason": reseau.stop_reason,
+        "history": reseau.history,
+        "poids": [cx.poids for cx in reseau.connexions],
+        "biais": [n.biais for n in reseau.neurones],
+    }
+
+
+def train_restarts(builder: Callable[..., Reseau], known: dict[tuple[float, ...], int], outputs: list[str],
+                   n: int = 8, workers: int | None = None, graine: int = 0,
+                   mode: Literal["first", "best"] = "first", graines: list[int] | None = None,
+                   **train_kwargs) -> tuple[Reseau, int]:
+    """
+    Entraine n copies du reseau construit par builder, chacune tirée avec sa
+    propre graine (graines_independantes(graine, n)), en parallele dans des
+    processus.
+    La convergence de werbos dépend beaucoup des poids de depart : on garde
+    la premiere copie qui converge (mode "first", les autres copies sont
+    alors arretées) ou, une fois toutes finies, celle qui converge avec la
+    plus petite perte (mode "best").
+    Si aucune ne converge, on garde celle qui a la plus petite perte.
+
+    builder doit pouvoir etre envoyé a un processus (fonction du module ou
+    functools.partial, pas de lambda) et accepter rng=random.Random, comme
+    werbos_hidden. Le reseau gagnant est reconstruit avec cette graine puis
+    reçoit les poids appris ; la graine est renvoyée avec, pour le
+    reproduire (train_restarts(..., n=1, graines=[g])).
+    train_kwargs est passé tel quel a Reseau.train.
+    """
+    graines = graines or graines_independantes(graine, n)
+    n = len(graines)
+    resultats: list[dict] = []
+    if workers == 1:
+        for g in graines:
+            resultats.append(_entraine_graine(builder, g, known, outputs, train_kwargs))
+            if mode == "first" and resultats[-1]["succes"]:
+                break
+    else:
+        arret = multiprocessing.Event()
+        pool = ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, n),
+                                   initializer=_init_restarts, initargs=(arret,))
+        try:
+            futures = [pool.submit(_entraine_graine, builder, g, known, outputs, train_kwargs) for g in graines]
+            for future in as_completed(futures):
+                resultats.append(future.result())
+                if mode == "first" and resultats[-1]["succes"]:
+                    break
+        finally:
+            # les copies pas encore lancées sont annulées, celles en cours
+            # s'arretent a la fin de leur epoque : on n'attend pas leur max_iterations
+            arret.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    meilleur = min(resultats, key=lambda r: (not r["succes"], r["loss"], r["graine"]))
+    if mode == "first" and any(r["succes"] for r in resultats):
+        meilleur = next(r for r in resultats if r["succes"])
+
+    reseau = builder(rng=random.Random(meilleur["graine"]))
+    for cx, p in zip(reseau.connexions, meilleur["poids"]):
+        cx.poids = p
+    for neurone, b in zip(reseau.neurones, meilleur["biais"]):
+        neurone.biais = b
+    reseau.version_poids += 1
+    reseau.learning_iterations = meilleur["learning_iterations"]
+    reseau.forward_passes = meilleur["forward_passes"]
+    reseau.stop_reason = meilleur["stop_reason"]
+    reseau.history = meilleur["history"]
+    return reseau, meilleur["graine"]
+
+
+METHODES_EVOLUTION = ("ga", "es")
+
+# Reseau compilé et donnees de chaque processus de train_evolution, remplis par _init_evolution()
+_EVOLUTION: dict = {}
+
+
+def _init_evolution(builder: Callable[..., Reseau], graine: int,
+                    entrees: np.ndarray, cibles: np.ndarray) -> None:
+    """
+    Construit et compile le reseau une fois par processus (initializer du
+    ProcessPoolExecutor de train_evolution) : ensuite seuls les vecteurs
+    de poids circulent.
+    """
+    _EVOLUTION["compile"] = builder(rng=random.Random(graine)).compile()
+    _EVOLUTION["entrees"] = entrees
+    _EVOLUTION["cibles"] = cibles
+
+
+def _evalue_vecteurs(vecteurs: np.ndarray) -> np.ndarray:
+    """
+    Precision et entropie croisée de chaque vecteur sur les donnees du
+    processus. La classe choisie est la sortie de plus grande valeur, comme
+    classification_softmax().
+    Renvoie un tableau len(vecteurs) x 2.
+    """
+    c, x, cibles = _EVOLUTION["compile"], _EVOLUTION["entrees"], _EVOLUTION["cibles"]
+    lignes = np.arange(len(cibles))
+    scores = np.empty((len(vecteurs), 2))
+    for i, v in enumerate(vecteurs):
+        c.charge_vecteur(v)
+        valeurs = c.forward(x)[:, c.colonnes_sorties]
+        probs = softmax_lignes(valeurs)
+        scores[i, 0] = np.mean(valeurs.argmax(axis=1) == cibles)
+        scores[i, 1] = -np.log(probs[lignes, cibles] + 1e-12).mean()
+    return scores
+
+
+def train_evolution(builder: Callable[..., Reseau], entrees: 'np.ndarray | list[tuple[float, ...]]',
+                    cibles: 'np.ndarray | list[int]', population: int = 256, generations: int = 100,
+                    methode: Literal["ga", "es"] = "ga", sigma: float = 0.1, elite: float = 0.1,
+                    learning_rate: float = 0.05, workers: int | None = None, graine: int = 0,
+                    max_seconds: float | None = None) -> Reseau:
+    """
+    Apprentissage sans gradient : une population de vecteurs de poids
+    (ReseauCompile.vecteur()) évolue, ce qui ne reste pas coincé dans les
+    minima locaux de la retropropagation.
+
+    entrees : une ligne par exemple, cibles : l'indice de la sortie attendue
+    (pour un known de train() : list(known), list(known.values())).
+    Un individu vaut par sa precision sur les exemples, a egalité par la plus
+    petite entropie croisée des sorties.
+
+    methode "ga" (algorithme genetique) : on garde la fraction elite des
+    meilleurs, les autres sont remplacés par des enfants de deux parents
+    tirés parmi la meilleure moitié (chaque poids vient de l'un ou de
+    l'autre) auxquels on ajoute un bruit normal d'ecart type sigma.
+    methode "es" (strategie d'evolution) : la population est un nuage de
+    bruits symetriques autour d'un vecteur moyen, deplacé a chaque
+    generation de learning_rate dans la direction des bruits les mieux
+    classés ; population doit donc etre paire.
+
+    L'evaluation de la population est repartie en workers paquets egaux,
+    un par processus : chaque processus construit le reseau une fois
+    (builder comme pour train_restarts, appelé avec rng=random.Random(graine))
+    et ne reçoit ensuite que des vecteurs. Les tirages sont faits dans le
+    processus principal, le resultat ne depend donc pas de workers.
+    workers=1 evalue sans processus.
+
+    Le meilleur individu rencontré est ecrit dans les poids et biais du
+    reseau renvoyé. history reçoit sa perte et sa precision a chaque
+    generation ; stop_reason vaut "converge" (tous les exemples bien
+    classés), "max_seconds" ou "max_iterations".
+    """
+    if methode not in METHODES_EVOLUTION:
+        raise ValueError(f"methode inconnue {methode!r}, choisir parmi {METHODES_EVOLUTION}")
+    if generations < 1:
+        raise ValueError(f"il faut au moins une generation, pas {generations}")
+    if methode == "ga" and population < 1:
+        raise ValueError(f"il faut au moins un individu, pas {population}")
+    if methode == "es" and (population < 2 or population % 2):
+        raise ValueError(f"la population de \"es\" est faite de paires de bruits opposés, "
+                         f"il faut un nombre pair >= 2, pas {population}")
+    debut = time.perf_counter()
+    x = np.asarray(entrees, dtype=float)
+    y = np.asarray(cibles, dtype=int)
+    reseau = builder(rng=random.Random(graine))
+    c = reseau.compile()
+    depart = c.vecteur()
+    tirage = np.random.default_rng(graine)
+
+    if methode == "ga":
+        individus = depart + sigma * tirage.standard_normal((population, len(depart)))
+        individus[0] = depart
+    else:
+        moyenne = depart.copy()
+
+    workers = max(1, min(workers or os.cpu_count() or 1, population))
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_evolution,
+                                   initargs=(builder, graine, x, y))
+    else:
+        _init_evolution(builder, graine, x, y)
+
+    def evalue(vecteurs: np.ndarray) -> np.ndarray:
+        if pool is None:
+            return _evalue_vecteurs(vecteurs)
+        return np.concatenate(list(pool.map(_evalue_vecteurs, np.array_split(vecteurs, workers))))
+
+    champion, meilleur = depart, (-1.0, math.inf)
+    reseau.history = []
+    try:
+        for generation in range(1, generations + 1):
+            if methode == "es":
+                bruits = tirage.standard_normal((population // 2, len(depart)))
+                bruits = np.concatenate([bruits, -bruits])
+                individus = moyenne + sigma * bruits
+            scores = evalue(individus)
+            # du meilleur au moins bon : precision decroissante puis entropie croissante
+            rangs = np.lexsort((scores[:, 1], -scores[:, 0]))
+            tete = rangs[0]
+            if (scores[tete, 0], -scores[tete, 1]) > (meilleur[0], -meilleur[1]):
+                champion, meilleur = individus[tete].copy(), (scores[tete, 0], scores[tete, 1])
+            reseau.learning_iterations += 1
+            reseau.history.append({"epoch": reseau.learning_iterations, "loss": float(meilleur[1]),
+                                   "accuracy": float(meilleur[0])})
+
+            if meilleur[0] >= 1.0:
+                reseau.stop_reason = "converge"
+                break
+            if max_seconds is not None and time.perf_counter() - debut >= max_seconds:
+                reseau.stop_reason = "max_seconds"
+                break
+            if generation == generations:
+                reseau.stop_reason = "max_iterations"
+                break
+
+            if methode == "ga":
+                nb_elite = max(1, int(elite * population))
+                parents = individus[rangs[:max(2, population // 2)]]
+                nb_enfants = population - nb_elite
+                a = parents[tirage.integers(len(parents), size=nb_enfants)]
+                b = parents[tirage.integers(len(parents), size=nb_enfants)]
+                enfants = np.where(tirage.random(a.shape) < 0.5, a, b)
+                enfants += sigma * tirage.standard_normal(enfants.shape)
+                individus = np.concatenate([individus[rangs[:nb_elite]], enfants])
+            else:
+                # rangs centrés dans [-0.5, 0.5], le meilleur en haut
+                poids_rangs = np.empty(len(individus))
+                poids_rangs[rangs] = np.linspace(0.5, -0.5, len(individus))
+                moyenne = moyenne + learning_rate / (len(individus) * sigma) * (poids_rangs @ bruits)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    c.charge_vecteur(champion)
+    c.vers_graphe()
+    return reseau
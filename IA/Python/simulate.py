@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Headless Flappy simulator: many independent birds stepped at once with numpy.
+
+    python simulate.py                              # ../SoftmaxC/model_weights.txt, 1000 games
+    python simulate.py --model other_weights.txt --games 5000 --steps 3600
+
+FlappySim reproduces the game of core-dotnet/FlappyCore/Flappy2.cs with the
+settings Root.cs gives it (gravity 100, obstacle speed 40, bird radius 1, 10
+obstacles of size 10 spaced by 50, gap 30), and computes the same quantities
+Root._Process() records in the demos, so features() rows are in the FEATURES
+order load_all() builds and can be fed to inference.Model directly.
+
+Two details of Flappy2 are kept as they are because the recorded demos (and so
+the trained models) depend on them:
+- the bird is clamped inside the world before the collision test, so touching
+  the ground or the roof never ends a game, only the obstacles do;
+- passes grows on every tick an obstacle is behind the bird while still
+  overlapping it (the C# "seen" set is keyed on the moving position).
+
+rollout() drives N birds with a model until they all crash or max_steps is
+reached. Birds that crash are frozen; only the living ones are scored.
+
+Requires numpy.
+"""
+import sys
+import json
+import time
+import argparse
+from typing import Any, Callable, Dict, Optional, Union
+
+import numpy as np
+
+try:
+    from . import train_from_demos
+    from .inference import Model, THRESHOLD
+except ImportError:  # run as a script, like train_from_demos.py
+    import train_from_demos
+    from inference import Model, THRESHOLD
+
+# World of Flappy2.cs, with the values Root.StartFlappy() passes to FlappyEntry.Init()
+WORLD_HEIGHT = 100.0
+WORLD_WIDTH = 100.0
+BIRD_X = 20.0
+BIRD_RADIUS = 1.0
+GRAVITY = 100.0
+FLAP_SPEED = 50.0
+N_OBSTACLES = 10
+OBSTACLE_SIZE = 10.0
+OBSTACLE_SPACING = 50.0
+GAP = train_from_demos.GAP
+SPEED = train_from_demos.SPEED
+# nearest_dx / nearest_y recorded by Root.cs when no obstacle is ahead
+NO_OBSTACLE_DX = 9999.0
+# Godot calls _Process() at 60 frames per second
+DT = 1.0 / 60.0
+
+# Anything returning one 0/1 decision per row of an (n, N_FEATURES) array
+Policy = Union[Model, Callable[[np.ndarray], np.ndarray]]
+
+
+class FlappySim:
+    """N independent Flappy games advanced together.
+
+    Args:
+        n: Number of birds (games)
+        n_obstacles: Obstacles per game
+        seed: Seed of the obstacle heights (numpy Generator), None for a random one
+
+    State, one row per bird: y, vy, obs_x / obs_y (n x n_obstacles), passes,
+    alive and steps (ticks survived).
+    """
+
+    def __init__(self, n: int, n_obstacles: int=N_OBSTACLES, seed: Optional[int]=None):
+        if n < 1 or n_obstacles < 1:
+            raise ValueError(f"Need at least one bird and one obstacle, got n={n}, n_obstacles={n_obstacles}")
+        self.n = n
+        self.n_obstacles = n_obstacles
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self) -> None:
+        """Start every game again, like Flappy2.Reset() (new obstacle heights)."""
+        n, k = self.n, self.n_obstacles
+        self.y = np.full(n, WORLD_HEIGHT / 2.0)
+        self.vy = np.zeros(n)
+        self.obs_x = np.tile(WORLD_WIDTH + OBSTACLE_SPACING * np.arange(k, dtype=np.float64), (n, 1))
+        self.obs_y = self._obstacle_heights(n * k).reshape(n, k)
+        self.passes = np.zeros(n, dtype=np.int64)
+        self.alive = np.ones(n, dtype=bool)
+        self.steps = np.zeros(n, dtype=np.int64)
+
+    def _obstacle_heights(self, count: int) -> np.ndarray:
+        """Bottom of the gap, uniform in [25, 75) like GenerateNextObstacleY()."""
+        return self.rng.random(count) * (WORLD_HEIGHT * 0.5) + WORLD_HEIGHT * 0.25
+
+    def features(self) -> np.ndarray:
+        """Model inputs of every bird, computed like Root._Process().
+
+        Returns: (n, N_FEATURES) array in the FEATURES order
+        """
+        ahead = self.obs_x > BIRD_X
+        dx = np.where(ahead, self.obs_x - BIRD_X, np.inf)
+        j = np.argmin(dx, axis=1)
+        rows = np.arange(self.n)
+        nearest_dx = dx[rows, j]
+        nearest_y = self.obs_y[rows, j]
+        none = ~ahead.any(axis=1)
+        nearest_dx[none] = NO_OBSTACLE_DX
+        nearest_y[none] = 0.0
+
+        F = np.empty((self.n, train_from_demos.N_FEATURES))
+        F[:, 0] = self.vy
+        F[:, 1] = WORLD_HEIGHT - self.y
+        F[:, 2] = nearest_dx
+        F[:, 3] = self.passes
+        F[:, 4] = self.y - nearest_y
+        F[:, 5] = nearest_y + GAP - self.y
+        F[:, 6] = nearest_dx / SPEED
+        return F
+
+    def step(self, jump, dt: float=DT) -> np.ndarray:
+        """Advance the living birds by one tick (Flap() then Flappy2.Tick()).
+
+        Args:
+            jump: 0/1 per bird, ignored for dead birds
+            dt: Duration of the tick in seconds
+        Returns: Boolean array of the birds that crashed during this tick
+        """
+        live = self.alive
+        jump = np.asarray(jump, dtype=bool) & live
+
+        vy = np.where(jump, FLAP_SPEED, self.vy) - GRAVITY * dt
+        y = np.clip(self.y + vy * dt, BIRD_RADIUS, WORLD_HEIGHT - BIRD_RADIUS)
+        self.vy = np.where(live, vy, self.vy)
+        self.y = np.where(live, y, self.y)
+
+        obs_x = self.obs_x - SPEED * dt
+        # An obstacle leaving on the left goes back behind the last one with a new height
+        gone = (obs_x + OBSTACLE_SIZE < 0.0) & live[:, None]
+        if gone.any():
+            last = obs_x.max(axis=1, keepdims=True)
+            obs_x = np.where(gone, last + OBSTACLE_SPACING, obs_x)
+            self.obs_y[gone] = self._obstacle_heights(int(np.count_nonzero(gone)))
+        self.obs_x = np.where(live[:, None], obs_x, self.obs_x)
+
+        # CheckCollision(): only obstacles overlapping the bird horizontally count
+        near = np.abs(self.obs_x - BIRD_X) <= OBSTACLE_SIZE + BIRD_RADIUS
+        self.passes += np.count_nonzero(near & (self.obs_x < BIRD_X), axis=1) * live
+        y = self.y[:, None]
+        outside_gap = (y - BIRD_RADIUS < self.obs_y) | (y + BIRD_RADIUS > self.obs_y + GAP)
+        hit = (near & outside_gap).any(axis=1)
+        hit |= (self.y - BIRD_RADIUS < 0.0) | (self.y + BIRD_RADIUS > WORLD_HEIGHT)
+        hit &= live
+
+        self.steps += live
+        self.alive = live & ~hit
+        return hit
+
+
+def rollout(model: Policy, n_games: int=1000, max_steps: int=3600, dt: float=DT,
+            seed: Optional[int]=None, threshold: float=THRESHOLD, n_obstacles: int=N_OBSTACLES) -> Dict[str, Any]:
+    """Play n_games games at once with a model.
+
+    Called by: main()
+    Args:
+        model: inference.Model (decides with predict(X, threshold)) or a function
+               mapping an (n, N_FEATURES) array of frames to 0/1 decisions
+        n_games: Number of birds simulated together
+        max_steps: Ticks after which the surviving birds are stopped
+        dt: Duration of a tick in seconds
+        seed: Seed of the obstacle heights
+    Returns: dict with per game steps (ticks survived), seconds and passes
+             arrays, crashed (bool array), the number of ticks run and the duration
+    """
+    if isinstance(model, Model):
+        decide = lambda X: model.predict(X, threshold)
+    else:
+        decide = model
+    sim = FlappySim(n_games, n_obstacles, seed)
+    jump = np.zeros(n_games, dtype=bool)
+    start = time.perf_counter()
+    ticks = 0
+    while ticks < max_steps and sim.alive.any():
+        live = np.flatnonzero(sim.alive)
+        jump[:] = False
+        jump[live] = np.asarray(decide(sim.features()[live]), dtype=bool)
+        sim.step(jump, dt)
+        ticks += 1
+    return {
+        "steps": sim.steps,
+        "seconds": sim.steps * dt,
+        "passes": sim.passes,
+        "crashed": ~sim.alive,
+        "ticks": ticks,
+        "duration": time.perf_counter() - start,
+    }
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, float]:
+    """Survival and speed figures of a rollout() result."""
+    steps = result["steps"]
+    duration = result["duration"] or float("inf")
+    return {
+        "games": len(steps),
+        "crashed": int(np.count_nonzero(result["crashed"])),
+        "mean_seconds": float(result["seconds"].mean()),
+        "median_seconds": float(np.median(result["seconds"])),
+        "max_seconds": float(result["seconds"].max()),
+        "mean_passes": float(result["passes"].mean()),
+        "frames": int(steps.sum()),
+        "frames_per_second": float(steps.sum() / duration),
+        "games_per_second": float(len(steps) / duration),
+        "duration": float(result["duration"]),
+    }
+
+
+def main():
+    """Play games with a model and print how long the birds survive."""
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", help="Model file (default: ../SoftmaxC/model_weights.txt)")
+    p.add_argument("--games", type=int, default=1000, help="Number of games played at once")
+    p.add_argument("--steps", type=int, default=3600, help="Maximum ticks per game (60 per second)")
+    p.add_argument("--seed", type=int, default=42, help="Seed of the obstacle heights")
+    p.add_argument("--threshold", type=float, default=THRESHOLD, help="Jump when p >= threshold")
+    p.add_argument("--json", help="Also write the summary to this JSON file")
+    args = p.parse_args()
+
+    model_path = args.model or train_from_demos.OUT
+    try:
+        model = Model.load(model_path)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: cannot load model {model_path}: {e}")
+        sys.exit(2)
+
+    summary = summarize(rollout(model, args.games, args.steps, seed=args.seed, threshold=args.threshold))
+    print(f"{summary['games']} games, {summary['crashed']} crashed before {args.steps} ticks")
+    print(f"Survival: mean {summary['mean_seconds']:.2f}s, median {summary['median_seconds']:.2f}s, "
+          f"max {summary['max_seconds']:.2f}s, mean passes {summary['mean_passes']:.1f}")
+    print(f"Simulated {summary['frames']} frames in {summary['duration']:.2f}s "
+          f"({summary['games_per_second']:.0f} games/s, {summary['frames_per_second']:.0f} frames/s)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": model_path, "steps": args.steps, "seed": args.seed, **summary}, f, indent=2)
+        print(f"Wrote summary to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
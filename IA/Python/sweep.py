@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter sweep over train_from_demos.train_mlp.
+
+Every parameter to explore is given as KEY=VALUE1,VALUE2,... where KEY is a
+train_mlp keyword (layers, lr, l2, epochs, batch_size, shuffle, optimizer,
+beta1, beta2, eps, patience, seed). Hidden layer sizes are written with an
+"x": layers=16x8,32x16,10.
+
+    python sweep.py layers=16x8,32x16 lr=0.005,0.01,0.02 l2=1e-5,1e-4 optimizer=sgd,adam
+    python sweep.py --random 20 layers=8,16,16x8,32x16 lr=0.001,0.003,0.01,0.03
+
+The demos are loaded, split, balanced and normalized once in this process and
+handed to each worker of a ProcessPoolExecutor when it starts, so no worker
+re-parses the CSV files. Configurations are ranked by validation loss; the
+ranked table is written as TSV and the best model through write_model() to
+sweep_best.txt, next to this file. The deployed model is left alone until the
+best one is promoted (make sweep-promote).
+"""
+import os
+import io
+import sys
+import time
+import random
+import argparse
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+try:
+    from . import train_from_demos
+except ImportError:  # run as a script, like train_from_demos.py
+    import train_from_demos
+
+HERE = os.path.dirname(__file__)
+RESULTS = os.path.join(HERE, "sweep_results.tsv")
+# Not the deployed model: promote it with evaluate.py --promote (make sweep-promote)
+BEST = os.path.join(HERE, "sweep_best.txt")
+
+# How each sweepable train_mlp keyword is parsed from the command line
+PARAM_TYPES = {
+    "layers": lambda v: [int(s) for s in v.split("x")],
+    "lr": float,
+    "l2": float,
+    "epochs": int,
+    "batch_size": int,
+    "shuffle": lambda v: v.lower() in ("1", "true", "yes"),
+    "optimizer": str,
+    "beta1": float,
+    "beta2": float,
+    "eps": float,
+    "patience": int,
+    "seed": int,
+}
+
+# Dataset shared with the worker processes, set once by _init_worker()
+_DATA: Dict[str, Any] = {}
+
+
+def parse_args():
+    """Parse command-line arguments for the sweep.
+
+    Called by: main()
+    Returns: argparse.Namespace with the search space and the shared settings
+    """
+    p = argparse.ArgumentParser()
+    p.add_argument("params", nargs="+", metavar="KEY=V1,V2",
+                   help=f"Values to explore for a train_mlp keyword ({', '.join(PARAM_TYPES)})")
+    p.add_argument("--random", type=int, default=0,
+                   help="Sample N configurations from the grid instead of trying them all")
+    p.add_argument("--data", help="Directory containing demos (default: this script folder)")
+    p.add_argument("--out", default=BEST, help="Model file for the best configuration (default: sweep_best.txt)")
+    p.add_argument("--results", default=RESULTS, help="Ranked results table (TSV)")
+    p.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    p.add_argument("--backend", choices=sorted(train_from_demos.BACKENDS), default="numpy")
+    p.add_argument("--epochs", type=int, default=500, help="Epochs when not part of the sweep")
+    p.add_argument("--val-split", type=train_from_demos.val_fraction, default=0.2, help="Fraction held out to rank configurations")
+    p.add_argument("--seed", type=int, default=42)
+    return p.parse_args()
+
+
+def parse_space(params: List[str]) -> Dict[str, list]:
+    """Turn KEY=V1,V2 arguments into {key: [values]}.
+
+    Called by: main()
+    Raises: ValueError on an unknown key or a malformed argument
+    """
+    space = {}
+    for param in params:
+        key, sep, values = param.partition("=")
+        key = key.replace("-", "_")
+        if not sep or key not in PARAM_TYPES:
+            raise ValueError(f"Invalid sweep parameter {param!r}, expected KEY=V1,V2 with KEY in {list(PARAM_TYPES)}")
+        space[key] = [PARAM_TYPES[key](v) for v in values.split(",")]
+    return space
+
+
+def configurations(space: Dict[str, list], n_random: int=0, seed: int=42) -> List[Dict[str, Any]]:
+    """Expand the search space into a list of configurations.
+
+    Called by: main()
+    Args:
+        space: {key: [values]} as returned by parse_space()
+        n_random: When > 0, sample that many distinct grid points (random search)
+        seed: Random seed for the sampling
+    Returns: List of {key: value} dicts
+    """
+    keys = list(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if 0 < n_random < len(grid):
+        grid = random.Random(seed).sample(grid, n_random)
+    return grid
+
+
+def _init_worker(data: Dict[str, Any]) -> None:
+    """Store the shared dataset in the worker process (ProcessPoolExecutor initializer)."""
+    # Each worker is single threaded: parallelism comes from the processes
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    _DATA.update(data)
+
+
+def run_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Train and score one configuration on the shared dataset.
+
+    Called by: main() through the process pool
+    Returns: dict with the config, train/val metrics, duration and the trained W/b
+    """
+    kwargs = dict(epochs=_DATA["epochs"], seed=_DATA["seed"], backend=_DATA["backend"])
+    kwargs.update(config)
+    layers = kwargs.pop("layers", [16, 8])
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        W, b = train_from_demos.train_mlp(_DATA["Xn"], _DATA["y"], layers, val=_DATA["val"], **kwargs)
+    seconds = time.perf_counter() - start
+
+    engine = train_from_demos.BACKENDS[_DATA["backend"]]()
+    params = engine.params(W, b)
+    train_loss, train_acc = engine.evaluate(*engine.prepare(_DATA["Xn"], _DATA["y"]), *params)
+    result = {"config": config, "train_loss": train_loss, "train_acc": train_acc,
+              "val_loss": train_loss, "val_acc": train_acc, "seconds": seconds, "W": W, "b": b}
+    if _DATA["val"] is not None:
+        result["val_loss"], result["val_acc"] = engine.evaluate(*engine.prepare(*_DATA["val"]), *params)
+    return result
+
+
+def format_config(config: Dict[str, Any]) -> str:
+    """Render a configuration the way it is typed on the command line."""
+    return " ".join(f"{k}={'x'.join(map(str, v)) if isinstance(v, list) else v}" for k, v in config.items())
+
+
+def write_results(results: List[Dict[str, Any]], path: str) -> None:
+    """Write the ranked results table as TSV.
+
+    Called by: main()
+    """
+    with open(path, "w") as f:
+        f.write("rank\tval_loss\tval_acc\ttrain_loss\ttrain_acc\tseconds\tconfig\n")
+        for rank, r in enumerate(results, 1):
+            f.write(f"{rank}\t{r['val_loss']:.6f}\t{r['val_acc']:.4f}\t{r['train_loss']:.6f}\t"
+                    f"{r['train_acc']:.4f}\t{r['seconds']:.2f}\t{format_config(r['config'])}\n")
+
+
+def main():
+    """Run the sweep.
+
+    1. Expand the grid / random search space
+    2. Load and normalize the demos once
+    3. Train every configuration in a process pool
+    4. Write the ranked table and the best model
+    """
+    args = parse_args()
+    try:
+        space = parse_space(args.params)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(2)
+    configs = configurations(space, args.random, args.seed)
+
+    if args.data:
+        train_from_demos.PATTERN = os.path.join(os.path.abspath(args.data), "demos_*.csv")
+    out = os.path.abspath(args.out)
+
+    try:
+        Xn, y, means, stds, val = train_from_demos.prepare_dataset(args.val_split, args.seed,
+                                                                   as_arrays=args.backend == "numpy")
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(2)
+    data = {"Xn": Xn, "y": y, "val": val, "epochs": args.epochs, "seed": args.seed, "backend": args.backend}
+
+    workers = max(1, min(args.workers or 1, len(configs)))
+    print(f"Sweeping {len(configs)} configurations on {workers} workers...")
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as pool:
+        futures = [pool.submit(run_config, config) for config in configs]
+        for future in as_completed(futures):
+            r = future.result()
+            results.append(r)
+            print(f"  [{len(results)}/{len(configs)}] val_loss={r['val_loss']:.4f} "
+                  f"val_acc={r['val_acc']:.3f} ({r['seconds']:.1f}s) {format_config(r['config'])}")
+    print(f"Sweep finished in {time.perf_counter() - start:.1f}s")
+
+    results.sort(key=lambda r: r["val_loss"])
+    write_results(results, args.results)
+    print(f"Wrote ranked results to {args.results}")
+    for rank, r in enumerate(results[:5], 1):
+        print(f"  #{rank} val_loss={r['val_loss']:.4f} val_acc={r['val_acc']:.3f} {format_config(r['config'])}")
+
+    best = results[0]
+    train_from_demos.write_model(best["W"], best["b"], means, stds, out)
+    print(f"Wrote best MLP model to {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,24 @@
+import io
+import os
+import sys
+import copy
+import functools
+import contextlib
+import random
+import argparse
+import time
+from array import array
+import tempfile
 import unittest
+from unittest import mock
 
 from . import neurones
+from . import train_from_demos
+from . import sweep
+from . import inference
+from . import evaluate
+from . import simulate
+from . import bench
 
 class TestDeque(unittest.TestCase):
     """
@@ -158,9 +176,17 @@ class TestRosenblattWeights(unittest.TestCase):
         success = test_xor.train(inputs, outputs)
 
         self.assertFalse(success)
+        self.assertEqual(test_xor.stop_reason, "max_iterations")
 
         # test_xor.draw()
 
+def xor_ou_lineaire(rng: random.Random) -> neurones.Reseau:
+    """Builder de test : selon le tirage, un reseau sans couche cachée, qui n'apprend jamais XOR."""
+    if rng.random() < 0.5:
+        return neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[], rng=rng)
+    return neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[3], rng=rng)
+
+
 class TestDeep(unittest.TestCase):
     """
     Des couches cachées permettent de gérer le XOR
@@ -178,16 +204,915 @@ class TestDeep(unittest.TestCase):
             num_entries=len(next(iter(inputs))), 
             sorties=outputs,
             hidden = [2], # une couche de deux neurones
+            rng=random.Random(0), # tirage fixe, sinon la convergence depend du hasard
         )
 
         # test_xor.draw()
         test_xor.name = "Werbos xor"
         success = test_xor.train(inputs, outputs, use_softmax=True, debug=False, max_iterations=20000)
 
-        self.assertTrue(success)
-        print("iters", test_xor.learning_iterations)
+        self.assertTrue(success, test_xor.stop_reason)
+        self.assertEqual(test_xor.stop_reason, "converge")
+        # une seule passe avant par exemple et par epoque, la correction la reutilise
+        self.assertEqual(test_xor.forward_passes, test_xor.learning_iterations * len(inputs))
+        print("iters", test_xor.learning_iterations, "stop", test_xor.stop_reason,
+              "forward passes", test_xor.forward_passes)
         test_xor.draw()
 
+    def test_xor_restarts(self) -> None:
+        """Plusieurs tirages en parallele, le gagnant se reproduit avec sa graine."""
+        outputs = ["0", "1"]
+        inputs: dict[tuple[float, ...], int] = {
+            (0.,0.): 0, (0.,1.): 1, (1.,0.): 1, (1.,1.): 0
+        }
+        builder = functools.partial(neurones.werbos_hidden, num_entries=2, sorties=outputs, hidden=[2])
+
+        reseau, graine = neurones.train_restarts(builder, inputs, outputs, n=4, workers=2, mode="best",
+                                                 use_softmax=True, max_iterations=20000)
+        self.assertEqual(reseau.stop_reason, "converge")
+        for x, o in inputs.items():
+            reseau.feed_entries(x)
+            reseau.fire()
+            self.assertEqual(reseau.classification_werbos().name, outputs[o])
+
+        seul, meme_graine = neurones.train_restarts(builder, inputs, outputs, workers=1, graines=[graine],
+                                                    use_softmax=True, max_iterations=20000)
+        self.assertEqual(meme_graine, graine)
+        self.assertEqual([cx.poids for cx in seul.connexions], [cx.poids for cx in reseau.connexions])
+
+    def test_first_restart_stops_the_others(self) -> None:
+        """En mode first, les copies encore en cours s'arretent des qu'une converge."""
+        outputs = ["0", "1"]
+        inputs: dict[tuple[float, ...], int] = {
+            (0.,0.): 0, (0.,1.): 1, (1.,0.): 1, (1.,1.): 0
+        }
+        # graine 5 : couche cachée, converge en quelques epoques ; 1 et 3 : sans couche cachée
+        debut = time.perf_counter()
+        reseau, graine = neurones.train_restarts(xor_ou_lineaire, inputs, outputs, workers=2, graines=[5, 1, 3],
+                                                 use_softmax=True, max_iterations=10**7)
+        self.assertEqual(graine, 5)
+        self.assertEqual(reseau.stop_reason, "converge")
+        # sans arret, les copies sans couche cachée tourneraient 10**7 epoques
+        self.assertLess(time.perf_counter() - debut, 30)
+
+    def test_train_should_stop(self) -> None:
+        inputs: dict[tuple[float, ...], int] = {
+            (0.,0.): 0, (0.,1.): 1, (1.,0.): 1, (1.,1.): 0
+        }
+        reseau = neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[])
+        self.assertFalse(reseau.train(inputs, ["0", "1"], use_softmax=True, max_iterations=10**7,
+                                      should_stop=lambda: reseau.learning_iterations >= 3))
+        self.assertEqual(reseau.stop_reason, "interrupted")
+        self.assertEqual(len(reseau.history), 3)
+
+    def test_train_stopping_criteria(self) -> None:
+        inputs: dict[tuple[float, ...], int] = {
+            (0.,0.): 0, (0.,1.): 1, (1.,0.): 1, (1.,1.): 0
+        }
+        outputs = ["0", "1"]
+
+        reseau = neurones.rosenblatt_perceptron(num_entries=2, sorties=outputs)
+        self.assertFalse(reseau.train(inputs, outputs, max_iterations=50, plateau=5))
+        self.assertEqual(reseau.stop_reason, "plateau")
+        self.assertLess(len(reseau.history), 50)
+
+        reseau = neurones.werbos_hidden(num_entries=2, sorties=outputs, hidden=[2])
+        reseau.train(inputs, outputs, use_softmax=True, max_iterations=20000, max_seconds=0)
+        self.assertIn(reseau.stop_reason, ("max_seconds", "converge"))
+        self.assertEqual(len(reseau.history), 1)
+
+        reseau = neurones.werbos_hidden(num_entries=2, sorties=outputs, hidden=[2])
+        reseau.train(inputs, outputs, use_softmax=True, max_iterations=20000, loss_threshold=10.)
+        self.assertIn(reseau.stop_reason, ("loss_threshold", "converge"))
+        epoque = reseau.history[0]
+        self.assertEqual(set(epoque), {"epoch", "loss", "accuracy"})
+        self.assertTrue(0 <= epoque["accuracy"] <= 1)
+
+class TestEvolution(unittest.TestCase):
+    """
+    Apprentissage par population, sans gradient (train_evolution)
+    """
+    ENTREES = [(0., 0.), (0., 1.), (1., 0.), (1., 1.)]
+    CIBLES = [0, 1, 1, 0]
+    builder = functools.partial(neurones.werbos_hidden, num_entries=2, sorties=["0", "1"], hidden=[3])
+
+    def test_vecteur_round_trip(self) -> None:
+        reseau = neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[3], rng=random.Random(0))
+        c = reseau.compile()
+        v = c.vecteur()
+        # 2x3 + 3x2 poids entre neurones, biais des 3 caches et des 2 sorties
+        self.assertEqual(len(v), 6 + 6 + 3 + 2)
+        c.charge_vecteur(v * 2)
+        c.vers_graphe()
+        self.assertEqual(reseau.compile().vecteur().tolist(), (v * 2).tolist())
+        with self.assertRaises(ValueError):
+            c.charge_vecteur(v[:-1])
+
+    def test_xor_converges(self) -> None:
+        for methode, sigma in (("ga", 0.3), ("es", 0.5)):
+            reseau = neurones.train_evolution(self.builder, self.ENTREES, self.CIBLES, population=64,
+                                              generations=300, methode=methode, sigma=sigma,
+                                              learning_rate=0.5, workers=1, graine=1)
+            self.assertEqual(reseau.stop_reason, "converge", methode)
+            self.assertEqual(reseau.history[-1]["accuracy"], 1.0)
+            # le champion est ecrit dans les Connexion / Neurone
+            for x, o in zip(self.ENTREES, self.CIBLES):
+                reseau.feed_entries(x)
+                reseau.fire()
+                self.assertEqual(reseau.classification_werbos().name, str(o))
+
+    def test_arguments_invalides(self) -> None:
+        for kwargs in ({"methode": "es", "population": 1}, {"methode": "es", "population": 7},
+                       {"methode": "ga", "population": 0}, {"methode": "ga", "generations": 0},
+                       {"methode": "es", "generations": 0}):
+            with self.subTest(**kwargs), self.assertRaises(ValueError):
+                neurones.train_evolution(self.builder, self.ENTREES, self.CIBLES, workers=1, **kwargs)
+        reseau = neurones.train_evolution(self.builder, self.ENTREES, self.CIBLES, population=1,
+                                          generations=1, workers=1)
+        self.assertIn(reseau.stop_reason, ("converge", "max_iterations"))
+
+    def test_result_does_not_depend_on_workers(self) -> None:
+        resultats = [
+            neurones.train_evolution(self.builder, self.ENTREES, self.CIBLES, population=16,
+                                     generations=3, workers=w, graine=5)
+            for w in (1, 2)
+        ]
+        self.assertEqual(resultats[0].history, resultats[1].history)
+        self.assertEqual([cx.poids for cx in resultats[0].connexions],
+                         [cx.poids for cx in resultats[1].connexions])
+        self.assertEqual(resultats[0].stop_reason, "max_iterations")
+
+    def test_unknown_method(self) -> None:
+        with self.assertRaises(ValueError):
+            neurones.train_evolution(self.builder, self.ENTREES, self.CIBLES, methode="cma")
+
+
+class TestWerbosDense(unittest.TestCase):
+    """
+    werbos_hidden relie chaque couche cachée a la precedente, quelle que soit la profondeur
+    """
+    def test_deep_layers_are_wired_to_previous(self) -> None:
+        reseau = neurones.werbos_hidden(num_entries=3, sorties=["0", "1"], hidden=[4, 5, 2])
+        self.assertEqual(len(reseau.neurones), 3 + 4 + 5 + 2 + 2)
+        self.assertEqual(len(reseau.optiques), 3)
+        self.assertEqual([s.name for s in reseau.sorties], ["0", "1"])
+        topo = reseau.topologie()
+        for n in reseau.neurones:
+            amonts = [e.amont for e in n.entrees if e.amont is not None]
+            if n.name.startswith("h1-"):
+                self.assertEqual({a.name for a in amonts}, {f"h0-{i}" for i in range(4)})
+            for a in amonts:
+                self.assertEqual(topo.couche[n], topo.couche[a] + 1)
+        self.assertEqual([len(c.neurones) for c in reseau.compile().couches], [3, 4, 5, 2, 2])
+
+    def test_initialisations(self) -> None:
+        rng = random.Random(1)
+        xavier = neurones.poids_initiaux("xavier", 100, 50, rng)
+        self.assertEqual(len(xavier), 5000)
+        self.assertLessEqual(max(abs(p) for p in xavier), (6 / 150) ** 0.5)
+        he = neurones.poids_initiaux("he", 200, 10, rng)
+        ecart_type = (sum(p * p for p in he) / len(he)) ** 0.5
+        self.assertAlmostEqual(ecart_type, (2 / 200) ** 0.5, delta=0.01)
+        with self.assertRaises(ValueError):
+            neurones.poids_initiaux("zero", 2, 2, rng)
+
+        a = neurones.werbos_hidden(4, ["0", "1"], [3, 3], init="he", rng=random.Random(7))
+        b = neurones.werbos_hidden(4, ["0", "1"], [3, 3], init="he", rng=random.Random(7))
+        self.assertEqual([cx.poids for cx in a.connexions], [cx.poids for cx in b.connexions])
+
+class TestSlots(unittest.TestCase):
+    """
+    Neurone et Connexion ont des __slots__ : pas d'attribut en trop, le reste marche comme avant
+    """
+    def test_attribut_inconnu_refuse(self) -> None:
+        reseau = neurones.werbos_hidden(2, ["0", "1"], [3], rng=random.Random(0))
+        for objet in (reseau.neurones[0], reseau.connexions[0]):
+            self.assertFalse(hasattr(objet, "__dict__"))
+            with self.assertRaises(AttributeError):
+                objet.poid = 1.0  # faute de frappe : ne doit pas creer un attribut silencieusement
+
+    def test_compile_dessin_copie(self) -> None:
+        reseau = neurones.werbos_hidden(2, ["0", "1"], [3], rng=random.Random(0))
+        c = reseau.compile()
+        v = c.vecteur()
+        c.charge_vecteur(v + 1)
+        c.vers_graphe()
+        self.assertEqual(reseau.compile().vecteur().tolist(), (v + 1).tolist())
+
+        reseau.instantanes = neurones.Instantanes(politique="toujours")
+        reseau.draw(do_display=False, name="slots")
+        inst = reseau.instantanes[-1]
+        self.assertEqual(inst.poids, [cx.poids for cx in reseau.connexions])
+        self.assertEqual(inst.biais, [n.biais for n in reseau.neurones])
+
+        copie = copy.deepcopy(reseau)
+        self.assertEqual([cx.poids for cx in copie.connexions], [cx.poids for cx in reseau.connexions])
+        self.assertEqual([n.biais for n in copie.neurones], [n.biais for n in reseau.neurones])
+        for x in [(0., 0.), (0., 1.), (1., 0.), (1., 1.)]:
+            self.assertEqual(copie.fire_compiled(x), reseau.fire_compiled(x))
+
+class TestInstantanes(unittest.TestCase):
+    """
+    Les dessins de debug sont copiés dans un tampon au lieu d'etre rendus tout de suite
+    """
+    inputs: dict[tuple[float, ...], int] = {(0., 0.): 0, (0., 1.): 1, (1., 0.): 1, (1., 1.): 1}
+
+    def entraine(self, instantanes: neurones.Instantanes) -> list[neurones.Instantane]:
+        """Entraine avec debug et renvoie les instantanés dessinés a la fin (sans lancer dot)."""
+        reseau = neurones.rosenblatt_perceptron(num_entries=2, sorties=["0", "1"])
+        reseau.instantanes = instantanes
+        dessines = []
+        with mock.patch.object(neurones.Instantane, "rendre", autospec=True, side_effect=dessines.append), \
+                contextlib.redirect_stderr(io.StringIO()):
+            self.assertTrue(reseau.train(self.inputs, ["0", "1"], max_iterations=50, debug=True))
+            for f in reseau.rendus:
+                f.result()
+        self.assertEqual(len(instantanes), 0)  # le tampon est vidé par le rendu
+        self.reseau = reseau
+        return dessines
+
+    def test_debug_captures_snapshots(self) -> None:
+        dessines = self.entraine(neurones.Instantanes(capacite=10))
+        reseau = self.reseau
+        self.assertEqual(len(dessines), 10)  # seuls les derniers restent
+        self.assertEqual(len(reseau.rendus), 10)
+        self.assertEqual(reseau.graphviz_draws, reseau.instantanes.demandes)
+        dernier = max(dessines, key=lambda i: int(i.nom.split()[0]))
+        self.assertEqual(dernier.poids, [c.poids for c in reseau.connexions])
+        self.assertEqual(dernier.biais, [n.biais for n in reseau.neurones])
+        self.assertTrue(dernier.nom.startswith(f"{reseau.graphviz_draws - 1} "))
+
+    def test_train_without_debug_draws_nothing(self) -> None:
+        reseau = neurones.rosenblatt_perceptron(num_entries=2, sorties=["0", "1"])
+        with mock.patch.object(neurones.Instantanes, "rendre") as rendre:
+            self.assertTrue(reseau.train(self.inputs, ["0", "1"], max_iterations=50))
+        rendre.assert_not_called()
+        self.assertEqual(reseau.rendus, [])
+
+    def test_policies(self) -> None:
+        tous = self.entraine(neurones.Instantanes(capacite=1000))
+        changement = self.entraine(neurones.Instantanes(capacite=1000, politique="changement"))
+        self.assertLess(len(changement), len(tous))
+        self.assertEqual(len(self.entraine(neurones.Instantanes(politique="demande"))), 0)
+        iterations = self.entraine(neurones.Instantanes(capacite=1000, politique="iterations", tous_les=2))
+        self.assertGreater(len(iterations), 0)
+        self.assertTrue(all(i.iteration % 2 == 0 for i in iterations))
+        with self.assertRaises(ValueError):
+            neurones.Instantanes(politique="parfois")
+
+class TestCompile(unittest.TestCase):
+    """
+    La version compilée du reseau donne les memes valeurs que fire()
+    """
+    def assertMemeFire(self, reseau: neurones.Reseau, inputs: list[tuple[float, ...]]) -> None:
+        for x in inputs:
+            reseau.feed_entries(x)
+            reseau.fire()
+            attendu = [n.value for n in reseau.neurones]
+            sorties = reseau.fire_compiled(x)
+            for a, b in zip(sorties, [n.value for n in reseau.sorties]):
+                self.assertAlmostEqual(a, b, places=12)
+            for a, n in zip(attendu, reseau.neurones):
+                self.assertAlmostEqual(a, n.value, places=12)
+
+    def test_compile_matches_fire(self) -> None:
+        inputs = [(0., 0., 1.), (1., 0.5, -2.), (0.3, 1., 1.)]
+        self.assertMemeFire(neurones.mcculloch_pitts_neuron(entries=3, seuil=1.2), inputs)
+        self.assertMemeFire(neurones.rosenblatt_perceptron(num_entries=3, sorties=["a", "b"]), inputs)
+        self.assertMemeFire(neurones.werbos_hidden(num_entries=3, sorties=["0", "1"], hidden=[4]), inputs)
+
+    def test_compile_follows_weight_updates(self) -> None:
+        reseau = neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[3])
+        reseau.compile()
+        reseau.feed_entries((1., 0.))
+        reseau.fire()
+        reseau.fix_chain_rule_softmax((1., 0.), "1", 0.5)
+        self.assertMemeFire(reseau, [(1., 0.), (0., 1.)])
+
+        compile = reseau.compile()
+        compile.couches[-1].poids[:] = 0.25
+        compile.vers_graphe()
+        self.assertTrue(all(e.poids == 0.25 for s in reseau.sorties for e in s.entrees))
+
+    def test_predict_batch(self) -> None:
+        reseau = neurones.werbos_hidden(num_entries=2, sorties=["0", "1", "2"], hidden=[5])
+        inputs = [(0., 0.), (0., 1.), (1., 0.), (1., 1.), (0.5, -3.)]
+        valeurs, probas = reseau.predict_batch(inputs)
+        self.assertEqual(valeurs.shape, (5, 3))
+        for x, v, p in zip(inputs, valeurs, probas):
+            reseau.feed_entries(x)
+            reseau.fire()
+            meilleur = reseau.classification_softmax()
+            for s, vs, ps in zip(reseau.sorties, v, p):
+                self.assertAlmostEqual(vs, s.value, places=12)
+                self.assertAlmostEqual(ps, s.proba, places=12)
+            self.assertEqual(reseau.sorties[int(p.argmax())], meilleur)
+
+    def test_batch_backprop_matches_per_example(self) -> None:
+        """Un lot d'un seul exemple donne exactement la correction de fix_chain_rule(_softmax)."""
+        x = (0.3, 1., -0.5)
+        for softmax in (True, False):
+            reseau = neurones.werbos_hidden(num_entries=3, sorties=["0", "1"], hidden=[4])
+            lot = copy.deepcopy(reseau)
+            if softmax:
+                reseau.fix_chain_rule_softmax(x, "1", 0.1, debug=False)
+                lot.fix_chain_rule_softmax_batch([x], ["1"], 0.1)
+            else:
+                reseau.fix_chain_rule(x, {"1": 1}, 0.1, debug=False)
+                lot.fix_chain_rule_batch([x], [{"1": 1}], 0.1)
+            for a, b in zip(reseau.connexions, lot.connexions):
+                self.assertAlmostEqual(a.poids, b.poids, places=12)
+            for a, b in zip(reseau.neurones, lot.neurones):
+                self.assertAlmostEqual(a.biais, b.biais, places=12)
+
+    def test_batch_backprop_xor(self) -> None:
+        self.addCleanup(random.setstate, random.getstate())
+        random.seed(0)
+        reseau = neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[3])
+        inputs = [(0., 0.), (0., 1.), (1., 0.), (1., 1.)]
+        cibles = ["0", "1", "1", "0"]
+        for _ in range(2000):
+            loss = reseau.fix_chain_rule_softmax_batch(inputs, cibles, 0.5, ecrire=False)
+        reseau.compile_courant.vers_graphe()
+        self.assertLess(loss, 0.05)
+        for x, cible in zip(inputs, cibles):
+            reseau.feed_entries(x)
+            reseau.fire()
+            self.assertEqual(reseau.classification_werbos().name, cible)
+
+    def test_batch_sans_ecrire_puis_fix_unitaire(self) -> None:
+        """Un fix_* d'un seul exemple entre deux lots ecrire=False ne perd pas le lot."""
+        inputs = [(0., 0.), (0., 1.), (1., 0.), (1., 1.)]
+        cibles = ["0", "1", "1", "0"]
+        resultats = []
+        for ecrire in (True, False):
+            reseau = neurones.werbos_hidden(2, ["0", "1"], [3], rng=random.Random(3))
+            for _ in range(3):
+                reseau.fix_chain_rule_softmax_batch(inputs, cibles, 0.5, ecrire=ecrire)
+                reseau.fix_chain_rule_softmax((0., 1.), "1", 0.5, debug=False)
+            reseau.fix_chain_rule_softmax_batch(inputs, cibles, 0.5, ecrire=ecrire)
+            reseau.ecrit_compile()
+            resultats.append(([cx.poids for cx in reseau.connexions], [n.biais for n in reseau.neurones]))
+        for a, b in zip(*resultats):
+            for x, y in zip(a, b):
+                self.assertAlmostEqual(x, y, places=12)
+
+        # poids changés dans le graphe sans passer par ecrit_compile() : on refuse d'en perdre un
+        reseau.fix_chain_rule_softmax_batch(inputs, cibles, 0.5, ecrire=False)
+        reseau.version_poids += 1
+        with self.assertRaises(RuntimeError):
+            reseau.compile_a_jour()
+
+    def test_topologie_cache(self) -> None:
+        reseau = neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[3])
+        reseau.compute_entries()
+        reseau.compute_sorties()
+        self.assertEqual(len(reseau.optiques), 2)
+        self.assertEqual(len(reseau.sorties), 2)
+
+        topo = reseau.topologie()
+        self.assertIs(reseau.topologie(), topo)
+        self.assertEqual(len(topo.caches_inverse), 3)
+        self.assertEqual(max(topo.couche.values()), 2)
+
+        cache = reseau.neurones[2]
+        self.assertFalse(cache.is_sortie())
+        reseau.connexions.append(neurones.Connexion(None, cache, None))
+        self.assertTrue(cache.is_sortie())
+        self.assertIsNot(reseau.topologie(), topo)
+        self.assertEqual(len(reseau.topologie().caches_inverse), 2)
+
+    def test_topologie_propre_a_chaque_reseau(self) -> None:
+        a = neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[3])
+        compile_a = a.compile_a_jour()
+        topo_a = a.topologie()
+        # construire ou modifier un autre reseau ne perime pas celui-ci
+        b = neurones.werbos_hidden(num_entries=2, sorties=["0", "1"], hidden=[3])
+        b.topologie()
+        b.connexions.append(neurones.Connexion(None, b.neurones[2], None))
+        self.assertIs(a.topologie(), topo_a)
+        self.assertIs(a.compile_a_jour(), compile_a)
+        self.assertIsNot(b.topologie(), topo_a)
+        # une connexion ajoutée a un de ses neurones, meme hors de reseau.connexions, le perime
+        neurones.Connexion(None, a.sorties[0], a.optiques[0])
+        self.assertIsNot(a.topologie(), topo_a)
+
+    def test_compile_cycle(self) -> None:
+        reseau = neurones.rosenblatt_perceptron(num_entries=2, sorties=["a"])
+        neurones.Connexion(None, reseau.sorties[0], reseau.optiques[0])
+        with self.assertRaises(ValueError):
+            reseau.compile()
+
+class TestTrainFromDemos(unittest.TestCase):
+    """
+    Entrainement du MLP utilise par le jeu (train_from_demos)
+    """
+    HEADER = "time;flappyHeight;flappyX;verticalSpeed;distToRoof;nearest_dx;nearest_y;passes;action\n"
+
+    def write_demos(self, rows: int) -> str:
+        """Ecrit un faux demos_*.csv dans un dossier temporaire, pointe PATTERN dessus."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with open(os.path.join(tmp.name, "demos_test.csv"), "w") as f:
+            f.write(self.HEADER)
+            for i in range(rows):
+                f.write(f"{i * 0.01};{50 + i % 10},5;20;{-(i % 4)}.0;{50 - i % 10};{80 - i};{40 + i % 3};{i // 20};{i % 2}\n")
+        pattern = train_from_demos.PATTERN
+        self.addCleanup(setattr, train_from_demos, "PATTERN", pattern)
+        train_from_demos.PATTERN = os.path.join(tmp.name, "demos_*.csv")
+        return tmp.name
+
+    def test_streaming_chunks(self) -> None:
+        self.write_demos(10)
+        chunks = list(train_from_demos.iter_chunks(chunk_rows=4))
+        self.assertEqual([len(y) for _, y in chunks], [4, 4, 2])
+        self.assertEqual([len(X) for X, _ in chunks], [28, 28, 14])
+
+        X, y = train_from_demos.load_all()
+        self.assertEqual(len(X), 10)
+        vs, dr, dx, passes, dist_bottom, dist_top, tti = X[1]
+        self.assertEqual((vs, dr, dx, passes), (-1.0, 49.0, 79.0, 0.0))
+        self.assertAlmostEqual(dist_bottom, 51.5 - 41)  # decimal comma
+        self.assertAlmostEqual(dist_top, 41 + 30 - 51.5)
+        self.assertAlmostEqual(tti, 79 / 40)
+        self.assertEqual(y[:3], [0, 1, 0])
+
+    def test_binary_cache_is_invalidated(self) -> None:
+        folder = self.write_demos(10)
+        csv = os.path.join(folder, "demos_test.csv")
+        parsed = train_from_demos.load_arrays()
+        self.assertTrue(os.path.exists(train_from_demos.cache_path(csv)))
+        self.assertEqual(train_from_demos.read_cache(csv), parsed)
+        self.assertEqual(train_from_demos.load_arrays(), parsed)
+
+        with open(csv, "a") as f:
+            f.write("9;50;20;0;50;10;40;1;1\n")
+        self.assertIsNone(train_from_demos.read_cache(csv))
+        X, y = train_from_demos.load_arrays()
+        self.assertEqual(len(y), 11)
+        self.assertEqual(train_from_demos.read_cache(csv), (X, y))
+
+    def test_binary_cache_follows_feature_derivation(self) -> None:
+        folder = self.write_demos(10)
+        csv = os.path.join(folder, "demos_test.csv")
+        X, _ = train_from_demos.load_arrays()
+        self.assertIsNotNone(train_from_demos.read_cache(csv))
+
+        # dist_top depend de GAP : un cache fait avec l'ancien GAP ne doit pas resservir
+        self.addCleanup(setattr, train_from_demos, "GAP", train_from_demos.GAP)
+        train_from_demos.GAP += 10.0
+        self.assertIsNone(train_from_demos.read_cache(csv))
+        X2, _ = train_from_demos.load_arrays()
+        self.assertAlmostEqual(X2[5] - X[5], 10.0)
+
+        with mock.patch.object(train_from_demos, "_parser_code_hash", return_value="autre parseur"):
+            self.assertIsNone(train_from_demos.read_cache(csv))
+
+    def make_data(self) -> tuple[list[list[float]], list[int]]:
+        X = [[(i % 7) / 7.0, ((i * 3) % 5) / 5.0 - 0.5, (i % 2) * 1.0] for i in range(60)]
+        y = [1 if row[0] + row[1] > 0.4 else 0 for row in X]
+        return X, y
+
+    def test_numpy_backend_matches_python(self) -> None:
+        X, y = self.make_data()
+        W_py, b_py = train_from_demos.train_mlp(X, y, [4, 3], epochs=30, lr=0.1, l2=1e-4, backend="python")
+        W_np, b_np = train_from_demos.train_mlp(X, y, [4, 3], epochs=30, lr=0.1, l2=1e-4, backend="numpy")
+
+        for w_py, w_np in zip(W_py, W_np):
+            for r_py, r_np in zip(w_py, w_np):
+                for a, c in zip(r_py, r_np):
+                    self.assertAlmostEqual(a, c, places=10)
+        for v_py, v_np in zip(b_py, b_np):
+            for a, c in zip(v_py, v_np):
+                self.assertAlmostEqual(a, c, places=10)
+        self.assertIsInstance(W_np[0][0][0], float)  # write_model attend des floats python
+
+    def test_minibatch_shuffle_is_seeded(self) -> None:
+        X, y = self.make_data()
+        kwargs = dict(epochs=5, lr=0.1, l2=1e-4, batch_size=8, shuffle=True, seed=3)
+        W_py, _ = train_from_demos.train_mlp(X, y, [4], backend="python", **kwargs)
+        W_np, _ = train_from_demos.train_mlp(X, y, [4], backend="numpy", **kwargs)
+        W_other, _ = train_from_demos.train_mlp(X, y, [4], backend="numpy", **dict(kwargs, seed=4))
+
+        for a, c in zip(W_py[0][0], W_np[0][0]):
+            self.assertAlmostEqual(a, c, places=10)
+        self.assertNotEqual(W_np, W_other)
+
+    def test_seed_reproduces_run(self) -> None:
+        X, y = self.make_data()
+        kwargs = dict(epochs=3, lr=0.1, l2=1e-4, backend="python")
+        W_a, b_a = train_from_demos.train_mlp(X, y, [4], seed=5, **kwargs)
+        W_b, b_b = train_from_demos.train_mlp(X, y, [4], rng=random.Random(5), **kwargs)
+        W_c, _ = train_from_demos.train_mlp(X, y, [4], seed=6, **kwargs)
+        self.assertEqual((W_a, b_a), (W_b, b_b))
+        self.assertNotEqual(W_a, W_c)  # la graine sert aussi aux poids initiaux
+
+        self.assertEqual(train_from_demos.balance_indices(y, rng=random.Random(1)),
+                         train_from_demos.balance_indices(y, rng=random.Random(1)))
+
+    def test_optimizers_match_between_backends(self) -> None:
+        X, y = self.make_data()
+        for optimizer in ("momentum", "rmsprop", "adam"):
+            with self.subTest(optimizer=optimizer):
+                kwargs = dict(epochs=10, lr=0.01, l2=1e-4, optimizer=optimizer)
+                W_py, b_py = train_from_demos.train_mlp(X, y, [3], backend="python", **kwargs)
+                W_np, b_np = train_from_demos.train_mlp(X, y, [3], backend="numpy", **kwargs)
+                for a, c in zip(W_py[0][0] + b_py[1], W_np[0][0] + b_np[1]):
+                    self.assertAlmostEqual(a, c, places=10)
+
+    def test_running_stats_merge(self) -> None:
+        X, _ = self.make_data()
+        whole = train_from_demos.RunningStats(3)
+        for row in X:
+            whole.update(row)
+
+        flat = array('d', [v for row in X[20:] for v in row])
+        left = train_from_demos.RunningStats(3)
+        left.update_chunk(array('d', [v for row in X[:20] for v in row]))
+        right = train_from_demos.RunningStats(3)
+        right.update_chunk(flat)
+        merged = train_from_demos.RunningStats.from_dict(left.to_dict()).merge(right)
+
+        self.assertEqual(merged.count, len(X))
+        for a, c in zip(whole.means_stds()[0] + whole.means_stds()[1], merged.means_stds()[0] + merged.means_stds()[1]):
+            self.assertAlmostEqual(a, c, places=12)
+
+    def test_normalize_in_place_with_duplicates(self) -> None:
+        a, b = [1.0, 10.0], [3.0, 10.0]
+        X = [a, b, b, b]  # b sur-echantillonne comme dans balance_data
+        means, stds = train_from_demos.normalize_inplace(X)
+
+        self.assertTrue(all(r is o for r, o in zip(X, [a, b, b, b])))  # memes listes, modifiées
+        self.assertEqual(means, [2.5, 10.0])
+        self.assertAlmostEqual(stds[0], 0.75 ** 0.5)
+        self.assertEqual(stds[1], 1.0)  # variance nulle
+        self.assertAlmostEqual(b[0], 0.5 / 0.75 ** 0.5)
+        self.assertEqual(a[1], 0.0)
+
+        # apply_normalization() renvoie de nouvelles lignes sans toucher aux siennes
+        c = [3.0, 10.0]
+        self.assertEqual(train_from_demos.apply_normalization([c], means, stds), [[b[0], 0.0]])
+        self.assertEqual(c, [3.0, 10.0])
+
+    def test_read_model_round_trip(self) -> None:
+        X, y = self.make_data()
+        W, b = train_from_demos.train_mlp(X, y, [4, 3], epochs=5, lr=0.1, backend="numpy")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model_weights.txt")
+            train_from_demos.write_model(W, b, [0.5, 1.0, 2.0], [1.0, 2.0, 3.0], path)
+            W2, b2, means, stds = train_from_demos.read_model(path)
+
+        self.assertEqual((W2, b2), (W, b))
+        self.assertEqual((means, stds), ([0.5, 1.0, 2.0], [1.0, 2.0, 3.0]))
+
+    def test_binary_model_round_trip(self) -> None:
+        X, y = self.make_data()
+        W, b = train_from_demos.train_mlp(X, y, [4, 3], epochs=5, lr=0.1, backend="numpy")
+        means, stds = [0.5, 1.0, 2.0], [1.0, 2.0, 3.0]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model_weights.bin")
+            train_from_demos.write_model_binary(W, b, means, stds, path)
+            self.assertEqual(train_from_demos.read_model(path), (W, b, means, stds))
+
+            train_from_demos.write_model_binary(W, b, means, stds, path, dtype='f')
+            W32, _, _, _ = train_from_demos.read_model_binary(path)
+            self.assertAlmostEqual(W32[1][2][3], W[1][2][3], places=6)
+
+            with open(path, "r+b") as f:
+                f.seek(30)
+                f.write(b"\xff")
+            with self.assertRaises(ValueError):
+                train_from_demos.read_model_binary(path)
+
+    def test_text_model_removes_stale_binary(self) -> None:
+        X, y = self.make_data()
+        W, b = train_from_demos.train_mlp(X, y, [4], epochs=2, lr=0.1, backend="numpy")
+        means, stds = [0.5, 1.0, 2.0], [1.0, 2.0, 3.0]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model_weights.txt")
+            binaire = train_from_demos.binary_model_path(path)
+            train_from_demos.write_model_binary(W, b, means, stds, binaire)
+            with contextlib.redirect_stdout(io.StringIO()):
+                train_from_demos.write_model(W, b, means, stds, path)
+            # model.c chargerait l'ancien .bin a la place du nouveau texte
+            self.assertFalse(os.path.exists(binaire))
+            self.assertEqual(train_from_demos.read_model(path), (W, b, means, stds))
+
+    def test_resume_from_weights(self) -> None:
+        X, y = self.make_data()
+        W, b = train_from_demos.train_mlp(X, y, [4], epochs=5, lr=0.1)
+        W_copy = [[row[:] for row in w] for w in W]
+
+        W0, b0 = train_from_demos.train_mlp(X, y, [], epochs=0, init=(W, b))
+        self.assertEqual((W0, b0), (W, b))  # 0 epoque: on repart des memes poids
+        W1, _ = train_from_demos.train_mlp(X, y, [], epochs=3, lr=0.1, backend="numpy", init=(W, b))
+        self.assertNotEqual(W1, W)
+        self.assertEqual(W, W_copy)  # init n'est pas modifie
+
+    def test_resume_checks_model_shape(self) -> None:
+        self.write_demos(4)
+        # main() change ces globales
+        for nom in ("OUT", "USE_CACHE"):
+            self.addCleanup(setattr, train_from_demos, nom, getattr(train_from_demos, nom))
+        n = train_from_demos.N_FEATURES
+        with tempfile.TemporaryDirectory() as tmp:
+            for nom, n_in, n_out in (("ancien", n - 1, 1), ("deux_sorties", n, 2)):
+                W, b = train_from_demos.make_mlp(n_in, [3])
+                W[-1] = [W[-1][0]] * n_out
+                b[-1] = [0.0] * n_out
+                path = os.path.join(tmp, f"{nom}.txt")
+                with contextlib.redirect_stdout(io.StringIO()):
+                    train_from_demos.write_model(W, b, [0.0] * n_in, [1.0] * n_in, path)
+                out = io.StringIO()
+                with mock.patch.object(sys, "argv", ["train_from_demos.py", "--resume", path, "--epochs", "1"]), \
+                        contextlib.redirect_stdout(out), self.assertRaises(SystemExit) as fin:
+                    train_from_demos.main()
+                self.assertEqual(fin.exception.code, 2)
+                self.assertIn(f"ERROR: {path}", out.getvalue())
+
+            # un modele aux bonnes dimensions reprend, --layers est signalé comme ignoré
+            W, b = train_from_demos.make_mlp(n, [3])
+            path = os.path.join(tmp, "bon.txt")
+            with contextlib.redirect_stdout(io.StringIO()):
+                train_from_demos.write_model(W, b, [0.0] * n, [1.0] * n, path)
+            out = io.StringIO()
+            argv = ["train_from_demos.py", "--resume", path, "--layers", "8", "--epochs", "1",
+                    "--model-out", os.path.join(tmp, "repris.txt")]
+            with mock.patch.object(sys, "argv", argv), contextlib.redirect_stdout(out):
+                train_from_demos.main()
+            self.assertIn("WARNING: --layers is ignored", out.getvalue())
+            self.assertEqual([len(w) for w in train_from_demos.read_model(argv[-1])[0]], [3, 1])
+
+    def test_val_split_range(self) -> None:
+        self.write_demos(4)
+        for as_arrays in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                for bad in (-0.1, 1.0, 1.5):
+                    with self.assertRaises(ValueError):
+                        train_from_demos.prepare_dataset(bad, as_arrays=as_arrays)
+                # 2 lignes par classe : 0.1 n'en garde aucune pour la validation
+                with self.assertRaisesRegex(ValueError, "0 validation rows"):
+                    train_from_demos.prepare_dataset(0.1, as_arrays=as_arrays)
+                Xn, _, _, _, val = train_from_demos.prepare_dataset(0.5, as_arrays=as_arrays)
+            self.assertEqual((len(Xn), len(val[1])), (2, 2))
+        self.assertEqual(train_from_demos.val_fraction("0.2"), 0.2)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            train_from_demos.val_fraction("1")
+
+    def test_split_validation_is_stratified(self) -> None:
+        X, y = self.make_data()
+        X_tr, y_tr, X_val, y_val = train_from_demos.split_validation(X, y, 0.25, seed=1)
+
+        self.assertEqual(len(y_tr) + len(y_val), len(y))
+        self.assertEqual(sum(y_val), round(sum(y) * 0.25))
+        self.assertFalse(any(row in X_tr for row in X_val))
+
+    def test_early_stopping_restores_best(self) -> None:
+        X, y = self.make_data()
+        X_tr, y_tr, X_val, y_val = train_from_demos.split_validation(X, y, 0.25, seed=1)
+        kwargs = dict(epochs=60, lr=0.5, l2=0.0, backend="numpy", optimizer="adam")
+        W_last, b_last = train_from_demos.train_mlp(X_tr, y_tr, [8], **kwargs)
+        W_best, b_best = train_from_demos.train_mlp(X_tr, y_tr, [8], val=(X_val, y_val), patience=5, **kwargs)
+
+        engine = train_from_demos.PythonBackend()
+        loss_last, _ = engine.evaluate(X_val, y_val, W_last, b_last)
+        loss_best, _ = engine.evaluate(X_val, y_val, W_best, b_best)
+        self.assertLessEqual(loss_best, loss_last)
+
+
+class TestSweep(unittest.TestCase):
+    """
+    Recherche d'hyperparametres (sweep.py)
+    """
+    def test_grid_and_random_search(self) -> None:
+        space = sweep.parse_space(["layers=16x8,4", "lr=0.1,0.01", "optimizer=adam"])
+        self.assertEqual(space["layers"], [[16, 8], [4]])
+
+        grid = sweep.configurations(space)
+        self.assertEqual(len(grid), 4)
+        self.assertIn({"layers": [4], "lr": 0.01, "optimizer": "adam"}, grid)
+
+        sampled = sweep.configurations(space, n_random=3, seed=1)
+        self.assertEqual(len(sampled), 3)
+        self.assertEqual(sampled, sweep.configurations(space, n_random=3, seed=1))
+
+    def test_unknown_parameter(self) -> None:
+        with self.assertRaises(ValueError):
+            sweep.parse_space(["momentum=0.9"])
+
+    def test_best_model_is_not_deployed(self) -> None:
+        with mock.patch.object(sys, "argv", ["sweep.py", "lr=0.1"]):
+            args = sweep.parse_args()
+        self.assertEqual(args.out, sweep.BEST)
+        self.assertNotEqual(os.path.abspath(args.out), os.path.abspath(train_from_demos.OUT))
+
+
+class TestInference(unittest.TestCase):
+    """
+    Inference Python sur model_weights.txt (inference.py)
+    """
+    def test_model_matches_training_forward(self) -> None:
+        X = [[(i % 7) / 7.0, ((i * 3) % 5) / 5.0 - 0.5, (i % 2) * 1.0] for i in range(40)]
+        y = [1 if row[0] + row[1] > 0.4 else 0 for row in X]
+        W, b = train_from_demos.train_mlp(X, y, [4, 3], epochs=5, lr=0.1, backend="numpy")
+        means, stds = [0.5, -0.25, 0.5], [0.3, 0.5, 0.5]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model_weights.txt")
+            train_from_demos.write_model(W, b, means, stds, path)
+            model = inference.Model.load(path)
+
+        self.assertEqual(model.n_features, 3)
+        self.assertEqual(model.layer_sizes, [4, 3, 1])
+        probas = model.predict_proba(X)
+        decisions = model.predict(X)
+        for row, p, d in zip(X, probas, decisions):
+            xn = [(v - m) / s for v, m, s in zip(row, means, stds)]
+            attendu, _ = train_from_demos.forward_sample(xn, W, b)
+            self.assertAlmostEqual(p, attendu, places=12)
+            self.assertEqual(d, int(attendu >= 0.5))
+        self.assertIsInstance(model.predict_proba(X[0]), float)
+        self.assertEqual(model.predict(X[0]), decisions[0])
+
+    def test_inconsistent_model(self) -> None:
+        with self.assertRaises(ValueError):
+            inference.Model([[[1.0, 2.0]]], [[0.0]], [0.0, 0.0, 0.0], [1.0, 1.0, 1.0])
+
+
+class TestSimulate(unittest.TestCase):
+    """
+    Simulateur Flappy vectorise (simulate.py)
+    """
+    @staticmethod
+    def jamais(X):
+        return [0] * len(X)
+
+    @staticmethod
+    def sous_le_trou(X):
+        # Saute quand l'oiseau tombe pres du bas du trou (dist_bottom, vs)
+        return (X[:, 4] < 4) & (X[:, 0] < 0)
+
+    def test_features(self) -> None:
+        sim = simulate.FlappySim(3, seed=0)
+        F = sim.features()
+        self.assertEqual(F.shape, (3, train_from_demos.N_FEATURES))
+        for row, oy in zip(F.tolist(), sim.obs_y[:, 0].tolist()):
+            vs, dr, dx, passes, dist_bottom, dist_top, tti = row
+            self.assertEqual((vs, dr, dx, passes), (0.0, 50.0, 80.0, 0.0))
+            self.assertAlmostEqual(dist_bottom, 50.0 - oy)
+            self.assertAlmostEqual(dist_top, oy + train_from_demos.GAP - 50.0)
+            self.assertAlmostEqual(tti, 80.0 / train_from_demos.SPEED)
+
+    def test_never_jumping_crashes_on_first_obstacle(self) -> None:
+        r = simulate.rollout(self.jamais, n_games=4, max_steps=1000, seed=1)
+        self.assertTrue(r["crashed"].all())
+        # Au sol (y = rayon) jusqu'a ce que le premier obstacle atteigne l'oiseau
+        self.assertEqual(set(r["steps"].tolist()), {104})
+        self.assertEqual(r["passes"].tolist(), [0] * 4)
+
+    def test_seed_reproduces_games(self) -> None:
+        r1 = simulate.rollout(self.sous_le_trou, n_games=50, max_steps=600, seed=3)
+        r2 = simulate.rollout(self.sous_le_trou, n_games=50, max_steps=600, seed=3)
+        self.assertEqual(r1["steps"].tolist(), r2["steps"].tolist())
+        self.assertEqual(r1["passes"].tolist(), r2["passes"].tolist())
+        self.assertGreater(r1["steps"].mean(), 104)
+        self.assertGreater(r1["passes"].max(), 0)
+
+    def test_dead_birds_are_frozen(self) -> None:
+        sim = simulate.FlappySim(2, seed=0)
+        sim.alive[1] = False
+        y, obs_x = sim.y[1], sim.obs_x[1].tolist()
+        sim.step([1, 1])
+        self.assertEqual(sim.steps.tolist(), [1, 0])
+        self.assertEqual(sim.y[1], y)
+        self.assertEqual(sim.obs_x[1].tolist(), obs_x)
+        self.assertGreater(sim.vy[0], 0)
+
+    def test_rollout_with_model(self) -> None:
+        # Modele qui saute quand dist_bottom < 5 (une couche, sortie sigmoide)
+        n = train_from_demos.N_FEATURES
+        W = [[[0.0] * 4 + [-10.0] + [0.0] * (n - 5)]]
+        model = inference.Model(W, [[50.0]], [0.0] * n, [1.0] * n)
+        r = simulate.rollout(model, n_games=20, max_steps=300, seed=2)
+        self.assertEqual(len(r["steps"]), 20)
+        self.assertGreater(r["steps"].min(), 104)
+        summary = simulate.summarize(r)
+        self.assertEqual(summary["frames"], int(r["steps"].sum()))
+
+
+class TestEvaluate(unittest.TestCase):
+    """
+    Rejeu des demos a travers le modele (evaluate.py)
+    """
+    HEADER = TestTrainFromDemos.HEADER
+    write_demos = TestTrainFromDemos.write_demos
+
+    def test_metrics(self) -> None:
+        counts = evaluate.confusion([1, 1, 0, 0, 0], [1, 0, 1, 0, 0])
+        self.assertEqual(counts, {"frames": 5, "tp": 1, "fp": 1, "fn": 1, "tn": 2})
+        m = evaluate.metrics(counts)
+        self.assertAlmostEqual(m["agreement"], 0.6)
+        self.assertAlmostEqual(m["precision"], 0.5)
+        self.assertAlmostEqual(m["recall"], 0.5)
+        self.assertEqual(evaluate.metrics(evaluate.confusion([0, 0], [0, 0]))["precision"], 0.0)
+
+    def test_evaluate_file(self) -> None:
+        tmp = self.write_demos(40)
+        n = train_from_demos.N_FEATURES
+        toujours = inference.Model([[[0.0] * n]], [[5.0]], [0.0] * n, [1.0] * n)  # saute a chaque frame
+        r = evaluate.evaluate_file(os.path.join(tmp, "demos_test.csv"), toujours, 0.5)
+        self.assertEqual((r["frames"], r["tp"], r["fp"], r["fn"]), (40, 20, 20, 0))
+        self.assertAlmostEqual(r["agreement"], 0.5)
+        self.assertAlmostEqual(r["recall"], 1.0)
+        total = evaluate.summarize([r, r])
+        self.assertEqual(total["frames"], 80)
+        self.assertAlmostEqual(total["precision"], 0.5)
+
+    def test_gate_only_promotes_passing_model(self) -> None:
+        tmp = self.write_demos(40)
+        n = train_from_demos.N_FEATURES
+        deploye = os.path.join(tmp, "model_weights.txt")
+        candidat = os.path.join(tmp, "model_weights.candidate.txt")
+        train_from_demos.write_model([[[0.0] * n]], [[-5.0]], [0.0] * n, [1.0] * n, deploye)
+        train_from_demos.write_model([[[0.0] * n]], [[5.0]], [0.0] * n, [1.0] * n, candidat)  # saute toujours
+
+        def lance(min_agreement):
+            argv = ["evaluate.py", "--model", candidat, "--promote", deploye, "--workers", "1",
+                    "--data", tmp, "--min-agreement", str(min_agreement)]
+            with mock.patch.object(sys, "argv", argv), contextlib.redirect_stdout(io.StringIO()):
+                evaluate.main()
+
+        with self.assertRaises(SystemExit) as refus:
+            lance(0.9)
+        self.assertEqual(refus.exception.code, 1)
+        self.assertEqual(train_from_demos.read_model(deploye)[1], [[-5.0]])
+
+        lance(0.5)
+        self.assertEqual(train_from_demos.read_model(deploye)[1], [[5.0]])
+
+        # sans seuil explicite --promote ne deploie rien
+        argv = ["evaluate.py", "--model", candidat, "--promote", deploye, "--data", tmp]
+        with mock.patch.object(sys, "argv", argv), contextlib.redirect_stderr(io.StringIO()), \
+                self.assertRaises(SystemExit) as refus:
+            evaluate.main()
+        self.assertEqual(refus.exception.code, 2)
+
+    def test_promote_replaces_stale_binary(self) -> None:
+        n = train_from_demos.N_FEATURES
+        with tempfile.TemporaryDirectory() as tmp:
+            deploye = os.path.join(tmp, "model_weights.txt")
+            candidat = os.path.join(tmp, "model_weights.candidate.txt")
+            train_from_demos.write_model_binary([[[0.0] * n]], [[-5.0]], [0.0] * n, [1.0] * n,
+                                                train_from_demos.binary_model_path(deploye))
+            train_from_demos.write_model([[[0.0] * n]], [[5.0]], [0.0] * n, [1.0] * n, candidat)
+            train_from_demos.promote_model(candidat, deploye)
+            self.assertEqual(train_from_demos.read_model(deploye)[1], [[5.0]])
+            # model.c prefererait l'ancien .bin au nouveau texte
+            self.assertFalse(os.path.exists(train_from_demos.binary_model_path(deploye)))
+            with self.assertRaises(FileNotFoundError):
+                train_from_demos.promote_model(os.path.join(tmp, "absent.txt"), deploye)
+
+
+class TestBench(unittest.TestCase):
+    """
+    Mesure et comparaison des benchmarks (bench.py)
+    """
+    def test_measure(self) -> None:
+        r = bench.measure(lambda: 10, lambda n: [0] * n * 1000, min_time=0.0, min_calls=20)
+        self.assertEqual(r["calls"], 20)
+        self.assertTrue(r["min"] <= r["p50"] <= r["p90"] <= r["p99"] <= r["max"])
+        self.assertGreater(r["ops_per_sec"], 0)
+        # une liste de 10000 elements, au moins 8 octets par element
+        self.assertGreaterEqual(r["peak_bytes"], 80_000)
+        self.assertIsNone(bench.measure(lambda: 1, abs, min_time=0.0, memory=False)["peak_bytes"])
+
+    def test_compare(self) -> None:
+        base = {"a": {"p50": 1.0}, "b": {"p50": 1.0}, "absent": {"p50": 1.0}}
+        courant = {"a": {"p50": 1.05}, "b": {"p50": 1.5}, "nouveau": {"p50": 1.0}}
+        c = bench.compare(courant, base, threshold=0.1)
+        self.assertEqual(set(c), {"a", "b"})
+        self.assertFalse(c["a"]["regression"])
+        self.assertTrue(c["b"]["regression"])
+        self.assertAlmostEqual(c["b"]["ratio"], 1.5)
+
+    def test_quick_cases_run(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cas = dict(bench.benchmarks(tmp, quick=True))
+            self.assertEqual(len(cas), len(bench.benchmarks(tmp, quick=True)))
+            self.assertLess(len(cas), len(bench.benchmarks(tmp)))
+            for nom in ("fire[width=8]", "fix_chain_rule_softmax[width=8]"):
+                prepare, run = cas[nom]()
+                self.assertGreater(bench.measure(prepare, run, min_time=0.0)["calls"], 0)
+
+    def test_cases_leave_use_cache_alone(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(train_from_demos, "USE_CACHE", False):
+            for nom, factory in bench.benchmarks(tmp, quick=True):
+                if nom.startswith(("load_all", "normalize", "balance_data")):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        prepare, run = factory()
+                        run(prepare())
+                    self.assertFalse(train_from_demos.USE_CACHE, nom)
+
+
 def main():
 
     unittest.main()
@@ -195,4 +1120,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
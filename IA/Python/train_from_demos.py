@@ -12,7 +12,13 @@ Then W3 row (1 row, h2 values), then b3 (single value)
 
 The native model expects inputs in original units; the model file contains means/stds so the native loader will normalize inputs before forward.
 
-No external deps. Uses simple batch gradient descent with L2 regularization.
+No external deps by default. Uses simple batch gradient descent with L2 regularization.
+`--backend numpy` runs the same training as batched matrix ops (requires numpy).
+`--batch-size N --shuffle` switches to mini-batch updates (several per epoch) and
+`--optimizer momentum|rmsprop|adam` replaces the plain SGD update rule.
+`--val-split F --patience N` holds out a validation set and stops early on the best epoch.
+`--resume model_weights.txt` fine-tunes an existing model instead of starting from random weights.
+`--format binary|both` also writes the compact model_weights.bin (see write_model_binary()).
 """
 import os
 import glob
@@ -22,12 +28,39 @@ import argparse
 import subprocess
 import shutil
 import random
-from typing import List, Tuple
+import json
+import mmap
+import struct
+import zlib
+import hashlib
+import inspect
+import functools
+from array import array
+from typing import Iterator, List, Optional, Tuple
 
 HERE = os.path.dirname(__file__)
 PATTERN = os.path.join(HERE, "demos_*.csv")
 # Default output weights path
 OUT = os.path.join(HERE, "..", "SoftmaxC", "model_weights.txt")
+# Binary model format (see write_model_binary())
+MODEL_MAGIC = b"MLPB"
+MODEL_VERSION = 1
+
+# Features fed to the model, in the order predict() in model.c expects them
+FEATURES = ["vs", "dr", "dx", "passes", "dist_bottom", "dist_top", "tti"]
+N_FEATURES = len(FEATURES)
+# Rows per chunk when streaming the CSV files
+CHUNK_ROWS = 4096
+# Gap ~ 30, Speed ~ 40 (hardcoded here based on Godot project)
+GAP = 30.0
+SPEED = 40.0
+
+# Parsed demos are cached as binary columns in this folder, next to the CSV files
+CACHE_DIR = "__democache__"
+CACHE_MAGIC = b"DEMOCOL1"
+CACHE_VERSION = 1
+# Set to False (--no-cache) to always parse the CSV files
+USE_CACHE = True
 
 
 def parse_args():
@@ -39,18 +72,57 @@ def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--data", help="Directory containing demos (default: this script folder)")
     p.add_argument("--out", help="Output native lib path (trainer will write model_weights.txt in same folder)")
+    p.add_argument("--model-out", help="Model file to write instead of model_weights.txt (e.g. a candidate "
+                                       "checked by evaluate.py --promote before it replaces the deployed model)")
     p.add_argument("--epochs", type=int, default=2000)
     p.add_argument("--lr", type=float, default=0.02)
-    p.add_argument("--layers", type=int, nargs='+', default=[16, 8], help="List of hidden layer sizes (e.g. 10 5)")
+    p.add_argument("--layers", type=int, nargs='+',
+                   help="List of hidden layer sizes (e.g. 10 5, default: 16 8; ignored with --resume)")
     p.add_argument("--l2", type=float, default=1e-5)
     p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--backend", choices=sorted(BACKENDS), default="python",
+                   help="Training engine: pure-Python loops or vectorized numpy")
+    p.add_argument("--batch-size", type=int, default=0,
+                   help="Samples per gradient update (0 = full batch, 1 = per-sample SGD)")
+    p.add_argument("--shuffle", action="store_true", help="Reshuffle samples every epoch (seeded by --seed)")
+    p.add_argument("--optimizer", choices=list(OPTIMIZERS), default="sgd")
+    p.add_argument("--beta1", type=float, default=0.9, help="First moment decay (momentum, adam)")
+    p.add_argument("--beta2", type=float, default=0.999, help="Second moment decay (rmsprop, adam)")
+    p.add_argument("--eps", type=float, default=1e-8, help="Denominator term of rmsprop/adam")
+    p.add_argument("--val-split", type=val_fraction, default=0.0,
+                   help="Fraction of each class held out for validation (e.g. 0.2)")
+    p.add_argument("--patience", type=int, default=0,
+                   help="Stop after N epochs without val loss improvement (needs --val-split)")
+    p.add_argument("--format", choices=["text", "binary", "both"], default="text",
+                   help="Model file format: model_weights.txt, model_weights.bin, or both")
+    p.add_argument("--binary-dtype", choices=["f64", "f32"], default="f64",
+                   help="Value type of the binary model file")
+    p.add_argument("--resume", metavar="MODEL",
+                   help="Fine-tune the weights of an existing model_weights.txt instead of random ones")
+    p.add_argument("--keep-normalization", action="store_true",
+                   help="With --resume: keep the model means/stds instead of recomputing them")
+    p.add_argument("--new-only", action="store_true",
+                   help="With --resume: only train on demo files modified after the model file")
+    p.add_argument("--no-cache", action="store_true",
+                   help=f"Always parse the CSV files instead of using the {CACHE_DIR} binary cache")
     return p.parse_args()
 
 
+def val_fraction(value: str) -> float:
+    """argparse type of --val-split: a fraction in [0, 1)."""
+    try:
+        fraction = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid fraction {value!r}")
+    if not 0 <= fraction < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not in [0, 1): the training set would be empty")
+    return fraction
+
+
 def parse_csv_line(line: str, expected_cols: int) -> List[str]:
     """Parse a semicolon-separated CSV line into fields.
     
-    Called by: load_all()
+    Called by: read_csv_chunks()
     Args:
         line: Raw CSV line string
         expected_cols: Expected number of columns (for validation)
@@ -58,133 +130,505 @@ def parse_csv_line(line: str, expected_cols: int) -> List[str]:
     """
     return line.split(';')
 
-def to_float(s: str) -> float:
-    """Convert string to float, handling both comma and dot decimal separators.
+
+def demo_files() -> List[str]:
+    """Return the demos_*.csv files matching PATTERN, in a stable (sorted) order."""
+    return sorted(glob.glob(PATTERN))
+
+
+def read_csv_chunks(path: str, chunk_rows: int=CHUNK_ROWS) -> Iterator[Tuple[array, array]]:
+    """Stream one demo CSV file as fixed-size chunks of contiguous arrays.
+    
+    Called by: iter_chunks()
+    Parses each row to extract:
+    - Original features: fh, fx, vs, dr, dx, oy, passes
+    - Derived features: dist_bottom, dist_top, tti
+    - Action label: 0 (no jump) or 1 (jump)
+    
+    Only the FEATURES columns are kept (fh, fx, oy are dropped), so a row costs
+    N_FEATURES doubles plus one byte instead of a list of boxed floats.
+    
+    Args:
+        path: CSV file to read
+        chunk_rows: Maximum number of rows per chunk
+    
+    Yields:
+        Tuples of (X, y) where:
+        - X: array('d') of rows*N_FEATURES values, row-major
+        - y: array('b') of rows action labels
+    """
+    print(f"Loading {path}...")
+    with open(path, 'r') as f:
+        header_line = f.readline().lower()
+        header_fields = [f.strip() for f in header_line.split(';')]
+        expected_fields = 9  # time + 7 features + action
+        
+        # Validate header column count
+        if len(header_fields) != expected_fields:
+            raise ValueError(
+                f"ERROR: CSV format mismatch in {path}!\n"
+                f"Expected {expected_fields} columns, found {len(header_fields)}.\n"
+                f"Header: {header_line.strip()}\n"
+                f"Please delete outdated CSV files and generate new training data."
+            )
+        
+        X = array('d')
+        y = array('b')
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            
+            # Decimal commas are normalized once per line rather than per field
+            parts = parse_csv_line(line.replace(',', '.'), expected_fields)
+            if len(parts) < expected_fields:
+                raise ValueError(
+                    f"ERROR: Data row has {len(parts)} columns, expected {expected_fields}.\n"
+                    f"File: {path}\n"
+                    f"Line: {line[:100]}...\n"
+                    f"Please delete outdated CSV files."
+                )
+            
+            try:
+                fh, fx, vs, dr, dx, oy, passes = map(float, parts[1:8])
+                act = int(parts[8])
+            except ValueError:
+                # skip unparsable rows
+                continue
+            
+            # Derived features
+            # Gap ~ 30, Speed ~ 40 (hardcoded here based on Godot project)
+            dist_bottom = fh - oy
+            dist_top = (oy + GAP) - fh
+            tti = dx / SPEED if SPEED > 0 else 0
+            
+            # Total 7 inputs: vs, dr, dx, passes, dist_bottom, dist_top, tti
+            X.extend((vs, dr, dx, passes, dist_bottom, dist_top, tti))
+            y.append(act)
+            if len(y) == chunk_rows:
+                yield X, y
+                X = array('d')
+                y = array('b')
+        if y:
+            yield X, y
+
+
+def cache_path(path: str) -> str:
+    """Return the binary cache file used for the demo CSV at path."""
+    return os.path.join(os.path.dirname(path), CACHE_DIR, os.path.basename(path) + ".col")
+
+
+def _source_signature(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+@functools.lru_cache(maxsize=None)
+def _parser_code_hash() -> str:
+    """Hash of the code that turns CSV rows into features (read_csv_chunks, parse_csv_line)."""
+    h = hashlib.sha256()
+    for func in (parse_csv_line, read_csv_chunks):
+        try:
+            h.update(inspect.getsource(func).encode())
+        except (OSError, TypeError):  # no source available (e.g. frozen build)
+            h.update(func.__code__.co_code)
+            h.update(repr(func.__code__.co_consts).encode())
+    return h.hexdigest()
+
+
+def parser_signature() -> str:
+    """Identify how the cached features were derived.
+    
+    Called by: write_cache(), read_cache()
+    Covers the parsing/derivation code and the constants it uses (FEATURES,
+    GAP, SPEED), so editing any of them invalidates every cache without
+    bumping CACHE_VERSION by hand.
+    """
+    return hashlib.sha256(json.dumps([_parser_code_hash(), FEATURES, GAP, SPEED]).encode()).hexdigest()[:16]
+
+
+def write_cache(path: str, X: array, y: array) -> str:
+    """Write the parsed rows of a demo CSV as a binary columnar file.
+    
+    Called by: read_demo_chunks() after parsing a CSV without a valid cache
+    Layout:
+    - CACHE_MAGIC, then the header length as little-endian uint32
+    - JSON header: version, column names and types, row count, the source
+      CSV mtime/size and the parser_signature() used to invalidate the cache;
+      padded to 8 bytes
+    - One little-endian float64 column per feature, then the int8 action column
+    
+    Columns are 8-byte aligned so the file can be memory-mapped as is.
+    The file is written under a temporary name then renamed, so concurrent
+    readers never see a partial cache.
+    
+    Returns: Path of the cache file
+    """
+    n = len(y)
+    mtime_ns, size = _source_signature(path)
+    header = json.dumps({
+        "version": CACHE_VERSION,
+        "columns": FEATURES + ["action"],
+        "types": ["<f8"] * N_FEATURES + ["i1"],
+        "rows": n,
+        "source": os.path.basename(path),
+        "source_mtime_ns": mtime_ns,
+        "source_size": size,
+        "parser": parser_signature(),
+    }).encode()
+    header += b" " * (-(len(CACHE_MAGIC) + 4 + len(header)) % 8)
+
+    out = cache_path(path)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    tmp = f"{out}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(CACHE_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for j in range(N_FEATURES):
+            col = X[j::N_FEATURES]
+            if sys.byteorder == "big":
+                col.byteswap()
+            col.tofile(f)
+        y.tofile(f)
+    os.replace(tmp, out)
+    return out
+
+
+def read_cache(path: str) -> Optional[Tuple[array, array]]:
+    """Load the cached rows of a demo CSV (see write_cache()).
+    
+    Called by: read_demo_chunks()
+    
+    Returns:
+        (X, y) in the same layout as load_arrays(), or None when there is no
+        cache, or it is stale (the CSV or the feature derivation changed) or
+        from another format version
+    """
+    try:
+        f = open(cache_path(path), "rb")
+    except OSError:
+        return None
+    try:
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+                return None
+            offset = len(CACHE_MAGIC)
+            (header_len,) = struct.unpack_from("<I", mm, offset)
+            offset += 4
+            header = json.loads(mm[offset:offset + header_len])
+            offset += header_len
+            if (header["version"] != CACHE_VERSION
+                    or header["columns"] != FEATURES + ["action"]
+                    or header.get("parser") != parser_signature()
+                    or (header["source_mtime_ns"], header["source_size"]) != _source_signature(path)):
+                return None
+
+            n = header["rows"]
+            X = array('d', bytes(8 * n * N_FEATURES))
+            for j in range(N_FEATURES):
+                col = array('d')
+                col.frombytes(mm[offset:offset + 8 * n])
+                offset += 8 * n
+                if sys.byteorder == "big":
+                    col.byteswap()
+                X[j::N_FEATURES] = col
+            y = array('b')
+            y.frombytes(mm[offset:offset + n])
+            if len(y) != n:
+                return None
+            return X, y
+    except (ValueError, KeyError, struct.error):
+        # truncated or corrupted cache: parse the CSV again
+        return None
+
+
+def read_demo_chunks(path: str, chunk_rows: int=CHUNK_ROWS, use_cache: Optional[bool]=None) -> Iterator[Tuple[array, array]]:
+    """Stream one demo file as (X, y) chunks, through the binary cache.
+    
+    Called by: iter_chunks()
+    On a cache miss the CSV is parsed with read_csv_chunks() and the cache is
+    (re)written; later calls only read the binary columns.
     
-    Called by: load_all()
     Args:
-        s: String representation of a number
-    Returns: Float value
+        path: CSV file to read
+        chunk_rows: Maximum number of rows per chunk
+        use_cache: Use the binary cache (default: USE_CACHE)
     """
-    return float(s.replace(',', '.'))
+    if use_cache is None:
+        use_cache = USE_CACHE
+    if not use_cache:
+        yield from read_csv_chunks(path, chunk_rows)
+        return
+
+    cached = read_cache(path)
+    if cached is None:
+        X = array('d')
+        y = array('b')
+        for X_chunk, y_chunk in read_csv_chunks(path, chunk_rows):
+            X.extend(X_chunk)
+            y.extend(y_chunk)
+        try:
+            write_cache(path, X, y)
+        except OSError as e:
+            print(f"Could not write demo cache for {path}: {e}")
+    else:
+        print(f"Loading {path} (cached)...")
+        X, y = cached
+    for i in range(0, len(y), chunk_rows):
+        yield X[i * N_FEATURES:(i + chunk_rows) * N_FEATURES], y[i:i + chunk_rows]
+
 
-def load_all() -> Tuple[List[List[float]], List[int]]:
+def iter_chunks(paths: Optional[List[str]]=None, chunk_rows: int=CHUNK_ROWS,
+                use_cache: Optional[bool]=None) -> Iterator[Tuple[array, array]]:
+    """Stream all demo files as (X, y) chunks (see read_csv_chunks()).
+    
+    Called by: load_arrays(), and anything that wants to process the demos
+    without materializing every row (e.g. accumulating normalization stats).
+    A chunk never spans two files. Files go through the binary cache
+    (read_demo_chunks()) unless use_cache (default: USE_CACHE) is False.
+    
+    Args:
+        paths: CSV files to read (default: demo_files())
+        chunk_rows: Maximum number of rows per chunk
+        use_cache: Use the binary cache (default: USE_CACHE)
+    """
+    for path in (demo_files() if paths is None else paths):
+        yield from read_demo_chunks(path, chunk_rows, use_cache)
+
+
+def load_arrays(paths: Optional[List[str]]=None, use_cache: Optional[bool]=None) -> Tuple[array, array]:
+    """Load all demos into two contiguous arrays.
+    
+    Called by: load_all(), prepare_dataset()
+    
+    Args:
+        paths: CSV files to read (default: demo_files())
+        use_cache: Use the binary cache (default: USE_CACHE)
+    
+    Returns:
+        Tuple of (X, y) where:
+        - X: array('d') of n_rows*N_FEATURES values, row-major (~56 bytes per row)
+        - y: array('b') of action labels
+    """
+    X = array('d')
+    y = array('b')
+    for X_chunk, y_chunk in iter_chunks(paths, use_cache=use_cache):
+        X.extend(X_chunk)
+        y.extend(y_chunk)
+    return X, y
+
+
+def load_all(paths: Optional[List[str]]=None, use_cache: Optional[bool]=None) -> Tuple[List[List[float]], List[int]]:
     """Load all demo CSV files and extract features and labels.
     
     Called by: main()
-    Reads all demos_*.csv files from the PATTERN directory.
-    Parses each row to extract:
-    - Original features: fh, fx, vs, dr, dx, oy, passes
-    - Derived features: dist_bottom, dist_top, tti
-    - Action label: 0 (no jump) or 1 (jump)
+    Reads all demos_*.csv files from the PATTERN directory through iter_chunks()
+    and converts them to lists (see load_arrays() for the compact form).
     
     Currently uses 7 features (excluding fh, fx, oy) for training.
     
+    Args:
+        paths: CSV files to read (default: demo_files())
+        use_cache: Use the binary cache (default: USE_CACHE)
+    
     Returns:
         Tuple of (X, y) where:
         - X: List of feature vectors (each is 7 floats)
         - y: List of action labels (0 or 1)
     """
-    X: List[List[float]] = []
-    y: List[int] = []
+    X_flat, y = load_arrays(paths, use_cache)
+    n = N_FEATURES
+    X = [X_flat[i:i + n].tolist() for i in range(0, len(X_flat), n)]
+    return X, y.tolist()
+
+
+class RunningStats:
+    """Per-feature mean and variance accumulated in a single pass.
     
-    for path in glob.glob(PATTERN):
-        print(f"Loading {path}...")
-        with open(path, 'r') as f:
-            header_line = f.readline().lower()
-            header_fields = [f.strip() for f in header_line.split(';')]
-            expected_fields = 9  # time + 7 features + action
-            
-            # Validate header column count
-            if len(header_fields) != expected_fields:
-                raise ValueError(
-                    f"ERROR: CSV format mismatch in {path}!\n"
-                    f"Expected {expected_fields} columns, found {len(header_fields)}.\n"
-                    f"Header: {header_line.strip()}\n"
-                    f"Please delete outdated CSV files and generate new training data."
-                )
-            
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                parts = parse_csv_line(line, expected_fields)
-                
-                try:
-                    if len(parts) < expected_fields:
-                        raise ValueError(
-                            f"ERROR: Data row has {len(parts)} columns, expected {expected_fields}.\n"
-                            f"File: {path}\n"
-                            f"Line: {line[:100]}...\n"
-                            f"Please delete outdated CSV files."
-                        )
-                    
-                    fh = to_float(parts[1]); fx = to_float(parts[2]); vs = to_float(parts[3])
-                    dr = to_float(parts[4]); dx = to_float(parts[5]); oy = to_float(parts[6]); passes = to_float(parts[7]); act = int(parts[8])
-                    
-                    # Derived features
-                    # Gap ~ 30, Speed ~ 40 (hardcoded here based on Godot project)
-                    gap = 30.0
-                    speed = 40.0
-                    
-                    dist_bottom = fh - oy
-                    dist_top = (oy + gap) - fh
-                    tti = dx / speed if speed > 0 else 0
-                    
-                    # Total 7 inputs: vs, dr, dx, passes, dist_bottom, dist_top, tti
-                    # X.append([fh, fx, vs, dr, dx, oy, passes, dist_bottom, dist_top, tti])  # Old 10-feature version
-                    X.append([vs, dr, dx, passes, dist_bottom, dist_top, tti])
-                    y.append(act)
-                except (ValueError, IndexError) as e:
-                    # Re-raise ValueError for format errors, skip other parsing errors
-                    if isinstance(e, ValueError) and "ERROR:" in str(e):
-                        raise
-                    pass
+    Called by: normalize_inplace(), prepare_dataset()
+    Rows are added one at a time (Welford's update) or a chunk at a time, and
+    partial results computed on other chunks, files or worker processes are
+    combined with merge() (Chan et al. pairwise update), so the statistics can
+    follow a stream of data without keeping it. save()/load() persist them.
     
-    return X, y
+    Args:
+        n_features: Number of values per row
+    """
+
+    def __init__(self, n_features: int):
+        self.count = 0
+        self.mean = [0.0] * n_features
+        self.m2 = [0.0] * n_features  # sum of squared deviations from the mean
+
+    def update(self, row) -> None:
+        """Add a single feature vector."""
+        self.count += 1
+        mean = self.mean
+        m2 = self.m2
+        for i, v in enumerate(row):
+            delta = v - mean[i]
+            mean[i] += delta / self.count
+            m2[i] += delta * (v - mean[i])
+
+    def update_chunk(self, X) -> None:
+        """Add a chunk of rows: a flat row-major array('d') (see iter_chunks()) or a 2D numpy array."""
+        n = len(self.mean)
+        chunk = RunningStats(n)
+        if hasattr(X, "ndim"):
+            chunk.count = len(X)
+            if chunk.count:
+                mean = X.mean(axis=0)
+                chunk.mean = mean.tolist()
+                chunk.m2 = ((X - mean) ** 2).sum(axis=0).tolist()
+        else:
+            chunk.count = len(X) // n
+            for i in range(n):
+                col = X[i::n]
+                mean = sum(col) / chunk.count if chunk.count else 0.0
+                chunk.mean[i] = mean
+                chunk.m2[i] = sum((v - mean) ** 2 for v in col)
+        self.merge(chunk)
+
+    def merge(self, other: 'RunningStats') -> 'RunningStats':
+        """Fold the statistics of another accumulator into this one (returns self)."""
+        if not other.count:
+            return self
+        total = self.count + other.count
+        for i in range(len(self.mean)):
+            delta = other.mean[i] - self.mean[i]
+            self.mean[i] += delta * other.count / total
+            self.m2[i] += other.m2[i] + delta * delta * self.count * other.count / total
+        self.count = total
+        return self
+
+    def means_stds(self, eps=1e-6) -> Tuple[List[float], List[float]]:
+        """Return (means, stds) with population std, stds below eps replaced by 1.0."""
+        stds = [math.sqrt(m2 / self.count) if self.count else 0.0 for m2 in self.m2]
+        # clamp stds to avoid divide-by-zero
+        return list(self.mean), [s if s > eps else 1.0 for s in stds]
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2}
 
+    @classmethod
+    def from_dict(cls, d: dict) -> 'RunningStats':
+        stats = cls(len(d["mean"]))
+        stats.count = d["count"]
+        stats.mean = list(d["mean"])
+        stats.m2 = list(d["m2"])
+        return stats
 
-def normalize(X: List[List[float]], eps=1e-6):
-    """Normalize features using z-score normalization (mean=0, std=1).
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> 'RunningStats':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def normalize_inplace(X: List[List[float]], eps=1e-6):
+    """Normalize features in place using z-score normalization (mean=0, std=1).
     
-    Called by: main()
-    Computes mean and standard deviation for each feature across all samples,
-    then normalizes each feature to have zero mean and unit variance.
+    Called by: prepare_dataset()
+    Computes mean and standard deviation for each feature across all samples
+    in a single pass (RunningStats), then overwrites each row of X with its
+    normalized values, so no second copy of the dataset is allocated. Unlike
+    apply_normalization(), the caller's rows are modified: pass rows nothing
+    else holds on to. A row object repeated in X (as produced by
+    balance_data() oversampling) counts once per occurrence in the statistics
+    but is only normalized once.
     
     Args:
-        X: List of feature vectors
+        X: List of feature vectors, normalized in place
         eps: Minimum std to avoid division by zero (default: 1e-6)
     
     Returns:
-        Tuple of (Xn, means, stds) where:
-        - Xn: Normalized feature vectors
+        Tuple of (means, stds) where:
         - means: Mean of each feature (needed for C model normalization)
         - stds: Std dev of each feature (needed for C model normalization)
     """
     if not X:
-        return X, [], []
+        return [], []
     n = len(X[0])
-    m = len(X)
-    means = [0.0]*n
+    stats = RunningStats(n)
     for row in X:
-        for i in range(n):
-            means[i] += row[i]
-    means = [x/m for x in means]
-    stds = [0.0]*n
+        stats.update(row)
+    means, stds = stats.means_stds(eps)
+    done = set()
     for row in X:
+        if id(row) in done:
+            continue
+        done.add(id(row))
         for i in range(n):
-            stds[i] += (row[i]-means[i])**2
-    stds = [math.sqrt(s/m) for s in stds]
-    # clamp stds to avoid divide-by-zero
-    stds = [s if s > eps else 1.0 for s in stds]
-    Xn = []
-    for row in X:
-        Xn.append([(row[i]-means[i])/stds[i] for i in range(n)])
-    return Xn, means, stds
+            row[i] = (row[i]-means[i])/stds[i]
+    return means, stds
+
 
+def apply_normalization(X: List[List[float]], means: List[float], stds: List[float]) -> List[List[float]]:
+    """Normalize feature vectors with statistics computed elsewhere.
+    
+    Called by: main() for the validation set (which must use the training means/stds)
+    
+    Args:
+        X: List of feature vectors
+        means: Per-feature means returned by normalize_inplace()
+        stds: Per-feature standard deviations returned by normalize_inplace()
+    
+    Returns:
+        Normalized feature vectors
+    """
+    n = len(means)
+    return [[(row[i]-means[i])/stds[i] for i in range(n)] for row in X]
+
+
+def split_indices(y, fraction: float, seed: int=42) -> Tuple[List[int], List[int]]:
+    """Stratified split of row indices (see split_validation()).
+    
+    Called by: split_validation(), prepare_dataset()
+    
+    Returns:
+        Tuple of (train_idx, val_idx), both sorted
+    """
+    rnd = random.Random(seed)
+    train_idx: List[int] = []
+    val_idx: List[int] = []
+    for label in sorted(set(y)):
+        indices = [i for i, v in enumerate(y) if v == label]
+        rnd.shuffle(indices)
+        n_val = int(round(len(indices) * fraction))
+        val_idx += indices[:n_val]
+        train_idx += indices[n_val:]
+    train_idx.sort()
+    val_idx.sort()
+    return train_idx, val_idx
+
+
+def split_validation(X: List[List[float]], y: List[int], fraction: float, seed: int=42):
+    """Carve off a stratified validation set.
+    
+    Called by: prepare_dataset() before balance_data(), so oversampled duplicates
+    of a training row can never end up in the validation set.
+    Each class keeps the same proportion in both sets.
+    
+    Args:
+        X: Feature vectors
+        y: Labels (0 or 1)
+        fraction: Share of each class moved to the validation set (0 to 1)
+        seed: Random seed for reproducibility
+    
+    Returns:
+        Tuple of (X_train, y_train, X_val, y_val)
+    """
+    train_idx, val_idx = split_indices(y, fraction, seed)
+    return ([X[i] for i in train_idx], [y[i] for i in train_idx],
+            [X[i] for i in val_idx], [y[i] for i in val_idx])
 
-def balance_data(X: List[List[float]], y: List[int], seed: int=42) -> Tuple[List[List[float]], List[int]]:
+
+def balance_data(X: List[List[float]], y: List[int], seed: int=42,
+                 rng: Optional[random.Random]=None) -> Tuple[List[List[float]], List[int]]:
     """Balance the dataset by oversampling the minority class (jumps).
     
     Called by: main()
@@ -196,6 +640,7 @@ def balance_data(X: List[List[float]], y: List[int], seed: int=42) -> Tuple[List
         X: Feature vectors
         y: Labels (0 or 1)
         seed: Random seed for reproducibility
+        rng: Random stream to draw from instead of seeding a new one from seed
     
     Returns:
         Tuple of (X_balanced, y_balanced) with equal class representation
@@ -203,36 +648,50 @@ def balance_data(X: List[List[float]], y: List[int], seed: int=42) -> Tuple[List
     if not X:
         return X, y
     
+    all_indices = balance_indices(y, seed, rng)
+    if all_indices is None:
+        return X, y # Cannot balance
+    
+    X_bal = [X[i] for i in all_indices]
+    y_bal = [y[i] for i in all_indices]
+    
+
+    return X_bal, y_bal
+
+
+def balance_indices(y, seed: int=42, rng: Optional[random.Random]=None) -> Optional[List[int]]:
+    """Row indices of the balanced dataset (see balance_data()).
+    
+    Called by: balance_data(), prepare_dataset()
+    Without rng, the oversampling and the shuffle each use a fresh random.Random(seed).
+    
+    Returns:
+        Shuffled list of indices where positives are oversampled to match the
+        negatives, or None when one of the classes is missing
+    """
     pos_indices = [i for i, label in enumerate(y) if label == 1]
     neg_indices = [i for i, label in enumerate(y) if label == 0]
     
     n_pos = len(pos_indices)
     n_neg = len(neg_indices)
     
-
-    
     if n_pos == 0 or n_neg == 0:
-        return X, y # Cannot balance
+        return None
     
     # Target: roughly equal counts
     target = n_neg
     if n_pos < target:
         # Oversample positives
-        rnd = random.Random(seed)
+        rnd = rng or random.Random(seed)
         while len(pos_indices) < target:
             pos_indices.append(rnd.choice(pos_indices[:n_pos]))
             
     # Combine indices
     all_indices = pos_indices + neg_indices
-    random.Random(seed).shuffle(all_indices)
-    
-    X_bal = [X[i] for i in all_indices]
-    y_bal = [y[i] for i in all_indices]
-    
-
-    return X_bal, y_bal
+    (rng or random.Random(seed)).shuffle(all_indices)
+    return all_indices
 
-def make_mlp(n_in: int, layer_sizes: List[int], seed: int=42):
+def make_mlp(n_in: int, layer_sizes: List[int], seed: int=42, rng: Optional[random.Random]=None):
     """Initialize a Multi-Layer Perceptron with random weights.
     
     Called by: train_mlp()
@@ -249,13 +708,14 @@ def make_mlp(n_in: int, layer_sizes: List[int], seed: int=42):
         n_in: Number of input features
         layer_sizes: List of hidden layer sizes (e.g., [16, 8] for two hidden layers)
         seed: Random seed for weight initialization
+        rng: Random stream to draw the weights from instead of seeding a new one from seed
     
     Returns:
         Tuple of (W, b) where:
         - W: List of weight matrices, W[i] connects layer i to layer i+1
         - b: List of bias vectors, b[i] for layer i+1
     """
-    rnd = random.Random(seed)
+    rnd = rng or random.Random(seed)
     def randw():
         return rnd.uniform(-0.1, 0.1)
     
@@ -369,47 +829,133 @@ def forward_sample(x, W, b):
     return p, activations
 
 
-def train_mlp(Xn, y, layer_sizes: List[int], epochs=500, lr=0.01, l2=1e-4):
-    """Train the MLP using batch gradient descent with backpropagation.
+class SGD:
+    """Plain gradient descent: p -= lr * g.
     
-    Called by: main()
-    Implements:
-    - Binary cross-entropy loss
-    - Class weighting to handle imbalanced data
-    - L2 regularization to prevent overfitting
-    - Gradient clipping for stability
-    - Backpropagation through time for all layers
+    Called by: PythonBackend.apply() / NumpyBackend.apply()
+    Optimizers only use arithmetic operators, so the same step() serves the
+    Python backend (one float per parameter) and the numpy backend (one array
+    per layer). The state is a tuple of values shaped like the parameter.
     
     Args:
-        Xn: Normalized feature vectors
-        y: Labels (0 or 1)
-        layer_sizes: Hidden layer sizes (e.g., [16, 8])
-        epochs: Number of training iterations
         lr: Learning rate
-        l2: L2 regularization coefficient
-    
-    Returns:
-        Tuple of (W, b) - trained weights and biases
+        beta1: Decay of the first moment (momentum, adam)
+        beta2: Decay of the second moment (rmsprop, adam)
+        eps: Term added to the denominator of adaptive rules
     """
-    n_in = len(Xn[0]) if Xn else 0
-    if not Xn or not y or len(Xn) != len(y):
-        print(f"ERROR: Data mismatch: X={len(Xn)}, y={len(y)}")
-        return None, None
-    
-    W, b = make_mlp(n_in, layer_sizes)
-    m = len(Xn)
-    num_layers = len(W)
-    
-    # Compute class weights
-    pos_count = sum(y)
-    neg_count = m - pos_count
-    weight_pos = neg_count / pos_count if pos_count > 0 else 1.0
-    weight_neg = 1.0
-    
+    name = "sgd"
+
+    def __init__(self, lr: float, beta1: float=0.9, beta2: float=0.999, eps: float=1e-8):
+        self.lr = lr
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+
+    def init_state(self, zero):
+        """Return the initial state for a parameter; zero is 0.0 or a zero array."""
+        return ()
+
+    def step(self, g, state, t):
+        """Return (amount to subtract from the parameter, new state) for gradient g at update t."""
+        return self.lr * g, state
+
+
+class Momentum(SGD):
+    """Heavy-ball momentum: v = beta1 * v + g; p -= lr * v."""
+    name = "momentum"
+
+    def init_state(self, zero):
+        return (zero,)
+
+    def step(self, g, state, t):
+        v = self.beta1 * state[0] + g
+        return self.lr * v, (v,)
+
+
+class RMSProp(SGD):
+    """Scales the step by a running average of squared gradients (decay beta2)."""
+    name = "rmsprop"
+
+    def init_state(self, zero):
+        return (zero,)
+
+    def step(self, g, state, t):
+        sq = self.beta2 * state[0] + (1 - self.beta2) * g * g
+        return self.lr * g / (sq ** 0.5 + self.eps), (sq,)
+
+
+class Adam(SGD):
+    """Adam: bias-corrected first (beta1) and second (beta2) moments."""
+    name = "adam"
+
+    def init_state(self, zero):
+        return (zero, zero)
+
+    def step(self, g, state, t):
+        m1 = self.beta1 * state[0] + (1 - self.beta1) * g
+        m2 = self.beta2 * state[1] + (1 - self.beta2) * g * g
+        m_hat = m1 / (1 - self.beta1 ** t)
+        v_hat = m2 / (1 - self.beta2 ** t)
+        return self.lr * m_hat / (v_hat ** 0.5 + self.eps), (m1, m2)
+
+
+OPTIMIZERS = {opt.name: opt for opt in (SGD, Momentum, RMSProp, Adam)}
 
+
+class PythonBackend:
+    """Reference training backend: nested Python lists, one sample at a time.
     
-    for epoch in range(epochs):
-        # Accumulate gradients
+    Called by: train_mlp() when --backend python (the default)
+    Works without any third-party dependency; every forward/backward pass goes
+    through forward_sample().
+    """
+    name = "python"
+
+    def prepare(self, Xn, y):
+        """Return the dataset in the representation used by gradients()."""
+        return Xn, y
+
+    def take(self, X, y, idx):
+        """Return the rows of (X, y) selected by the index list idx."""
+        return [X[i] for i in idx], [y[i] for i in idx]
+
+    def params(self, W, b):
+        """Return W/b (as built by make_mlp) in the backend representation."""
+        return W, b
+
+    def export(self, W, b):
+        """Return W/b as nested lists of floats, as expected by write_model()."""
+        return W, b
+
+    def copy(self, W, b):
+        """Return an independent copy of W/b (best checkpoint)."""
+        return [[row[:] for row in w] for w in W], [v[:] for v in b]
+
+    def evaluate(self, X, y, W, b):
+        """Return (mean unweighted BCE loss, accuracy at the 0.5 threshold) over (X, y)."""
+        loss = 0.0
+        correct = 0
+        for xi, yi in zip(X, y):
+            p, _ = forward_sample(xi, W, b)
+            loss -= yi*math.log(max(p,1e-12)) + (1-yi)*math.log(max(1-p,1e-12))
+            correct += (p >= 0.5) == (yi == 1)
+        return loss / len(X), correct / len(X)
+
+    def gradients(self, X, y, W, b, weight_pos, weight_neg):
+        """Accumulate the weighted BCE loss and its gradients over (X, y).
+        
+        Args:
+            X: Normalized feature vectors
+            y: Labels (0 or 1)
+            W: List of weight matrices
+            b: List of bias vectors
+            weight_pos: Class weight applied to positive samples
+            weight_neg: Class weight applied to negative samples
+        
+        Returns:
+            Tuple of (loss, dW, db): summed (not averaged) loss and gradients
+        """
+        num_layers = len(W)
         dW = []
         db = []
         # Initialize zero gradients matching shapes
@@ -421,7 +967,7 @@ def train_mlp(Xn, y, layer_sizes: List[int], epochs=500, lr=0.01, l2=1e-4):
             
         loss = 0.0
         
-        for xi, yi in zip(Xn, y):
+        for xi, yi in zip(X, y):
             p, activations = forward_sample(xi, W, b)
             
             # Loss and initial error (delta) at output
@@ -493,27 +1039,258 @@ def train_mlp(Xn, y, layer_sizes: List[int], epochs=500, lr=0.01, l2=1e-4):
                         
                     delta = next_delta
 
-        # Apply gradients with clipping and L2
-        clip = 5.0
-        for k in range(num_layers):
+        return loss, dW, db
+
+    def init_state(self, W, b, optimizer):
+        """Return the optimizer state for every parameter, shaped like (W, b)."""
+        sW = [[[optimizer.init_state(0.0) for _ in row] for row in w] for w in W]
+        sb = [[optimizer.init_state(0.0) for _ in v] for v in b]
+        return sW, sb
+
+    def apply(self, W, b, dW, db, m, l2, optimizer, state, t, clip=5.0):
+        """Apply averaged gradients in place with L2, clipping and the optimizer rule.
+        
+        Args:
+            W, b: Parameters to update (modified in place)
+            dW, db: Summed gradients returned by gradients()
+            m: Number of samples the gradients were summed over
+            l2: L2 regularization coefficient
+            optimizer: Update rule (see OPTIMIZERS)
+            state: Optimizer state returned by init_state() (modified in place)
+            t: 1-based index of this update
+            clip: Absolute bound applied to each gradient component
+        """
+        sW, sb = state
+        for k in range(len(W)):
             rows = len(W[k])
             cols = len(W[k][0])
             for r in range(rows):
                 grad_b = db[k][r] / m
                 if grad_b > clip: grad_b = clip
                 elif grad_b < -clip: grad_b = -clip
-                b[k][r] -= lr * grad_b
+                step, sb[k][r] = optimizer.step(grad_b, sb[k][r], t)
+                b[k][r] -= step
                 
                 for c in range(cols):
                     grad_w = dW[k][r][c] / m + l2 * W[k][r][c]
                     if grad_w > clip: grad_w = clip
                     elif grad_w < -clip: grad_w = -clip
-                    W[k][r][c] -= lr * grad_w
+                    step, sW[k][r][c] = optimizer.step(grad_w, sW[k][r][c], t)
+                    W[k][r][c] -= step
+
+
+class NumpyBackend:
+    """Vectorized training backend: the whole batch goes through matrix ops.
+    
+    Called by: train_mlp() when --backend numpy
+    Computes the same forward pass, weighted BCE loss, backprop, L2 and clipping
+    as PythonBackend, so results match it within float tolerance for the same
+    seed. numpy is only imported when this backend is selected.
+    """
+    name = "numpy"
+
+    def __init__(self):
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError("The numpy backend requires numpy (pip install -r requirements.txt)")
+        self.np = numpy
+
+    def prepare(self, Xn, y):
+        np = self.np
+        return np.asarray(Xn, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+    def take(self, X, y, idx):
+        return X[idx], y[idx]
+
+    def params(self, W, b):
+        np = self.np
+        return ([np.array(w, dtype=np.float64) for w in W],
+                [np.array(v, dtype=np.float64) for v in b])
+
+    def export(self, W, b):
+        return [w.tolist() for w in W], [v.tolist() for v in b]
+
+    def copy(self, W, b):
+        return [w.copy() for w in W], [v.copy() for v in b]
+
+    def evaluate(self, X, y, W, b):
+        np = self.np
+        p = self.forward(X, W, b)[-1][:, 0]
+        loss = -np.mean(y*np.log(np.maximum(p, 1e-12)) + (1-y)*np.log(np.maximum(1-p, 1e-12)))
+        return float(loss), float(np.mean((p >= 0.5) == (y == 1)))
+
+    def forward(self, X, W, b):
+        """Batched equivalent of forward_sample(): returns the activations of every layer."""
+        np = self.np
+        activations = [X]
+        current_act = X
+        num_layers = len(W)
+        for k in range(num_layers):
+            z = current_act @ W[k].T + b[k]
+            if k == num_layers - 1:
+                # Output layer: Sigmoid, split on the sign like sigmoid()
+                e = np.exp(-np.abs(z))
+                current_act = np.where(z >= 0, 1.0 / (1.0 + e), e / (1.0 + e))
+            else:
+                current_act = np.tanh(z)
+            activations.append(current_act)
+        return activations
+
+    def gradients(self, X, y, W, b, weight_pos, weight_neg):
+        np = self.np
+        activations = self.forward(X, W, b)
+        p = activations[-1][:, 0]
+        weight = np.where(y == 1, weight_pos, weight_neg)
+        loss = float(np.sum(weight * -(y*np.log(np.maximum(p, 1e-12)) + (1-y)*np.log(np.maximum(1-p, 1e-12)))))
+
+        num_layers = len(W)
+        dW = [None] * num_layers
+        db = [None] * num_layers
+        delta = ((p - y) * weight)[:, None]
+        for k in range(num_layers - 1, -1, -1):
+            dW[k] = delta.T @ activations[k]
+            db[k] = delta.sum(axis=0)
+            if k > 0:
+                # Hidden layers are tanh: derivative is 1 - a^2
+                delta = (delta @ W[k]) * (1.0 - activations[k] * activations[k])
+        return loss, dW, db
+
+    def init_state(self, W, b, optimizer):
+        np = self.np
+        return ([optimizer.init_state(np.zeros_like(w)) for w in W],
+                [optimizer.init_state(np.zeros_like(v)) for v in b])
+
+    def apply(self, W, b, dW, db, m, l2, optimizer, state, t, clip=5.0):
+        np = self.np
+        sW, sb = state
+        for k in range(len(W)):
+            step, sb[k] = optimizer.step(np.clip(db[k] / m, -clip, clip), sb[k], t)
+            b[k] -= step
+            step, sW[k] = optimizer.step(np.clip(dW[k] / m + l2 * W[k], -clip, clip), sW[k], t)
+            W[k] -= step
+
+
+BACKENDS = {
+    PythonBackend.name: PythonBackend,
+    NumpyBackend.name: NumpyBackend,
+}
+
+
+def train_mlp(Xn, y, layer_sizes: List[int], epochs=500, lr=0.01, l2=1e-4, backend="python",
+              batch_size=0, shuffle=False, seed=42,
+              optimizer="sgd", beta1=0.9, beta2=0.999, eps=1e-8,
+              val=None, patience=0, init=None, rng=None):
+    """Train the MLP using (mini-)batch gradient descent with backpropagation.
+    
+    Called by: main()
+    Implements:
+    - Binary cross-entropy loss
+    - Class weighting to handle imbalanced data
+    - L2 regularization to prevent overfitting
+    - Gradient clipping for stability
+    - Backpropagation through time for all layers
+    - Full-batch (default), mini-batch or per-sample (batch_size=1) updates
+    - Early stopping on the validation loss, restoring the best weights
+    
+    Args:
+        Xn: Normalized feature vectors
+        y: Labels (0 or 1)
+        layer_sizes: Hidden layer sizes (e.g., [16, 8])
+        epochs: Number of training iterations
+        lr: Learning rate
+        l2: L2 regularization coefficient
+        backend: Name of the training backend in BACKENDS ("python" or "numpy")
+        batch_size: Samples per update; 0 (or >= dataset size) means one full-batch update per epoch
+        shuffle: Reshuffle the sample order before every epoch (mini-batch mode only)
+        seed: Random seed for the weight initialization and the shuffling
+        optimizer: Name of the update rule in OPTIMIZERS ("sgd", "momentum", "rmsprop" or "adam")
+        beta1, beta2, eps: Hyperparameters of the optimizer (see SGD)
+        val: Optional (Xv, yv) validation set, normalized like Xn; its loss and
+             accuracy are tracked every epoch
+        patience: Stop after this many epochs without validation loss
+                  improvement and restore the best W/b (0 = run all epochs)
+        init: Optional (W, b) to start from instead of make_mlp() random
+              weights (fine-tuning, see read_model()); layer_sizes is then
+              ignored and init is not modified
+        rng: Random stream to use instead of random.Random(seed); the initial
+             weights are drawn first, then the shuffles, so a single seed
+             reproduces a run bit for bit
+    
+    Returns:
+        Tuple of (W, b) - trained weights and biases, as nested lists
+    """
+    n_in = len(Xn[0]) if len(Xn) else 0
+    if not len(Xn) or not len(y) or len(Xn) != len(y):
+        print(f"ERROR: Data mismatch: X={len(Xn)}, y={len(y)}")
+        return None, None
+    
+    engine = BACKENDS[backend]()
+    rnd = rng or random.Random(seed)
+    if init is not None:
+        W, b = engine.params(*PythonBackend().copy(*init))
+    else:
+        W, b = engine.params(*make_mlp(n_in, layer_sizes, rng=rnd))
+    X, Y = engine.prepare(Xn, y)
+    opt = OPTIMIZERS[optimizer](lr, beta1=beta1, beta2=beta2, eps=eps)
+    opt_state = engine.init_state(W, b, opt)
+    t = 0
+    m = len(Xn)
+    
+    # Compute class weights
+    pos_count = sum(y)
+    neg_count = m - pos_count
+    weight_pos = neg_count / pos_count if pos_count > 0 else 1.0
+    weight_neg = 1.0
+    
+    if batch_size <= 0 or batch_size >= m:
+        batch_size = m
+    order = list(range(m))
+    
+    if val is not None:
+        Xv, Yv = engine.prepare(*val)
+        best_loss = math.inf
+        best_epoch = 0
+        best = engine.copy(W, b)
+    
+    for epoch in range(epochs):
+        loss = 0.0
+        if batch_size == m:
+            batches = [(X, Y)]
+        else:
+            if shuffle:
+                rnd.shuffle(order)
+            batches = [engine.take(X, Y, order[i:i + batch_size]) for i in range(0, m, batch_size)]
+
+        for Xb, Yb in batches:
+            batch_loss, dW, db = engine.gradients(Xb, Yb, W, b, weight_pos, weight_neg)
+            loss += batch_loss
+
+            # Apply gradients with clipping and L2
+            t += 1
+            engine.apply(W, b, dW, db, len(Xb), l2, opt, opt_state, t)
                     
+        report = f"  Epoch {epoch+1}/{epochs}, loss={loss/m:.4f}"
+        if val is not None:
+            val_loss, val_acc = engine.evaluate(Xv, Yv, W, b)
+            report += f", val_loss={val_loss:.4f}, val_acc={val_acc:.3f}"
+            if val_loss < best_loss:
+                best_loss = val_loss
+                best_epoch = epoch + 1
+                best = engine.copy(W, b)
+            elif patience and epoch + 1 - best_epoch >= patience:
+                print(report)
+                print(f"  Early stopping: no val_loss improvement for {patience} epochs")
+                break
+
         if (epoch + 1) % max(1, epochs // 10) == 0:
-            print(f"  Epoch {epoch+1}/{epochs}, loss={loss/m:.4f}")
+            print(report)
+
+    if val is not None:
+        print(f"  Best epoch {best_epoch}: val_loss={best_loss:.4f}")
+        W, b = best
             
-    return W, b
+    return engine.export(W, b)
 
 
 def write_model(W, b, means, stds, outpath):
@@ -527,6 +1304,9 @@ def write_model(W, b, means, stds, outpath):
     - Then for each layer: weight matrix rows, then bias vector
     
     The C model (model.c) reads this file to perform inference in Godot.
+    model.c prefers model_weights.bin, so a binary model left next to outpath
+    by an earlier --format binary run is removed: it would hide this one
+    (main() writes the binary again afterwards with --format both).
     
     Args:
         W: List of weight matrices
@@ -537,6 +1317,10 @@ def write_model(W, b, means, stds, outpath):
     """
     d = os.path.dirname(outpath)
     if not os.path.exists(d): os.makedirs(d)
+    stale = binary_model_path(outpath)
+    if os.path.exists(stale):
+        os.remove(stale)
+        print(f"Removed {stale}, older than the new text model")
     
     n_in = len(W[0][0])
     num_layers = len(W)
@@ -560,21 +1344,301 @@ def write_model(W, b, means, stds, outpath):
             f.write(' '.join(str(x) for x in b[k]) + "\n")
 
 
+def binary_model_path(outpath: str) -> str:
+    """Return the binary model path written next to a text model file (model_weights.bin)."""
+    return os.path.splitext(outpath)[0] + ".bin"
+
+
+def promote_model(candidate: str, dest: str) -> None:
+    """Replace the deployed model dest with candidate, and their binary siblings.
+    
+    Called by: evaluate.main() with --promote, once the candidate passed the checks
+    The candidate text file (when there is one) and its .bin replace the
+    deployed files. A deployed .bin without a candidate .bin is removed, as
+    model.c would keep loading it instead of the new text model.
+    
+    Raises:
+        FileNotFoundError: When neither candidate nor its .bin exists
+    """
+    bin_candidate, bin_dest = binary_model_path(candidate), binary_model_path(dest)
+    if not os.path.exists(candidate) and not os.path.exists(bin_candidate):
+        raise FileNotFoundError(f"ERROR: no candidate model {candidate} to promote")
+    d = os.path.dirname(dest)
+    if d and not os.path.exists(d): os.makedirs(d)
+    if os.path.exists(candidate):
+        shutil.copyfile(candidate, dest)
+    if os.path.exists(bin_candidate):
+        shutil.copyfile(bin_candidate, bin_dest)
+    elif os.path.exists(bin_dest):
+        os.remove(bin_dest)
+
+
+def write_model_binary(W, b, means, stds, outpath, dtype: str='d'):
+    """Write trained model to the compact binary format read by model.c.
+    
+    Called by: main() with --format binary|both
+    Layout (all little-endian):
+    - magic "MLPB", uint16 version, uint8 value type ('d' float64 or 'f' float32), uint8 padding
+    - uint32 n_in, uint32 n_layers, then n_layers uint32 layer sizes (output layer included)
+    - means (n_in values), stds (n_in values)
+    - for each layer: W rows (dout*din values, row-major), then b (dout values)
+    - uint32 CRC-32 of everything before it
+    
+    Args:
+        W, b, means, stds, outpath: As for write_model()
+        dtype: 'd' (float64, exact) or 'f' (float32, half the size)
+    """
+    if dtype not in ('d', 'f'):
+        raise ValueError(f"Unsupported model value type {dtype!r}, expected 'd' or 'f'")
+    d = os.path.dirname(outpath)
+    if d and not os.path.exists(d): os.makedirs(d)
+    
+    layer_sizes = [len(w) for w in W]
+    data = bytearray(MODEL_MAGIC)
+    data += struct.pack("<HBx", MODEL_VERSION, ord(dtype))
+    data += struct.pack(f"<II{len(layer_sizes)}I", len(W[0][0]), len(W), *layer_sizes)
+    values = array(dtype, means)
+    values.extend(array(dtype, stds))
+    for k in range(len(W)):
+        for row in W[k]:
+            values.extend(array(dtype, row))
+        values.extend(array(dtype, b[k]))
+    if sys.byteorder == "big":
+        values.byteswap()
+    data += values.tobytes()
+    data += struct.pack("<I", zlib.crc32(data))
+    with open(outpath, 'wb') as f:
+        f.write(data)
+
+
+def read_model_binary(path):
+    """Read a model file written by write_model_binary().
+    
+    Called by: read_model()
+    
+    Returns:
+        Tuple of (W, b, means, stds) as nested lists of floats
+    
+    Raises:
+        ValueError: On a bad magic number, version, size or checksum
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != MODEL_MAGIC:
+        raise ValueError(f"ERROR: {path} is not a binary MLP model (bad magic)")
+    if len(data) < 16 or struct.unpack_from("<I", data, len(data) - 4)[0] != zlib.crc32(data[:-4]):
+        raise ValueError(f"ERROR: {path} is corrupted (checksum mismatch)")
+    version, dtype = struct.unpack_from("<HB", data, 4)
+    if version != MODEL_VERSION or chr(dtype) not in ('d', 'f'):
+        raise ValueError(f"ERROR: {path}: unsupported model version {version} / value type {dtype}")
+    n_in, num_layers = struct.unpack_from("<II", data, 8)
+    layer_sizes = list(struct.unpack_from(f"<{num_layers}I", data, 16))
+    offset = 16 + 4 * num_layers
+    
+    values = array(chr(dtype))
+    values.frombytes(data[offset:-4])
+    if sys.byteorder == "big":
+        values.byteswap()
+    expected = 2 * n_in
+    din = n_in
+    for dout in layer_sizes:
+        expected += dout * (din + 1)
+        din = dout
+    if len(values) != expected:
+        raise ValueError(f"ERROR: {path}: {len(values)} values, expected {expected}")
+    
+    values = values.tolist()
+    means = values[:n_in]
+    stds = values[n_in:2 * n_in]
+    i = 2 * n_in
+    W = []
+    b = []
+    din = n_in
+    for dout in layer_sizes:
+        W.append([values[i + r * din:i + (r + 1) * din] for r in range(dout)])
+        i += dout * din
+        b.append(values[i:i + dout])
+        i += dout
+        din = dout
+    return W, b, means, stds
+
+
+def check_model_shape(path, W, b, means, stds):
+    """Check that a model read by read_model() fits the current features.
+    
+    Called by: main() for --resume
+    
+    Args:
+        path: Model file, for the error messages
+        W, b, means, stds: As returned by read_model(path)
+    
+    Raises:
+        ValueError: When the input width is not N_FEATURES (a model trained
+                    on another feature set) or the output is not the single
+                    jump probability train_mlp() builds
+    """
+    n_in = len(W[0][0]) if W and W[0] else 0
+    if n_in != N_FEATURES or len(means) != N_FEATURES or len(stds) != N_FEATURES:
+        raise ValueError(f"ERROR: {path} takes {n_in} inputs ({len(means)} means), "
+                         f"the demos have {N_FEATURES} features ({', '.join(FEATURES)})")
+    if len(W[-1]) != 1 or len(b[-1]) != 1:
+        raise ValueError(f"ERROR: {path} has {len(W[-1])} outputs, train_mlp() trains a single jump output")
+
+
+def read_model(path):
+    """Read a model file written by write_model() or write_model_binary().
+    
+    Called by: main() for --resume (followed by check_model_shape())
+    The binary format is recognized from its magic number.
+    
+    Args:
+        path: Model file (model_weights.txt)
+    
+    Returns:
+        Tuple of (W, b, means, stds) in the layout used by train_mlp()
+    
+    Raises:
+        ValueError: When the file is not a complete MLP model
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MODEL_MAGIC)) == MODEL_MAGIC:
+            return read_model_binary(path)
+    with open(path) as f:
+        lines = [line.split() for line in f if line.strip()]
+    if not lines or lines[0][0] != "MLP":
+        raise ValueError(f"ERROR: {path} is not an MLP model file (missing 'MLP' header)")
+    header = [int(v) for v in lines[0][1:]]
+    n_in, num_layers, layer_sizes = header[0], header[1], header[2:]
+    if len(layer_sizes) != num_layers:
+        raise ValueError(f"ERROR: {path}: header announces {num_layers} layers but lists {len(layer_sizes)} sizes")
+    expected_lines = 3 + sum(size + 1 for size in layer_sizes)
+    if len(lines) < expected_lines:
+        raise ValueError(f"ERROR: {path} is truncated: {len(lines)} lines, expected {expected_lines}")
+    
+    means = [float(v) for v in lines[1]]
+    stds = [float(v) for v in lines[2]]
+    W = []
+    b = []
+    i = 3
+    din = n_in
+    for dout in layer_sizes:
+        W.append([[float(v) for v in lines[i + r]] for r in range(dout)])
+        b.append([float(v) for v in lines[i + dout]])
+        if any(len(row) != din for row in W[-1]) or len(b[-1]) != dout:
+            raise ValueError(f"ERROR: {path}: layer {len(W)} does not match its declared size {dout}x{din}")
+        i += dout + 1
+        din = dout
+    return W, b, means, stds
+
+
+def prepare_dataset(val_split: float=0.0, seed: int=42, as_arrays: bool=False,
+                    paths: Optional[List[str]]=None, norm=None, use_cache: Optional[bool]=None):
+    """Load, split, balance and normalize the demos, ready for train_mlp().
+    
+    Called by: main(), sweep.main()
+    Exits the process when no demo file is found.
+    
+    Args:
+        val_split: Fraction of each class held out for validation (0 = none)
+        seed: Random seed for the split and the oversampling
+        as_arrays: Build 2D numpy arrays straight from load_arrays() instead of
+                   lists of lists (for the numpy backend, requires numpy)
+        paths: CSV files to use (default: demo_files())
+        norm: Optional frozen (means, stds) to normalize with instead of
+              computing them from the data (fine-tuning a resumed model)
+        use_cache: Use the binary cache (default: USE_CACHE)
+    
+    Returns:
+        Tuple of (Xn, y, means, stds, val) where val is (Xv_normalized, yv) or None
+    
+    Raises:
+        ValueError: When val_split is not in [0, 1), or leaves the training
+                    or the validation set empty
+    """
+    if not 0 <= val_split < 1:
+        raise ValueError(f"val_split must be in [0, 1), got {val_split}")
+    if as_arrays:
+        import numpy as np
+        X_flat, y_flat = load_arrays(paths, use_cache)
+        X = np.frombuffer(X_flat, dtype=np.float64).reshape(-1, N_FEATURES)
+        y = np.array(y_flat, dtype=np.float64)
+        labels = y_flat.tolist()
+    else:
+        X, y = load_all(paths, use_cache)
+        labels = y
+    if not len(X):
+        print("No data found!")
+        sys.exit(1)
+        
+    # Hold out validation rows before oversampling so duplicates don't leak
+    val = None
+    if val_split > 0:
+        train_idx, val_idx = split_indices(labels, val_split, seed)
+        if not val_idx or not train_idx:
+            raise ValueError(
+                f"val_split={val_split} on {len(labels)} rows leaves "
+                f"{len(train_idx)} training and {len(val_idx)} validation rows; "
+                f"record more demos or change --val-split"
+            )
+        if as_arrays:
+            X, y, X_val, y_val = X[train_idx], y[train_idx], X[val_idx], y[val_idx]
+        else:
+            X, y, X_val, y_val = split_validation(X, y, val_split, seed)
+        labels = [labels[i] for i in train_idx]
+
+    # Balance data (oversample jumps)
+    if as_arrays:
+        idx = balance_indices(labels, seed)
+        if idx is not None:
+            X, y = X[idx], y[idx]
+    else:
+        X, y = balance_data(X, y, seed)
+    
+    # Normalize in place: X is only referenced here
+    if as_arrays:
+        if norm is not None:
+            means, stds = norm
+        else:
+            stats = RunningStats(N_FEATURES)
+            stats.update_chunk(X)
+            means, stds = stats.means_stds()
+        X -= np.array(means)
+        X /= np.array(stds)
+        Xn = X
+    elif norm is not None:
+        means, stds = norm
+        Xn = apply_normalization(X, means, stds)
+    else:
+        means, stds = normalize_inplace(X)  # the rows were built by load_all() for us
+        Xn = X
+    print(f"Training on {len(Xn)} samples with {len(Xn[0])} features")
+    if val_split > 0:
+        if as_arrays:
+            val = ((X_val - np.array(means)) / np.array(stds), y_val)
+        else:
+            val = (apply_normalization(X_val, means, stds), y_val)
+        print(f"Validating on {len(y_val)} held-out samples")
+    return Xn, y, means, stds, val
+
+
 def main():
     """Main training pipeline.
     
     Orchestrates the complete training workflow:
     1. Load CSV demo files
-    2. Balance the dataset (oversample jumps)
-    3. Normalize features
-    4. Train MLP with backpropagation
-    5. Write model weights to file
-    6. Optionally build native C library
+    2. Optionally hold out a stratified validation set
+    3. Balance the dataset (oversample jumps)
+    4. Normalize features
+    5. Train MLP with backpropagation
+    6. Write model weights to file
+    7. Optionally build native C library
     
     The trained model is used by the C inference code (model.c) in Godot
     to enable the "Play like me" AI mode.
     """
     args = parse_args()
+    global USE_CACHE
+    USE_CACHE = not args.no_cache
     if args.data:
         data_dir = os.path.abspath(args.data)
         global PATTERN
@@ -585,23 +1649,51 @@ def main():
         lib_out = os.path.abspath(args.out)
         soft_dir = os.path.dirname(lib_out)
         OUT = os.path.join(soft_dir, "model_weights.txt")
+    if args.model_out:
+        OUT = os.path.abspath(args.model_out)
 
-    X, y = load_all()
-    if not X:
-        print("No data found!")
-        sys.exit(1)
-        
-    # Balance data (oversample jumps)
-    X, y = balance_data(X, y, args.seed)
+    init = None
+    norm = None
+    paths = None
+    if args.resume:
+        try:
+            W0, b0, means0, stds0 = read_model(args.resume)
+            check_model_shape(args.resume, W0, b0, means0, stds0)
+        except ValueError as e:
+            print(e)
+            sys.exit(2)
+        if args.layers:
+            print(f"WARNING: --layers is ignored with --resume, keeping the layers of {args.resume}")
+        init = (W0, b0)
+        print(f"Resuming from {args.resume} (layers {[len(w) for w in W0[:-1]]})")
+        if args.keep_normalization:
+            norm = (means0, stds0)
+        if args.new_only:
+            model_mtime = os.path.getmtime(args.resume)
+            paths = [p for p in demo_files() if os.path.getmtime(p) > model_mtime]
+            if not paths:
+                print(f"No demo file newer than {args.resume}, nothing to fine-tune.")
+                return
     
-    # Normalize
-    Xn, means, stds = normalize(X)
-    print(f"Training on {len(Xn)} samples with {len(Xn[0])} features")
+    try:
+        Xn, y, means, stds, val = prepare_dataset(args.val_split, args.seed, as_arrays=args.backend == "numpy",
+                                                  paths=paths, norm=norm)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(2)
     
     # Argparse default was 0.
-    W, b = train_mlp(Xn, y, args.layers, epochs=args.epochs, lr=args.lr, l2=args.l2)
-    write_model(W, b, means, stds, OUT)
-    print(f"Wrote MLP model to {OUT}")
+    W, b = train_mlp(Xn, y, args.layers or [16, 8], epochs=args.epochs, lr=args.lr, l2=args.l2,
+                     backend=args.backend, batch_size=args.batch_size, shuffle=args.shuffle,
+                     seed=args.seed, optimizer=args.optimizer, beta1=args.beta1, beta2=args.beta2,
+                     eps=args.eps, val=val, patience=args.patience, init=init)
+    if args.format in ("text", "both"):
+        write_model(W, b, means, stds, OUT)
+        print(f"Wrote MLP model to {OUT}")
+    if args.format in ("binary", "both"):
+        bin_out = binary_model_path(OUT)
+        write_model_binary(W, b, means, stds, bin_out, dtype='f' if args.binary_dtype == "f32" else 'd')
+        print(f"Wrote binary MLP model to {bin_out}")
 
     # build native lib if requested
     if lib_out:
@@ -1,4 +1,5 @@
 #include <math.h>
+#include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -35,10 +36,136 @@ static int parse_line_doubles(char *line, double *dest, int expected_count) {
   return (i == expected_count) ? 0 : -1;
 }
 
+/* CRC-32, same polynomial and result as Python's zlib.crc32 */
+static uint32_t crc32_bytes(const unsigned char *buf, size_t len) {
+  uint32_t c = 0xFFFFFFFFu;
+  for (size_t i = 0; i < len; ++i) {
+    c ^= buf[i];
+    for (int k = 0; k < 8; ++k)
+      c = (c >> 1) ^ (0xEDB88320u & (0u - (c & 1u)));
+  }
+  return c ^ 0xFFFFFFFFu;
+}
+
+static uint32_t read_u32(const unsigned char *p) {
+  return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) |
+         ((uint32_t)p[3] << 24);
+}
+
+/* values are little-endian IEEE 754, like the hosts we build for */
+static double read_value(const unsigned char *p, int dtype) {
+  if (dtype == 'f') {
+    float v;
+    memcpy(&v, p, sizeof(v));
+    return v;
+  }
+  double v;
+  memcpy(&v, p, sizeof(v));
+  return v;
+}
+
+/* Load model_weights.bin (train_from_demos.py --format binary) with a single
+ * read. Layout: "MLPB", u16 version, u8 value type ('d' or 'f'), u8 pad,
+ * u32 nin, u32 nlayers, nlayers x u32 sizes, means, stds, then W rows and b
+ * for each layer, and a trailing u32 CRC-32. Returns 1 when loaded. */
+static int try_load_binary() {
+  const char *paths[] = {"model_weights.bin",
+                         "../IA/SoftmaxC/model_weights.bin",
+                         "IA/SoftmaxC/model_weights.bin"};
+
+  FILE *f = NULL;
+  for (int i = 0; i < 3 && !f; ++i)
+    f = fopen(paths[i], "rb");
+  if (!f)
+    return 0;
+
+  long size = -1;
+  if (fseek(f, 0, SEEK_END) == 0) {
+    size = ftell(f);
+    rewind(f);
+  }
+  if (size < 20) {
+    fclose(f);
+    return 0;
+  }
+  unsigned char *buf = (unsigned char *)malloc((size_t)size);
+  if (!buf || fread(buf, 1, (size_t)size, f) != (size_t)size) {
+    free(buf);
+    fclose(f);
+    return 0;
+  }
+  fclose(f);
+
+  int ok = memcmp(buf, "MLPB", 4) == 0 &&
+           crc32_bytes(buf, (size_t)size - 4) == read_u32(buf + size - 4) &&
+           buf[4] == 1 && buf[5] == 0 && (buf[6] == 'd' || buf[6] == 'f');
+  int dtype = buf[6];
+  size_t width = dtype == 'f' ? 4 : 8;
+  uint32_t nin = ok ? read_u32(buf + 8) : 0;
+  uint32_t nlayers = ok ? read_u32(buf + 12) : 0;
+  size_t offset = 16 + 4 * (size_t)nlayers;
+  if (!ok || nin == 0 || nlayers == 0 || offset > (size_t)size - 4) {
+    free(buf);
+    return 0;
+  }
+
+  /* Check the payload size before allocating anything */
+  size_t expected = 2 * (size_t)nin;
+  size_t din = nin;
+  for (uint32_t k = 0; k < nlayers; ++k) {
+    size_t dout = read_u32(buf + 16 + 4 * k);
+    expected += dout * (din + 1);
+    din = dout;
+  }
+  if (offset + expected * width != (size_t)size - 4) {
+    free(buf);
+    return 0;
+  }
+
+  mlp_nin = (int)nin;
+  mlp_num_layers = (int)nlayers;
+  mlp_layer_sizes = (int *)malloc(sizeof(int) * nlayers);
+  for (uint32_t k = 0; k < nlayers; ++k)
+    mlp_layer_sizes[k] = (int)read_u32(buf + 16 + 4 * k);
+
+  const unsigned char *p = buf + offset;
+  mlp_means = (double *)malloc(sizeof(double) * nin);
+  mlp_stds = (double *)malloc(sizeof(double) * nin);
+  for (uint32_t i = 0; i < nin; ++i, p += width)
+    mlp_means[i] = read_value(p, dtype);
+  for (uint32_t i = 0; i < nin; ++i, p += width)
+    mlp_stds[i] = read_value(p, dtype);
+
+  mlp_W = (double ***)malloc(sizeof(double **) * nlayers);
+  mlp_b = (double **)malloc(sizeof(double *) * nlayers);
+  for (int k = 0; k < mlp_num_layers; ++k) {
+    int kin = (k == 0) ? mlp_nin : mlp_layer_sizes[k - 1];
+    int kout = mlp_layer_sizes[k];
+    mlp_W[k] = (double **)malloc(sizeof(double *) * kout);
+    for (int r = 0; r < kout; ++r) {
+      mlp_W[k][r] = (double *)malloc(sizeof(double) * kin);
+      for (int c = 0; c < kin; ++c, p += width)
+        mlp_W[k][r][c] = read_value(p, dtype);
+    }
+    mlp_b[k] = (double *)malloc(sizeof(double) * kout);
+    for (int r = 0; r < kout; ++r, p += width)
+      mlp_b[k][r] = read_value(p, dtype);
+  }
+
+  free(buf);
+  return 1;
+}
+
 static void try_load() {
   if (loaded)
     return;
 
+  /* Prefer the binary model, fall back to the text one */
+  if (try_load_binary()) {
+    loaded = 1;
+    return;
+  }
+
   const char *paths[] = {"model_weights.txt",
                          "../IA/SoftmaxC/model_weights.txt",
                          "IA/SoftmaxC/model_weights.txt"};